@@ -260,52 +260,41 @@ class CryptoDashboard:
         
         self.page_size = 100
         self.current_page = 1
-        self.sort_field = 'metrics.market_cap'
+        self.sort_field = 'stats.market_cap'
         self.sort_dir = -1
         self.total_pages = 1
 
-    def get_paginated_data(self, page=1, page_size=100, sort_field='metrics.market_cap', sort_dir=-1):
+    def get_paginated_data(self, page=1, page_size=100, sort_field='stats.market_cap', sort_dir=-1):
         try:
             skip = (page - 1) * page_size
             
-            pipeline = [
-                # Group by coin_id and get the latest document
+            # latest_snapshot holds one document per coin, so this is an indexed
+            # sort + skip/limit instead of grouping the whole historical_data collection
+            total_count = self.db.latest_snapshot.count_documents({})
+            cursor = self.db.latest_snapshot.find(
+                {},
                 {
-                    '$sort': {'timestamp': -1}
-                },
-                {
-                    '$group': {
-                        '_id': '$coin_id',
-                        'latest_doc': {'$first': '$$ROOT'}
-                    }
-                },
-                # Get the count before pagination
-                {
-                    '$facet': {
-                        'total': [{'$count': 'count'}],
-                        'paginatedData': [
-                            {'$sort': {f'latest_doc.{sort_field}': sort_dir}},
-                            {'$skip': skip},
-                            {'$limit': page_size},
-                            {
-                                '$project': {
-                                    '_id': 0,
-                                    'coin_id': '$_id',
-                                    'timestamp': '$latest_doc.timestamp',
-                                    'price': '$latest_doc.metrics.price',
-                                    'volume': '$latest_doc.metrics.volume',
-                                    'market_cap': '$latest_doc.metrics.market_cap',
-                                    'updated_at': '$latest_doc.updated_at'
-                                }
-                            }
-                        ]
-                    }
+                    '_id': 0,
+                    'coin_id': 1,
+                    'timestamp': 1,
+                    'stats.price': 1,
+                    'stats.volume': 1,
+                    'stats.market_cap': 1,
+                    'updated_at': 1
                 }
-            ]
+            ).sort(sort_field, sort_dir).skip(skip).limit(page_size)
             
-            result = list(self.db.historical_data.aggregate(pipeline))[0]
-            total_count = result['total'][0]['count'] if result['total'] else 0
-            data = pd.DataFrame(result['paginatedData'])
+            data = pd.DataFrame([
+                {
+                    'coin_id': doc['coin_id'],
+                    'timestamp': doc.get('timestamp'),
+                    'price': doc.get('stats', {}).get('price'),
+                    'volume': doc.get('stats', {}).get('volume'),
+                    'market_cap': doc.get('stats', {}).get('market_cap'),
+                    'updated_at': doc.get('updated_at')
+                }
+                for doc in cursor
+            ])
             
             return {
                 'data': data,
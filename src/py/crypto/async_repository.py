@@ -0,0 +1,126 @@
+"""
+Asyncio data access for the analysis code, on Motor.
+
+CryptoDataManager is synchronous pymongo, so an async caller such as
+TechnicalAnalyzer would block a thread on every read. AsyncCryptoRepository
+offers the reads the analyzer needs as coroutines; get_historical_data_many
+fetches many coins with a few concurrent $in queries instead of one blocking
+query per coin. Points are read from the configured historical layout through
+the query helpers of historical_store.py.
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from historical_store import get_historical_store
+
+
+def flatten_point(doc: Dict) -> Dict:
+    """Historical point -> record with timestamp, price, volume and market_cap"""
+    stats = doc.get('stats', {})
+    return {
+        'timestamp': doc['timestamp'],
+        'price': stats.get('price'),
+        'volume': stats.get('volume'),
+        'market_cap': stats.get('market_cap')
+    }
+
+
+class AsyncCryptoRepository:
+    """
+    Async reads of coins, categories and historical points
+
+    Use as an async context manager, or call close() when done:
+
+        async with AsyncCryptoRepository() as repo:
+            history = await repo.get_historical_data_many(coin_ids, start)
+    """
+    COIN_BATCH_SIZE = 200  # Coins per $in query in get_historical_data_many
+
+    def __init__(self,
+                 uri: str = 'mongodb://localhost:27017',
+                 db_name: str = 'crypto_db',
+                 max_concurrency: int = 16,
+                 layout: str = os.getenv('HISTORICAL_LAYOUT', 'documents')):
+        self.client = AsyncIOMotorClient(uri, maxPoolSize=max_concurrency)
+        self.db = self.client[db_name]
+        self.max_concurrency = max_concurrency
+        # Only builds queries; they run on this repository's Motor collection
+        self.history = get_historical_store(self.db, layout)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self.client.close()
+
+    async def get_coins_by_category(self, category: str) -> List[str]:
+        """Ids of the coins in a category"""
+        return await self.db.coins.distinct('coin_id', {'category': category})
+
+    async def get_all_coin_ids(self) -> List[str]:
+        """Ids of every coin"""
+        return await self.db.coins.distinct('coin_id')
+
+    async def get_latest_ingested_timestamp(self) -> Optional[datetime]:
+        """updated_at of the most recently written historical point"""
+        latest = await self.history.collection.find_one({}, {'updated_at': 1}, sort=[('updated_at', -1)])
+        return latest.get('updated_at') if latest else None
+
+    async def _find_points(self, coin_ids: List[str], start: datetime, end: Optional[datetime]) -> Dict[str, List[Dict]]:
+        """coin_id -> flattened points in time order"""
+        cursor = self.history.collection.find(
+            **self.history.point_query(coin_ids, start, end),
+            sort=self.history.document_order
+        )
+        points = {}
+        async for doc in cursor:
+            for point in self.history.document_points(doc, start, end):
+                points.setdefault(point['coin_id'], []).append(flatten_point(point))
+        # Already in order for the per-point layouts; bucket arrays are kept in arrival order
+        for coin_points in points.values():
+            coin_points.sort(key=lambda point: point['timestamp'])
+        return points
+
+    async def get_historical_data(self,
+                                  coin_id: str,
+                                  start_date: datetime,
+                                  end_date: Optional[datetime] = None) -> List[Dict]:
+        """Points of one coin in time order"""
+        points = await self._find_points([coin_id], start_date, end_date)
+        return points.get(coin_id, [])
+
+    async def get_historical_data_many(self,
+                                       coin_ids: List[str],
+                                       start: datetime,
+                                       end: Optional[datetime] = None) -> Dict[str, List[Dict]]:
+        """
+        Points of many coins, read with concurrent batched queries
+
+        Returns:
+            dict: coin_id -> points in time order; coins without data are left out
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def fetch(batch):
+            async with semaphore:
+                return await self._find_points(batch, start, end)
+
+        batches = [
+            list(coin_ids[i:i + self.COIN_BATCH_SIZE])
+            for i in range(0, len(coin_ids), self.COIN_BATCH_SIZE)
+        ]
+        results = {}
+        for points in await asyncio.gather(*(fetch(batch) for batch in batches)):
+            results.update(points)
+
+        logging.info(f"Fetched historical data for {len(results)}/{len(coin_ids)} coins in {len(batches)} queries")
+        return results
@@ -0,0 +1,212 @@
+"""
+Asyncio CoinGecko client used by CryptoDataCollector.
+
+All requests share one pooled aiohttp session and one token bucket sized to the
+plan's calls-per-minute, so a full pull runs at the highest rate the plan allows
+instead of sleeping after a fixed number of calls.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from typing import Dict, List, Optional
+
+import aiohttp
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at calls_per_minute / 60 tokens per second"""
+
+    def __init__(self, calls_per_minute: int, burst: Optional[int] = None):
+        self.rate = calls_per_minute / 60.0
+        self.capacity = burst or max(1, calls_per_minute // 10)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        """Wait until a request may be sent"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """Stop handing out tokens for `seconds` (used when the API answers 429)"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+
+class AsyncCoinGeckoClient:
+    """
+    Rate limited CoinGecko Pro API client
+
+    Use as an async context manager so the pooled session is opened and closed:
+
+        async with AsyncCoinGeckoClient(api_key, calls_per_minute=500) as client:
+            pages = await client.get_market_data(max_page=201)
+    """
+
+    def __init__(self,
+                 api_key: str,
+                 base_url: str = "https://pro-api.coingecko.com/api/v3/",
+                 calls_per_minute: int = 500,
+                 max_concurrency: int = 20,
+                 max_retries: int = 5,
+                 timeout: int = 60):
+        self.base_url = base_url
+        self.headers = {
+            "accept": "application/json",
+            "x-cg-pro-api-key": api_key
+        }
+        self.bucket = TokenBucket(calls_per_minute)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.session = None
+        self.query_count = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def __aenter__(self):
+        self.session = aiohttp.ClientSession(
+            headers=self.headers,
+            timeout=self.timeout,
+            connector=aiohttp.TCPConnector(limit=self.max_concurrency)
+        )
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if self.session:
+            await self.session.close()
+            self.session = None
+
+    @staticmethod
+    def _retry_delay(attempt: int) -> float:
+        """Exponential backoff with jitter"""
+        return min(60, 2 ** attempt) + random.random()
+
+    async def get(self, endpoint: str, params: Optional[Dict] = None):
+        """
+        GET an API endpoint, retrying on 429 / 5xx / network errors
+
+        Returns:
+            The decoded JSON body, or None when the request failed for good
+        """
+        url = f"{self.base_url}{endpoint}"
+
+        async with self._semaphore:
+            for attempt in range(1, self.max_retries + 1):
+                await self.bucket.acquire()
+                try:
+                    async with self.session.get(url, params=params) as r:
+                        self.query_count += 1
+
+                        if r.status == 200:
+                            return await r.json()
+
+                        if r.status == 429:
+                            retry_after = r.headers.get("Retry-After")
+                            delay = float(retry_after) if retry_after and retry_after.isdigit() else self._retry_delay(attempt)
+                            logging.warning(f"Rate limited on {endpoint}, pausing requests for {delay:.1f}s")
+                            self.bucket.pause(delay)
+                            continue
+
+                        if r.status >= 500:
+                            logging.warning(f"Server error {r.status} on {endpoint} (attempt {attempt}/{self.max_retries})")
+                            await asyncio.sleep(self._retry_delay(attempt))
+                            continue
+
+                        logging.error(f"Error: {r.status} {await r.text()}")
+                        return None
+
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    logging.error(f"Exception occurred in api response for {endpoint}: {str(e)}")
+                    await asyncio.sleep(self._retry_delay(attempt))
+
+        logging.error(f"Giving up on {endpoint} after {self.max_retries} attempts")
+        return None
+
+    async def get_all_coin_ids(self) -> Optional[List[Dict]]:
+        """Fetch the list of all coins"""
+        return await self.get("coins/list")
+
+    async def get_market_data_page(self, page_id: int, per_page: Optional[int] = None) -> Optional[List[Dict]]:
+        """Fetch one page of current market data ordered by market cap"""
+        params = {
+            'vs_currency': 'usd',
+            'order': 'market_cap_desc',
+            'page': page_id
+        }
+        if per_page:
+            params['per_page'] = per_page
+        return await self.get("coins/markets", params)
+
+    async def get_market_data(self, max_page: int, per_page: Optional[int] = None) -> List[Dict]:
+        """Fetch pages 1..max_page-1 concurrently and return their rows in page order"""
+        pages = await asyncio.gather(*(
+            self.get_market_data_page(page_id, per_page) for page_id in range(1, max_page)
+        ))
+        market_data = []
+        for page in pages:
+            if page:
+                market_data.extend(page)
+        return market_data
+
+    async def get_historical_daily_coin_data(self, coin_id: str, days: int, interval: str = "daily") -> Optional[Dict]:
+        """Fetch historical prices, market caps and volumes for a coin"""
+        params = {
+            'vs_currency': 'usd',
+            'days': days,
+            'interval': interval
+        }
+        return await self.get(f"coins/{coin_id}/market_chart", params)
+
+    async def get_hist_market_data(self, coin_ids: List[str], days: int, on_result=None) -> Dict[str, Dict]:
+        """
+        Fetch historical data for many coins with bounded concurrency
+
+        Args:
+            coin_ids: coins to fetch
+            days: number of days of history per coin
+            on_result: optional coroutine function called as on_result(coin_id, data) as soon
+                as each coin completes; when given, results are not accumulated in memory
+
+        Returns:
+            dict: coin_id -> data for the coins that were fetched (empty when on_result is given)
+        """
+        results = {}
+
+        async def fetch(coin_id):
+            return coin_id, await self.get_historical_daily_coin_data(coin_id, days)
+
+        tasks = [asyncio.ensure_future(fetch(coin_id)) for coin_id in coin_ids]
+        try:
+            for i, finished in enumerate(asyncio.as_completed(tasks), start=1):
+                coin_id, data = await finished
+                logging.info(f"Fetched historical data {i}/{len(coin_ids)}: {coin_id}")
+                if data is None:
+                    continue
+                if on_result is not None:
+                    await on_result(coin_id, data)
+                else:
+                    results[coin_id] = data
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        return results
@@ -1,10 +1,12 @@
 import requests
 import pandas as pd
 import os
+import asyncio
 import time
 import pickle
 import psutil
 import argparse
+from functools import partial
 from datetime import datetime, date, timedelta
 from dotenv import load_dotenv
 import logging
@@ -14,6 +16,22 @@ from datetime import datetime
 import numpy as np
 import logging
 
+from checkpoint_store import BackfillCheckpoint
+from coingecko_client import AsyncCoinGeckoClient
+from historical_store import (
+    LAYOUTS, get_historical_store, migrate_historical_layout, benchmark_historical_layouts
+)
+from rollups import RESOLUTIONS, RollupRanges, RollupStore, bucket_start
+from rank_tables import RankTableStore
+from intraday_poller import DEFAULT_DAILY_CALL_BUDGET, IntradayPoller
+from metrics_engine import (
+    changed_fields, category_ranks_by_coin, market_cap_rank_table, rank_at,
+    STALENESS_STEPS, set_rank_tables, compute_batch_changes
+)
+from metrics_pipeline import MetricsPipeline
+from query_counter import QueryCounter
+from time_index import TimeIndex
+
 # get current script directory
 script_dir = os.path.dirname(__file__)
 
@@ -25,7 +43,14 @@ config = {
     },
     'mongodb': {
         'uri': 'mongodb://localhost:27017',
-        'db_name': 'crypto_db'
+        'db_name': 'crypto_db',
+        # Storage layout of historical points: 'documents', 'timeseries' or 'buckets' (see historical_store.py)
+        'historical_layout': os.getenv('HISTORICAL_LAYOUT', 'documents')
+    },
+    'metrics': {
+        # Where metric batches are computed: 'inline', 'thread' or 'process' (see metrics_pipeline.py)
+        'backend': os.getenv('METRICS_BACKEND', 'process'),
+        'compute_workers': int(os.getenv('METRICS_COMPUTE_WORKERS', 0)) or None
     },
     'schedule': {
         'daily_update_hour': 0,
@@ -123,7 +148,14 @@ class CryptoDataManager:
         
         # Create indexes for better query performance
         self.db.coins.create_index("coin_id", unique=True)
-        self.db.historical_data.create_index([("coin_id", 1), ("timestamp", 1)])
+        self.history = get_historical_store(self.db, config['mongodb']['historical_layout'])
+        self.history.ensure_indexes()
+        self.rollups = RollupStore(self.db, self.history)
+        self.rollups.ensure_indexes()
+        self.rank_tables = RankTableStore(self.db, self.history, self.rollups)
+        self.rank_tables.ensure_indexes()
+        self.db.latest_snapshot.create_index("coin_id", unique=True)
+        self.db.latest_snapshot.create_index([("stats.market_cap", -1)])
         self.db.categories.create_index("name", unique=True)
 
         self.BASE_API_URL = "https://pro-api.coingecko.com/api/v3/"
@@ -232,7 +264,18 @@ class CryptoDataManager:
             logging.error(f"Error in fix_missing_categories: {str(e)}")
             raise
     
-    def calculate_timeseries_metrics_benchmarked(self):
+    def calculate_timeseries_metrics_benchmarked(self, incremental=False, backend=None, compute_workers=None):
+        """
+        Calculate performance and rank changes for every time period and store them in coins.stats.change
+
+        Args:
+            incremental (bool): only recompute coins with historical_data written since the
+                last completed run, and only write the change fields whose values changed.
+                Falls back to a full run when there is no completed previous run.
+            backend (str): where batches are computed, 'inline', 'thread' or 'process'
+                (config['metrics']['backend'] by default)
+            compute_workers (int): compute pool size, cores - 1 by default
+        """
         try:
             benchmarks = {}
             total_benchmark = Benchmark("Total Processing")
@@ -247,73 +290,23 @@ class CryptoDataManager:
                     logging.info("Starting global and category rank calculation...")
                     
                     # Get global market cap rankings
-                    global_market_caps = list(self.db.historical_data.aggregate([
-                        {
-                            '$match': {
-                                'timestamp': {'$lte': now},
-                                'stats.market_cap': {'$exists': True, '$gt': 0}
-                            }
-                        },
-                        {
-                            '$sort': {'timestamp': -1}
-                        },
-                        {
-                            '$group': {
-                                '_id': '$coin_id',
-                                'market_cap': {'$first': '$stats.market_cap'}
-                            }
-                        },
-                        {
-                            '$sort': {'market_cap': -1}
-                        }
-                    ]))
+                    global_market_caps = self.get_latest_market_caps(now)
                     logging.info(f"Global market cap rankings calculated for {len(global_market_caps)} coins.")
 
                     # Map global ranks to coin IDs
                     global_rank_map = {doc['_id']: idx + 1 for idx, doc in enumerate(global_market_caps)}
 
-                    # Get category-based rankings
-                    category_ranks = {}
-                    categories = list(self.db.categories.find({}, {'_id': 0, 'name': 1, 'coins': 1}))
-                    logging.info(f"Fetched {len(categories)} categories for rank calculations.")
-
-                    for i, category in enumerate(categories, start=1):
+                    # Get category-based rankings from the global result in one pass
+                    categories = []
+                    for category in self.db.categories.find({}, {'_id': 0, 'name': 1, 'coins': 1}):
                         if 'coins' not in category or not isinstance(category['coins'], list):
                             logging.warning(f"Skipping category '{category.get('name', 'Unknown')}' due to missing or invalid 'coins' field.")
                             continue
-                        
-                        category_name = category['name']
-                        category_coins = category['coins']
-                        logging.info(f"Processing category {i}/{len(categories)}: {category_name} with {len(category_coins)} coins.")
-
-                        # Aggregate and sort by market cap within the category
-                        ranked_coins = list(self.db.historical_data.aggregate([
-                            {
-                                '$match': {
-                                    'timestamp': {'$lte': now},
-                                    'coin_id': {'$in': category_coins},
-                                    'stats.market_cap': {'$exists': True, '$gt': 0}
-                                }
-                            },
-                            {
-                                '$sort': {'timestamp': -1}
-                            },
-                            {
-                                '$group': {
-                                    '_id': '$coin_id',
-                                    'market_cap': {'$first': '$stats.market_cap'}
-                                }
-                            },
-                            {
-                                '$sort': {'market_cap': -1}
-                            }
-                        ]))
-                        logging.info(f"Calculated rankings for category '{category_name}' with {len(ranked_coins)} coins.")
+                        categories.append(category)
+                    logging.info(f"Fetched {len(categories)} categories for rank calculations.")
 
-                        # Map category ranks
-                        category_ranks[category_name] = {
-                            doc['_id']: idx + 1 for idx, doc in enumerate(ranked_coins)
-                        }
+                    coin_category_ranks = category_ranks_by_coin(global_market_caps, categories)
+                    logging.info(f"Calculated category rankings for {len(coin_category_ranks)} coins.")
 
                 benchmarks['global_category_rank_calculation'] = global_rank_benchmark.duration
 
@@ -329,9 +322,8 @@ class CryptoDataManager:
                         }
 
                         # Add category ranks for the coin if applicable
-                        for category_name, ranks in category_ranks.items():
-                            if coin_id in ranks:
-                                rank_update[f'stats.category_ranks.{category_name}'] = ranks[coin_id]
+                        for category_name, rank in coin_category_ranks.get(coin_id, {}).items():
+                            rank_update[f'stats.category_ranks.{category_name}'] = rank
 
                         bulk_operations.append(
                             UpdateOne(
@@ -374,213 +366,83 @@ class CryptoDataManager:
                         'yearly': timedelta(days=365)
                     }
                     
+                    # Long windows read hourly/daily/weekly rollups once they have been built
+                    use_rollups = self.rollups.is_built()
+                    if use_rollups:
+                        period_sources = self.rollups.plan_sources(time_periods, now)
+                        logging.info(f"Metric period sources: {period_sources}")
+                    else:
+                        # Sub-day windows compare raw points, longer ones the daily grid
+                        period_sources = {
+                            period_name: 'raw' if isinstance(delta, timedelta) and delta < timedelta(days=1) else None
+                            for period_name, delta in time_periods.items()
+                        }
+                    
                     # Get all unique coin IDs
-                    coin_ids = list(self.db.coins.distinct('coin_id'))
+                    all_coin_ids = list(self.db.coins.distinct('coin_id'))
+                    watermark = self.get_metrics_watermark() if incremental else None
+                    if watermark is not None:
+                        # Only coins that received new data since the previous run
+                        coin_ids = self.get_coins_with_new_data(watermark)
+                        logging.info(f"Incremental metrics run: {len(coin_ids)} coins have data newer than {watermark}")
+                    else:
+                        if incremental:
+                            logging.info("No completed metrics run found, falling back to a full run")
+                        coin_ids = all_coin_ids
                     total_coins = len(coin_ids)
                     update_start_time = now
                 benchmarks['setup'] = setup_benchmark.duration
                 
-                successful_updates = 0
+                # Ranks compare every coin, not just the coins of a batch, so a coin's rank
+                # is the same in full and incremental runs. The tables are persisted and
+                # only their dates touched by newly written data are recomputed.
+                rank_table_benchmark = Benchmark("Rank Tables")
+                with rank_table_benchmark:
+                    rank_tables = self.rank_tables.refresh(
+                        all_coin_ids,
+                        self._rank_table_windows(time_periods, period_sources, now),
+                        batch_size
+                    ) if total_coins else {}
+                benchmarks['rank_tables'] = rank_table_benchmark.duration
+                
                 logging.info(f"Processing {total_coins} coins")
+                batches = [coin_ids[i:i + batch_size] for i in range(0, total_coins, batch_size)]
                 
-                # Process coins in batches
-                for start_idx in range(0, total_coins, batch_size):
-                    end_idx = min(start_idx + batch_size, total_coins)
-                    current_coin_batch = coin_ids[start_idx:end_idx]
-                    
-                    # MongoDB query phase
-                    query_benchmark = Benchmark("MongoDB Query")
-                    with query_benchmark:
-                        max_lookback = max(delta for delta in time_periods.values() 
-                                        if isinstance(delta, timedelta))
-                        earliest_needed = now - max_lookback
-                        
-                        pipeline = [
-                            {
-                                '$match': {
-                                    'timestamp': {'$gte': earliest_needed},
-                                    'coin_id': {'$in': current_coin_batch}
-                                }
-                            },
-                            {
-                                '$project': {
-                                    '_id': 1,
-                                    'coin_id': 1,
-                                    'timestamp': 1,
-                                    'stats.price': 1,
-                                    'stats.market_cap': 1
-                                }
-                            }
-                        ]
-                        
-                        data = []
-                        cursor = self.db.historical_data.aggregate(pipeline, allowDiskUse=True)
-                        batch = []
-                        processed_docs = 0
-                        
-                        for doc in cursor:
-                            batch.append(doc)
-                            processed_docs += 1
-                            if processed_docs % self.PROGRESS_INTERVAL == 0:
-                                self.log_progress(processed_docs, None, "Processing documents from MongoDB")
-                            if len(batch) >= self.BATCH_SIZE:
-                                data.extend(batch)
-                                batch = []
-                        if batch:
-                            data.extend(batch)
-                    benchmarks['mongodb_query'] = query_benchmark.duration
-                    
-                    if not data:
-                        logging.warning(f"No data found for batch {start_idx}-{end_idx}")
-                        continue
-                    
-                    # Data conversion phase
-                    conversion_benchmark = Benchmark("Data Conversion")
-                    with conversion_benchmark:
-                        df = pd.DataFrame(data)
-                        
-                        # Validate required columns
-                        required_columns = ['timestamp', 'coin_id', 'stats']
-                        missing_columns = [col for col in required_columns if col not in df.columns]
-                        if missing_columns:
-                            raise ValueError(f"Missing required columns: {missing_columns}")
-                        
-                        df['timestamp'] = pd.to_datetime(df['timestamp'])
-                        df['date'] = df['timestamp'].dt.normalize()
-                        
-                        # Determine data frequency for today
-                        today = now.date()
-                        today_data = df[df['timestamp'].dt.date == today]
-                        min_time_diff = (
-                            min(today_data['timestamp'].diff().dropna().dt.total_seconds() / 60)
-                            if len(today_data) > 1 else 1440
-                        )
-                    benchmarks['data_conversion'] = conversion_benchmark.duration
-                    
-                    # Filter valid time periods based on data frequency
-                    valid_time_periods = {}
-                    for period_name, delta in time_periods.items():
-                        if isinstance(delta, timedelta):
-                            period_minutes = delta.total_seconds() / 60
-                        else:  # Handle ytd specially
-                            period_minutes = (now - datetime(now.year, 1, 1)).total_seconds() / 60
-                        
-                        if period_minutes >= min_time_diff or period_name in ['24h', '7d', 'weekly', 'monthly', 'ytd', 'yearly']:
-                            valid_time_periods[period_name] = delta
-                    
-                    # Array creation phase
-                    array_benchmark = Benchmark("Array Creation")
-                    with array_benchmark:
-                        dates = np.sort(df['date'].unique())
-                        batch_coin_to_idx = {coin: idx for idx, coin in enumerate(current_coin_batch)}
-                        date_data = {}
-                        
-                        for date_idx, date in enumerate(dates):
-                            self.log_progress(date_idx + 1, len(dates), "Processing dates")
-                            day_data = df[df['date'] == date]
-                            n_batch_coins = len(current_coin_batch)
-                            
-                            prices = np.full(n_batch_coins, np.nan)
-                            mcaps = np.full(n_batch_coins, np.nan)
-                            
-                            for _, row in day_data.iterrows():
-                                if row['coin_id'] in batch_coin_to_idx:
-                                    idx = batch_coin_to_idx[row['coin_id']]
-                                    stats = row['stats']
-                                    prices[idx] = stats.get('price')
-                                    mcaps[idx] = stats.get('market_cap')
-                            
-                            # Calculate ranks properly
-                            valid_mcaps = ~np.isnan(mcaps)
-                            ranks = np.full(n_batch_coins, np.nan)
-                            valid_mcap_values = mcaps[valid_mcaps]
-                            sorted_indices = np.argsort(-valid_mcap_values)
-                            rank_array = np.full_like(valid_mcap_values, np.nan)
-                            rank_array[sorted_indices] = np.arange(1, len(valid_mcap_values) + 1)
-                            ranks[valid_mcaps] = rank_array
-                            
-                            date_data[date] = {
-                                'prices': prices,
-                                'mcaps': mcaps,
-                                'ranks': ranks
-                            }
-                    benchmarks['array_creation'] = array_benchmark.duration
-                    
-                    # Change calculation phase
-                    calc_benchmark = Benchmark("Change Calculation")
-                    bulk_operations = []
-                    with calc_benchmark:
-                        latest_date = max(dates)
-                        latest_data = date_data[latest_date]
-                        
-                        for period_name, time_delta in time_periods.items():
-                            if period_name not in valid_time_periods:
-                                # Set zero changes for invalid periods
-                                for coin_id in current_coin_batch:
-                                    bulk_operations.append(
-                                        UpdateOne(
-                                            {"coin_id": coin_id},
-                                            {"$set": {
-                                                f'stats.change.performance_{period_name}': 0.0,
-                                                f'stats.change.rank_{period_name}': 0,
-                                                "updated_at": now,
-                                                "last_metric_update": now
-                                            }},
-                                            upsert=True
-                                        )
-                                    )
-                                continue
-                            
-                            if period_name == 'ytd':
-                                target_date = np.datetime64(datetime(now.year, 1, 1))
-                            else:
-                                target_date = latest_date - np.timedelta64(time_delta.days, 'D')
-                            
-                            target_date = min(dates, key=lambda x: abs(x - target_date))
-                            target_data = date_data[target_date]
-                            
-                            for coin_id in current_coin_batch:
-                                idx = batch_coin_to_idx[coin_id]
-                                
-                                if (not np.isnan(latest_data['prices'][idx]) and 
-                                    not np.isnan(target_data['prices'][idx])):
-                                    
-                                    price_change = ((latest_data['prices'][idx] - target_data['prices'][idx]) / 
-                                                target_data['prices'][idx] * 100)
-                                    
-                                    rank_change = (int(latest_data['ranks'][idx] - target_data['ranks'][idx])
-                                                if not np.isnan(latest_data['ranks'][idx]) and 
-                                                    not np.isnan(target_data['ranks'][idx])
-                                                else 0)
-                                    
-                                    bulk_operations.append(
-                                        UpdateOne(
-                                            {"coin_id": coin_id},
-                                            {"$set": {
-                                                f'stats.change.performance_{period_name}': round(float(price_change), 2),
-                                                f'stats.change.rank_{period_name}': rank_change,
-                                                "updated_at": now,
-                                                "last_metric_update": now
-                                            }},
-                                            upsert=True
-                                        )
-                                    )
-                    benchmarks['change_calculation'] = calc_benchmark.duration
-                    
-                    # Database update phase
-                    update_benchmark = Benchmark("Database Updates")
-                    with update_benchmark:
-                        write_batch_size = 1000
-                        for i in range(0, len(bulk_operations), write_batch_size):
-                            batch = bulk_operations[i:i + write_batch_size]
-                            result = self.db.coins.bulk_write(batch, ordered=False)
-                            successful_updates += result.modified_count
-                    benchmarks['database_updates'] = update_benchmark.duration
+                # Fetch, computation and writes of consecutive batches overlap; the
+                # computation runs on a process pool by default
+                pipeline = MetricsPipeline(
+                    fetch=lambda batch: self._fetch_metric_batch(batch, time_periods, period_sources, use_rollups, now),
+                    compute=partial(compute_batch_changes, time_periods=time_periods,
+                                    period_sources=period_sources, now=now),
+                    write=lambda batch, coin_updates: self._write_metric_batch(
+                        batch, coin_updates, now, incremental=watermark is not None),
+                    backend=backend or config['metrics']['backend'],
+                    compute_workers=compute_workers or config['metrics']['compute_workers'],
+                    max_pool_size=self.client.options.pool_options.max_pool_size,
+                    initializer=set_rank_tables,
+                    initargs=(rank_tables,)
+                )
+                
+                progress = {'coins': 0, 'updates': 0}
+                def report(index, batch, written):
+                    progress['coins'] += len(batch)
+                    progress['updates'] += written
+                    logging.info(f"Metrics batch {index + 1}/{len(batches)}: {progress['coins']}/{total_coins} coins, "
+                                 f"{progress['updates']} updates")
+                
+                stage_times = pipeline.run(batches, on_result=report)
+                successful_updates = progress['updates']
+                # Busy time summed over the workers of each stage, and the wall time of the pipeline
+                benchmarks['mongodb_query'] = stage_times['fetch']
+                benchmarks['change_calculation'] = stage_times['compute']
+                benchmarks['database_updates'] = stage_times['write']
+                benchmarks['pipeline_wall'] = stage_times['wall']
                 
                 # Update metrics_updates collection
                 update_end_time = datetime.now()
                 update_info = {
                     'metric_type': 'timeseries_metrics',
+                    'mode': 'incremental' if watermark is not None else 'full',
                     'last_update_start': update_start_time,
                     'last_update_end': update_end_time,
                     'duration_seconds': (update_end_time - update_start_time).total_seconds(),
@@ -627,13 +489,240 @@ class CryptoDataManager:
             logging.error(f"Error calculating time series metrics: {str(e)}")
             raise
         
-    def calculate_performance_metrics(self):
+    def get_metrics_watermark(self):
+        """
+        Return the point in time from which the next incremental metrics run must pick up new data
+
+        The start of the last completed run is used rather than its end, so documents written
+        while that run was in progress are picked up again instead of being missed.
+        """
+        update_info = self.db.metrics_updates.find_one({'metric_type': 'timeseries_metrics'})
+        if not update_info or update_info.get('update_status') != 'completed':
+            return None
+        return update_info.get('last_update_start') or update_info.get('last_update_end')
+
+    def _rank_table_windows(self, time_periods, period_sources, now):
+        """
+        Earliest timestamp every data source is read from, as _fetch_metric_batch reads it
+
+        Returns:
+            dict: source -> start of the source's rank table
+        """
+        windows = {}
+        for source in set(period_sources.values()):
+            lookback = max(time_periods[name] for name, period_source in period_sources.items() if period_source == source)
+            if source is None:
+                max_lookback = max(delta for delta in time_periods.values() if isinstance(delta, timedelta))
+                windows[source] = now - max_lookback - timedelta(days=STALENESS_STEPS)
+            elif source == 'raw':
+                windows[source] = now - 2 * lookback
+            else:
+                windows[source] = bucket_start(now - lookback - RESOLUTIONS[source] * STALENESS_STEPS, source)
+        return windows
+
+    def _fetch_metric_batch(self, coin_batch, time_periods, period_sources, use_rollups, now):
+        """
+        Read what compute_batch_changes needs for one coin batch
+
+        Returns:
+            tuple: (PointArrays of price / market cap points, {resolution: rollup DataFrame})
+        """
+        if use_rollups:
+            # Raw points are only needed for the short windows and today's data frequency
+            raw_lookback = max(
+                (time_periods[name] for name, source in period_sources.items() if source == 'raw'),
+                default=timedelta(0)
+            )
+            earliest_needed = min(now - 2 * raw_lookback, datetime.combine(now.date(), datetime.min.time()))
+        else:
+            max_lookback = max(delta for delta in time_periods.values() 
+                            if isinstance(delta, timedelta))
+            # Baselines may be a few days older than the window start
+            earliest_needed = now - max_lookback - timedelta(days=STALENESS_STEPS)
+        
+        # Decoded straight into typed arrays, without per-document dicts
+        points = self.history.find_point_arrays(coin_batch, earliest_needed, fields=('price', 'market_cap'))
+        
+        rollup_frames = {}
+        for source in {source for source in period_sources.values() if source in RESOLUTIONS}:
+            lookback = max(time_periods[name] for name, period_source in period_sources.items() if period_source == source)
+            rollup_frames[source] = self.rollups.load_frame(
+                source, coin_batch, now - lookback - RESOLUTIONS[source] * STALENESS_STEPS
+            )
+        return points, rollup_frames
+
+    def _write_metric_batch(self, coin_batch, coin_updates, now, incremental=False):
+        """
+        Write the change fields computed for one coin batch, one update per coin
+
+        Args:
+            incremental (bool): only write the fields whose values differ from the stored ones
+
+        Returns:
+            int: number of modified coins
+        """
+        if incremental:
+            current_changes = {
+                doc['coin_id']: doc.get('stats', {}).get('change', {})
+                for doc in self.db.coins.find(
+                    {'coin_id': {'$in': coin_batch}},
+                    {'coin_id': 1, 'stats.change': 1}
+                )
+            }
+            coin_updates = [
+                changed_fields(current_changes.get(coin_id, {}), fields)
+                for coin_id, fields in zip(coin_batch, coin_updates)
+            ]
+        
+        bulk_operations = []
+        for coin_id, fields in zip(coin_batch, coin_updates):
+            if not fields:
+                continue
+            fields['updated_at'] = now
+            fields['last_metric_update'] = now
+            bulk_operations.append(UpdateOne({"coin_id": coin_id}, {"$set": fields}, upsert=True))
+        
+        modified = 0
+        write_batch_size = 1000
+        for i in range(0, len(bulk_operations), write_batch_size):
+            result = self.db.coins.bulk_write(bulk_operations[i:i + write_batch_size], ordered=False)
+            modified += result.modified_count
+        return modified
+
+    def get_coins_with_new_data(self, since):
+        """Get ids of coins that have historical points written after `since`"""
+        return self.history.coins_written_since(since)
+
+    def get_latest_ingested_timestamp(self):
+        """Get the updated_at of the most recently written historical point"""
+        return self.history.latest_written_at()
+
+    def calculate_performance_metrics(self, coin_ids=None, write=True):
         """
         Calculate performance metrics for all cryptocurrencies and update their stats:
         - 24h price change and rank change
         - 7d price change and rank change
         - Weekly price change and rank change (Monday to Monday)
         - Monthly price change and rank change
+
+        The latest point of every coin before each period start is read with one
+        aggregation per distinct start, and ranks are looked up in one market cap table
+        over the timestamps of those points, so the number of queries does not grow
+        with the number of coins.
+
+        Args:
+            coin_ids (list): coins to calculate, every coin by default
+            write (bool): store the results in coins.stats.change
+
+        Returns:
+            dict: coin_id -> {'performance_<period>': ..., 'rank_<period>': ...}
+        """
+        try:
+            # Get current time
+            now = datetime.now()
+            
+            # Define time periods for calculations
+            periods = {
+                '24h': now - timedelta(days=1),
+                '7d': now - timedelta(days=7),
+                'weekly': now - timedelta(weeks=1),
+                'monthly': now - timedelta(days=30)
+            }
+            
+            if coin_ids is None:
+                coin_ids = [coin['coin_id'] for coin in self.db.coins.find({}, {'coin_id': 1})]
+            
+            with Benchmark("Performance metrics"):
+                # Newest point of every coin at or before now and each period start
+                latest_points = {
+                    cutoff: self._latest_points_before(cutoff, coin_ids)
+                    for cutoff in {now, *periods.values()}
+                }
+                
+                # Market caps of all coins at every timestamp a rank is needed for
+                rank_timestamps = sorted({
+                    point['timestamp'] for points in latest_points.values() for point in points.values()
+                })
+                rank_table = market_cap_rank_table(self.history.aggregate_points([
+                    {'$match': {'timestamp': {'$in': rank_timestamps}}},
+                    {'$project': {'_id': 0, 'timestamp': 1, 'market_cap': '$stats.market_cap'}}
+                ], allowDiskUse=True))
+                
+                results = {}
+                for coin_id in coin_ids:
+                    performance_changes = {}
+                    rank_changes = {}
+                    current_data = latest_points[now].get(coin_id)
+                    
+                    for period_name, start_time in periods.items():
+                        historical_data = latest_points[start_time].get(coin_id)
+                        if not (current_data and historical_data):
+                            continue
+                        
+                        try:
+                            current_price = current_data.get('price')
+                            historical_price = historical_data.get('price')
+                            
+                            if historical_price != 0:  # Avoid division by zero
+                                price_change = ((current_price - historical_price) / historical_price) * 100
+                            else:
+                                price_change = 0
+                                
+                            performance_changes[f'performance_{period_name}'] = round(price_change, 2)
+                            
+                            historical_rank = rank_at(rank_table, historical_data['timestamp'], historical_data.get('market_cap'))
+                            current_rank = rank_at(rank_table, current_data['timestamp'], current_data.get('market_cap'))
+                            rank_changes[f'rank_{period_name}'] = historical_rank - current_rank
+                            
+                        except Exception as e:
+                            logging.error(f"Error calculating {period_name} metrics for {coin_id}: {str(e)}")
+                            continue
+                    
+                    if performance_changes or rank_changes:
+                        results[coin_id] = {**performance_changes, **rank_changes}
+                
+                # Update coin documents with new metrics
+                if write and results:
+                    self.db.coins.bulk_write([
+                        UpdateOne(
+                            {'coin_id': coin_id},
+                            {'$set': {'stats.change': changes, 'updated_at': now}}
+                        )
+                        for coin_id, changes in results.items()
+                    ], ordered=False)
+            
+            logging.info(f"Updated performance metrics for {len(results)}/{len(coin_ids)} coins")
+            print(f"Updated performance metrics for {len(results)}/{len(coin_ids)} coins")
+            return results
+                
+        except Exception as e:
+            logging.error(f"Error in calculate_performance_metrics: {str(e)}")
+            raise
+
+    def _latest_points_before(self, cutoff, coin_ids):
+        """Newest point at or before `cutoff` of each coin, as coin_id -> {'timestamp', 'price', 'market_cap'}"""
+        cursor = self.history.aggregate_points([
+            {'$match': {'coin_id': {'$in': list(coin_ids)}, 'timestamp': {'$lte': cutoff}}},
+            {'$sort': {'coin_id': 1, 'timestamp': -1}},
+            {
+                '$group': {
+                    '_id': '$coin_id',
+                    'timestamp': {'$first': '$timestamp'},
+                    'price': {'$first': '$stats.price'},
+                    'market_cap': {'$first': '$stats.market_cap'}
+                }
+            }
+        ], allowDiskUse=True)
+        return {doc['_id']: doc for doc in cursor}
+
+    def calculate_performance_metrics_per_coin(self, coin_ids=None, write=True):
+        """
+        Per-coin version of calculate_performance_metrics (two find_one and two
+        count_documents per coin and period), kept as the baseline for
+        benchmarkPerformanceMetrics
+
+        Returns:
+            dict: coin_id -> {'performance_<period>': ..., 'rank_<period>': ...}
         """
         try:
             # Get current time
@@ -647,11 +736,11 @@ class CryptoDataManager:
                 'monthly': now - timedelta(days=30)
             }
             
-            # Get all coins
-            coins = self.db.coins.find({}, {'coin_id': 1})
+            if coin_ids is None:
+                coin_ids = [coin['coin_id'] for coin in self.db.coins.find({}, {'coin_id': 1})]
+            results = {}
             
-            for id, coin in enumerate(coins):
-                coin_id = coin['coin_id']
+            for id, coin_id in enumerate(coin_ids):
                 performance_changes = {}
                 rank_changes = {}
                 logging.info(f"{id}. Calculating performance and rank change metrics for {coin_id}")
@@ -713,6 +802,8 @@ class CryptoDataManager:
                 
                 # Update coin document with new metrics
                 if performance_changes or rank_changes:
+                    results[coin_id] = {**performance_changes, **rank_changes}
+                if write and (performance_changes or rank_changes):
                     self.db.coins.update_one(
                         {'coin_id': coin_id},
                         {
@@ -727,9 +818,11 @@ class CryptoDataManager:
                     )
                     
                 logging.info(f"Updated performance metrics for {coin_id}")
+            
+            return results
                 
         except Exception as e:
-            logging.error(f"Error in calculate_performance_metrics: {str(e)}")
+            logging.error(f"Error in calculate_performance_metrics_per_coin: {str(e)}")
             raise
 
     def save_coin_metadata(self, coin_data, category_map):
@@ -841,28 +934,227 @@ class CryptoDataManager:
         Returns: bool indicating whether data was saved
         """
         # Check if data already exists for this coin and timestamp
-        existing_data = self.db.historical_data.find_one({
-            "coin_id": coin_id,
-            "timestamp": timestamp
-        })
-        
-        if existing_data:
+        if self.history.existing_timestamps(coin_id, timestamp, timestamp):
             logging.info(f"Historical data already exists for {coin_id} at {timestamp}")
             return False
-            
-        doc = {
-            "coin_id": coin_id,
-            "timestamp": timestamp,
-            "stats": stats,
-            "updated_at": datetime.now()
-        }
         
-        self.db.historical_data.update_one(
-            {"coin_id": coin_id, "timestamp": timestamp},
-            {"$set": doc},
+        if self.write_historical_points(coin_id, {timestamp: stats})[0]:
+            self.rollups.update_coin(coin_id, [timestamp])
+        self.update_latest_snapshot(coin_id, timestamp, stats)
+        return True
+
+    def write_historical_points(self, coin_id, points, insert_only=False, batch_size=1000, rollup_ranges=None):
+        """
+        Write historical points of a coin
+
+        Rollups are not refreshed here: pass a RollupRanges to collect the written
+        range and refresh them once when the run ends.
+
+        Args:
+            points (dict): timestamp -> stats
+            rollup_ranges (RollupRanges): collects the range of the points written
+
+        Returns:
+            tuple: (saved_count, error_count)
+        """
+        saved_count, error_count = self.history.write_points(
+            coin_id, points, insert_only=insert_only, batch_size=batch_size
+        )
+        if saved_count and rollup_ranges is not None:
+            rollup_ranges.add(coin_id, list(points))
+        return saved_count, error_count
+
+    def write_market_page(self, timestamp, rows):
+        """
+        Store coins/markets rows (typically one page) as points at `timestamp`
+
+        The rows are written with one bulk write to the historical store and one to
+        latest_snapshot. Rollups are left to the caller, which refreshes them once
+        for all pages of a poll.
+
+        Returns:
+            list: ids of the coins written
+        """
+        points_by_coin = {
+            row['id']: {
+                timestamp: {
+                    'price': row.get('current_price'),
+                    'volume': row.get('total_volume'),
+                    'market_cap': row.get('market_cap')
+                }
+            }
+            for row in rows if row.get('id')
+        }
+        if not points_by_coin:
+            return []
+
+        self.history.write_many(points_by_coin)
+        self.db.latest_snapshot.bulk_write([
+            self.latest_snapshot_op(coin_id, timestamp, points[timestamp])
+            for coin_id, points in points_by_coin.items()
+        ], ordered=False)
+        return list(points_by_coin)
+
+    def update_coin_stats(self, rows):
+        """Set the current stats of the coins in coins/markets rows with one bulk write"""
+        now = datetime.now()
+        operations = [
+            UpdateOne(
+                {"coin_id": row['id']},
+                {
+                    "$set": {
+                        "stats": {
+                            'price': row.get('current_price'),
+                            'volume': row.get('total_volume'),
+                            'market_cap': row.get('market_cap')
+                        },
+                        "updated_at": now
+                    }
+                }
+            )
+            for row in rows if row.get('id')
+        ]
+        if operations:
+            self.db.coins.bulk_write(operations, ordered=False)
+
+    def rebuild_rollups(self):
+        """Build the hourly/daily/weekly rollups from all historical points (initial backfill)"""
+        with Benchmark("Rebuild rollups"):
+            self.rollups.rebuild()
+
+    def latest_snapshot_op(self, coin_id, timestamp, stats):
+        """
+        Build the upsert keeping latest_snapshot on the newest point of a coin
+
+        The document is only replaced when `timestamp` is at least as new as the stored one,
+        and the comparison happens inside a single update so concurrent writers can't
+        move the snapshot back in time.
+        """
+        now = datetime.now()
+        return UpdateOne(
+            {"coin_id": coin_id},
+            [
+                {"$set": {
+                    "_is_newer": {"$lte": [{"$ifNull": ["$timestamp", datetime(1970, 1, 1)]}, timestamp]}
+                }},
+                {"$set": {
+                    "timestamp": {"$cond": ["$_is_newer", timestamp, "$timestamp"]},
+                    "stats": {"$cond": ["$_is_newer", {"$literal": stats}, "$stats"]},
+                    "updated_at": {"$cond": ["$_is_newer", now, "$updated_at"]}
+                }},
+                {"$unset": "_is_newer"}
+            ],
             upsert=True
         )
-        return True
+
+    def update_latest_snapshot(self, coin_id, timestamp, stats):
+        """Upsert latest_snapshot for a coin if the given point is newer than the stored one"""
+        self.db.latest_snapshot.bulk_write([self.latest_snapshot_op(coin_id, timestamp, stats)])
+
+    def rebuild_latest_snapshot(self):
+        """Rebuild latest_snapshot from all historical points (initial backfill)"""
+        with Benchmark("Rebuild latest_snapshot"):
+            self.history.aggregate_points([
+                {
+                    '$sort': {'coin_id': 1, 'timestamp': -1}
+                },
+                {
+                    '$group': {
+                        '_id': '$coin_id',
+                        'timestamp': {'$first': '$timestamp'},
+                        'stats': {'$first': '$stats'}
+                    }
+                },
+                {
+                    '$project': {
+                        '_id': 0,
+                        'coin_id': '$_id',
+                        'timestamp': 1,
+                        'stats': 1,
+                        'updated_at': '$$NOW'
+                    }
+                },
+                {
+                    '$merge': {
+                        'into': 'latest_snapshot',
+                        'on': 'coin_id',
+                        'whenMatched': 'replace',
+                        'whenNotMatched': 'insert'
+                    }
+                }
+            ], allowDiskUse=True)
+        logging.info(f"Rebuilt latest_snapshot with {self.db.latest_snapshot.count_documents({})} coins")
+
+    def get_existing_timestamps(self, coin_id, start, end):
+        """Get the set of timestamps already stored for a coin between start and end (inclusive)"""
+        return self.history.existing_timestamps(coin_id, start, end)
+
+    def get_last_update(self, coin_id):
+        """Get the newest historical point of a coin, from latest_snapshot when available"""
+        last_update = self.db.latest_snapshot.find_one({"coin_id": coin_id})
+        if last_update is None:
+            last_update = self.history.latest_point(coin_id)
+        return last_update
+
+    def get_last_updates(self):
+        """
+        Timestamp of the newest historical point of every coin
+
+        One read of latest_snapshot, or one aggregation over the historical points
+        when the snapshot has not been built yet.
+
+        Returns:
+            dict: coin_id -> timestamp
+        """
+        if self.db.latest_snapshot.estimated_document_count() > 0:
+            cursor = self.db.latest_snapshot.find({}, {'_id': 0, 'coin_id': 1, 'timestamp': 1})
+        else:
+            logging.warning("latest_snapshot is empty, falling back to historical_data aggregation")
+            cursor = self.history.latest_points()
+        return {doc['coin_id']: doc['timestamp'] for doc in cursor}
+
+    def get_latest_market_caps(self, now=None):
+        """
+        Get the latest non-zero market cap of every coin sorted descending
+
+        Reads latest_snapshot and only falls back to a full historical_data aggregation
+        when the snapshot has not been built yet.
+
+        Returns:
+            list: [{'_id': coin_id, 'market_cap': value}]
+        """
+        now = now or datetime.now()
+        if self.db.latest_snapshot.estimated_document_count() > 0:
+            cursor = self.db.latest_snapshot.find(
+                {
+                    'timestamp': {'$lte': now},
+                    'stats.market_cap': {'$gt': 0}
+                },
+                {'_id': 0, 'coin_id': 1, 'stats.market_cap': 1}
+            ).sort('stats.market_cap', -1)
+            return [{'_id': doc['coin_id'], 'market_cap': doc['stats']['market_cap']} for doc in cursor]
+
+        logging.warning("latest_snapshot is empty, falling back to historical_data aggregation")
+        return list(self.history.aggregate_points([
+            {
+                '$match': {
+                    'timestamp': {'$lte': now},
+                    'stats.market_cap': {'$exists': True, '$gt': 0}
+                }
+            },
+            {
+                '$sort': {'timestamp': -1}
+            },
+            {
+                '$group': {
+                    '_id': '$coin_id',
+                    'market_cap': {'$first': '$stats.market_cap'}
+                }
+            },
+            {
+                '$sort': {'market_cap': -1}
+            }
+        ], allowDiskUse=True))
 
     def health_check(self):
         try:
@@ -880,8 +1172,18 @@ class CryptoDataManager:
             logging.error(f"Health check failed: {str(e)}")
             return False
 
-    def get_ml_ready_data(self, start_date, end_date):
-        """Get data in ML-ready format"""
+    def get_ml_ready_data(self, start_date, end_date, freq='1D', max_staleness=timedelta(days=1)):
+        """
+        Get data in ML-ready format
+
+        Every coin is sampled as of the same steps of `freq` between start_date and end_date
+        (its last point at or before each step), so the features line up across coins.
+        Steps whose last point is older than max_staleness are NaN.
+
+        Returns:
+            dict: 'features' (coins x steps x [price, volume, market_cap]), 'timestamps'
+                  (the steps), 'coin_ids' and 'category_data'
+        """
         # Get historical data
         pipeline = [
             {
@@ -898,6 +1200,7 @@ class CryptoDataManager:
             {
                 "$group": {
                     "_id": "$coin_id",
+                    "timestamps": {"$push": "$timestamp"},
                     "prices": {"$push": "$stats.price"},
                     "volumes": {"$push": "$stats.volume"},
                     "market_caps": {"$push": "$stats.market_cap"}
@@ -905,15 +1208,20 @@ class CryptoDataManager:
             }
         ]
         
-        historical_data = self.db.historical_data.aggregate(pipeline)
+        historical_data = self.history.aggregate_points(pipeline, allowDiskUse=True)
         
         # Get coin metadata with categories
-        coin_metadata = list(self.db.coins.find({}, {
-            "_id": 0,
-            "coin_id": 1,
-            "category": 1,
-            "category_ranks": 1
-        }))
+        coin_metadata = {
+            metadata["coin_id"]: metadata
+            for metadata in self.db.coins.find({}, {
+                "_id": 0,
+                "coin_id": 1,
+                "category": 1,
+                "category_ranks": 1
+            })
+        }
+        
+        steps = pd.date_range(start_date, end_date, freq=freq).values
         
         # Prepare ML features
         features = []
@@ -922,22 +1230,28 @@ class CryptoDataManager:
         
         for hist in historical_data:
             coin_id = hist["_id"]
-            metadata = next((m for m in coin_metadata if m["coin_id"] == coin_id), None)
+            metadata = coin_metadata.get(coin_id)
             
             if metadata:
                 coin_ids.append(coin_id)
-                features.append(np.stack([
+                values = np.array([
                     hist["prices"],
                     hist["volumes"],
                     hist["market_caps"]
-                ], axis=-1))
+                ], dtype=np.float64).T
+                features.append(
+                    TimeIndex(hist["timestamps"], assume_sorted=True).asof(
+                        values, steps, how='previous', max_staleness=max_staleness
+                    )
+                )
                 category_data.append({
-                    "category": metadata["category"],
-                    "ranks": metadata["category_ranks"]
+                    "category": metadata.get("category"),
+                    "ranks": metadata.get("category_ranks")
                 })
         
         return {
-            "features": np.array(features),
+            "features": np.array(features) if features else np.empty((0, len(steps), 3)),
+            "timestamps": steps,
             "coin_ids": np.array(coin_ids),
             "category_data": category_data
         }
@@ -964,8 +1278,44 @@ class CryptoDataManager:
                 group.attrs['category_ranks'] = str(ranks)
 
     
-    def get_historical_dataframe(self, years=1):
+    def sync_price_panel(self, root='./data/price_panel'):
+        """Mirror new historical points into the columnar price panel"""
+        from price_panel import PricePanel
+
+        with Benchmark("Price Panel Sync"):
+            return PricePanel(root).sync_from_mongo(self.history)
+
+    def refresh_price_cube(self, root='./data/price_cube'):
+        """Append the newest days to the memory-mapped price cube, building it on first use"""
+        from price_cube import PriceCube
+
+        with Benchmark("Price Cube Refresh"):
+            if not os.path.exists(os.path.join(root, PriceCube.META_FILE)):
+                return PriceCube.build_from_mongo(self.history, root)
+            cube = PriceCube(root, mode='r+')
+            cube.refresh_from_mongo(self.history)
+            return cube
+
+    def get_historical_dataframe(self, years=1, source='mongo'):
+        """
+        Get market caps of all coins for the last `years` years
+
+        Args:
+            source (str): 'mongo' to aggregate historical_data, or 'panel' to read the
+                columnar price panel (see sync_price_panel)
+        """
         start_date = datetime.now() - timedelta(days=365 * years)
+        if source == 'panel':
+            from price_panel import PricePanel
+
+            df = PricePanel().read_table(start=start_date, columns=['market_cap']).to_pandas()
+            df = df.rename(columns={
+                'timestamp': 'Date',
+                'market_cap': 'MarketCap',
+                'coin_id': 'Crypto'
+            })
+            return df[df['MarketCap'] != 0]
+
         pipeline = [
             {
                 "$match": {
@@ -981,7 +1331,7 @@ class CryptoDataManager:
                 }
             }
         ]
-        cursor = self.db.historical_data.aggregate(pipeline)
+        cursor = self.history.aggregate_points(pipeline)
         df = pd.DataFrame(list(cursor))
         df = df.rename(columns={
             'timestamp': 'Date',
@@ -1050,6 +1400,14 @@ class CryptoDataCollector:
         self.SLEEP_TIMER = 100
         self.MAX_YEARS = 10
         self.MIN_COUNT_TO_SLEEP = 101
+        self.CALLS_PER_MINUTE = int(os.getenv('COINGECKO_CALLS_PER_MINUTE', 500))
+        self.MAX_CONCURRENCY = 20
+        self.WRITE_BATCH_SIZE = 1000
+        self.CHECKPOINT_FILE = './data/hist_backfill_checkpoint.jsonl'
+        self.INTRADAY_INTERVAL_SECONDS = int(os.getenv('INTRADAY_INTERVAL_SECONDS', 300))
+        self.INTRADAY_PAGES = int(os.getenv('INTRADAY_PAGES', 4))
+        self.INTRADAY_PER_PAGE = int(os.getenv('INTRADAY_PER_PAGE', 250))
+        self.INTRADAY_DAILY_CALL_BUDGET = int(os.getenv('INTRADAY_DAILY_CALL_BUDGET', DEFAULT_DAILY_CALL_BUDGET))
         self.global_query_count = 0
         
         # Setup logging
@@ -1089,35 +1447,37 @@ class CryptoDataCollector:
             logging.error(f"Error getting coin IDs: {str(e)}")
             return None
 
+    def api_client(self):
+        """Create the rate limited async API client (use with `async with`)"""
+        return AsyncCoinGeckoClient(
+            self.API_KEY,
+            base_url=self.BASE_API_URL,
+            calls_per_minute=self.CALLS_PER_MINUTE,
+            max_concurrency=self.MAX_CONCURRENCY
+        )
+
     def get_market_data(self):
         """Fetch current market data for all coins"""
-        exception_count = 0
-        for page_id in range(1, self.max_page):
-            if self.global_query_count >= self.MIN_COUNT_TO_SLEEP:
-                logging.info("Sleeping before next data fetch...")
-                self.global_query_count = 0
-                time.sleep(self.SLEEP_TIMER)
-            
-            params = {
-                'vs_currency': 'usd',
-                'order': 'market_cap_desc',
-                'page': page_id
-            }
-            url = f"{self.MARKET_DATA_API_URL}?{'&'.join(f'{k}={v}' for k, v in params.items())}"
-            print(f"Getting market data for page: {page_id}\nRequest url: {url}")
-            logging.info(f"Getting market data for page: {page_id}\nRequest url: {url}")
-            
-            try:
-                resp = self.get_api_response(url)
-                if resp:
-                    self.todays_market_data.extend(resp)
-            except Exception as e:
-                logging.error(str(e))
-                exception_count += 1
-                if exception_count < 20:
-                    page_id -= 1
-                else:
-                    exception_count = 0
+        print(f"Getting market data for pages 1-{self.max_page - 1}")
+        logging.info(f"Getting market data for pages 1-{self.max_page - 1}")
+        self.todays_market_data.extend(asyncio.run(self._get_market_data_async()))
+
+    async def _get_market_data_async(self):
+        async with self.api_client() as client:
+            market_data = await client.get_market_data(self.max_page)
+            self.global_query_count += client.query_count
+            return market_data
+
+    def intraday_poller(self):
+        """Create the intraday snapshot poller configured by the INTRADAY_* settings"""
+        return IntradayPoller(
+            self.db_manager,
+            self.api_client,
+            interval_seconds=self.INTRADAY_INTERVAL_SECONDS,
+            pages=self.INTRADAY_PAGES,
+            per_page=self.INTRADAY_PER_PAGE,
+            daily_call_budget=self.INTRADAY_DAILY_CALL_BUDGET
+        )
 
     def get_coin_ids_in_rank(self):
         """Extract coin IDs from market data"""
@@ -1136,26 +1496,34 @@ class CryptoDataCollector:
         logging.info(f"Getting coin #{i}: {coin_id}")
         return self.get_api_response(url)
 
-    def save_historical_datapoints(self, coin_id, historical_data):
+    def save_historical_datapoints(self, coin_id, historical_data, batch_size=None, insert_only=False, rollup_ranges=None):
         """
         Process and save historical data points for a given coin
         
         Args:
             coin_id (str): The ID of the coin
             historical_data (dict): Dictionary containing prices, market_caps, and total_volumes
+            batch_size (int): Number of upserts per unordered bulk write, defaults to WRITE_BATCH_SIZE
+            insert_only (bool): Only write timestamps that are not stored yet. Existing
+                (coin_id, timestamp) pairs are found with one range query and left untouched.
+            rollup_ranges (RollupRanges): collects the written range for the caller's rollup refresh
             
         Returns:
             tuple: (saved_count, error_count)
         """
         saved_count = 0
         error_count = 0
+        batch_size = batch_size or self.WRITE_BATCH_SIZE
         
         try:
             # Validate data structure
             if not all(key in historical_data for key in ['prices', 'market_caps', 'total_volumes']):
                 logging.error(f"Missing required data fields for {coin_id}")
+                error_count += 1
                 return saved_count, error_count
             
+            # Collect points keyed by timestamp so duplicates in the payload collapse to the last one
+            points = {}
             for price_data, market_cap_data, volume_data in zip(
                 historical_data['prices'],
                 historical_data['market_caps'],
@@ -1166,85 +1534,142 @@ class CryptoDataCollector:
                     timestamp = datetime.fromtimestamp(price_data[0]/1000)
                     
                     # Prepare stats
-                    stats = {
+                    points[timestamp] = {
                         'price': price_data[1],
                         'market_cap': market_cap_data[1],
                         'volume': volume_data[1]
                     }
-                    
-                    # Save to MongoDB
-                    doc = {
-                        "coin_id": coin_id,
-                        "timestamp": timestamp,
-                        "stats": stats,
-                        "updated_at": datetime.now()
-                    }
-                    
-                    # Update with upsert
-                    self.db_manager.db.historical_data.update_one(
-                        {
-                            "coin_id": coin_id,
-                            "timestamp": timestamp
-                        },
-                        {"$set": doc},
-                        upsert=True
-                    )
-                    saved_count += 1
-                    
                 except Exception as e:
-                    logging.error(f"Error saving data point for {coin_id} at {timestamp}: {str(e)}")
+                    logging.error(f"Error preparing data point for {coin_id}: {str(e)}")
                     error_count += 1
                     continue
-                    
+            
+            if not points:
+                logging.info(f"No data points to save for {coin_id}")
+                return saved_count, error_count
+            
+            latest_point = max(points.items(), key=lambda item: item[0])
+            
+            if insert_only:
+                existing = self.db_manager.get_existing_timestamps(coin_id, min(points), max(points))
+                points = {ts: stats for ts, stats in points.items() if ts not in existing}
+                logging.info(f"Skipping {len(existing)} existing points for {coin_id}, {len(points)} new")
+            
+            saved_count, write_errors = self.db_manager.write_historical_points(
+                coin_id, points, insert_only=insert_only, batch_size=batch_size, rollup_ranges=rollup_ranges
+            )
+            error_count += write_errors
+            
+            self.db_manager.update_latest_snapshot(coin_id, *latest_point)
+
             logging.info(f"Processed {saved_count} points for {coin_id} with {error_count} errors")
             
         except Exception as e:
             logging.error(f"Error processing historical data for {coin_id}: {str(e)}")
+            error_count += 1
             
         return saved_count, error_count
 
-    def get_hist_market_data(self, coin_ids):
-        """Fetch historical market data for multiple coins"""
+    def get_hist_market_data(self, coin_ids, insert_only=False, resume=True):
+        """
+        Fetch and save historical market data for multiple coins
+        
+        Progress is appended to the backfill checkpoint log one coin at a time, so the
+        process can be stopped at any point and a later call picks up where it stopped.
+        Coins whose points failed to save stay pending; once no coin is left pending
+        the log is cleared, so the next call backfills every coin again.
+        
+        Args:
+            coin_ids (list): coins to backfill
+            insert_only (bool): skip points that are already stored
+            resume (bool): skip coins completed by a previous run; False starts a fresh log
+        """
         days = 365 * self.MAX_YEARS
-        i = 0
-        exception_count = 0
+        checkpoint = BackfillCheckpoint(self.CHECKPOINT_FILE)
+        if not resume:
+            checkpoint.reset()
+        
+        pending = checkpoint.pending(coin_ids)
+        logging.info(f"Getting historical market cap data for {len(pending)} coins ({len(coin_ids) - len(pending)} already completed)")
+        print(f"Getting historical market cap data for {len(pending)} coins ({len(coin_ids) - len(pending)} already completed)")
         
-        while i < len(coin_ids):
-            coin_id = coin_ids[i]
-            logging.info(f"Getting historical market cap data for {i}.coin id = {coin_id}")
-            print(f"Getting historical market cap data for {i}.coin id = {coin_id}")
+        rollup_ranges = RollupRanges()
+        try:
+            asyncio.run(self._get_hist_market_data_async(pending, days, insert_only, checkpoint, rollup_ranges))
             
-            if coin_id not in self.hist_market_data:
-                try:
-                    res = self.get_historical_daily_coin_data(i, coin_id, days)
-                except Exception as e:
-                    exception_count += 1
-                    if exception_count < 20:
-                        continue
-                    else:
-                        i += 1
-                        continue
+            remaining = checkpoint.pending(coin_ids)
+            if remaining:
+                logging.warning(f"{len(remaining)} coins failed to backfill and will be retried by the next run")
+            else:
+                logging.info("Backfill completed for every coin, clearing the checkpoint log")
+                checkpoint.reset()
+        except KeyboardInterrupt:
+            logging.info(f"Backfill interrupted after {len(checkpoint.completed)} completed coins, run again to resume")
+            raise
+        finally:
+            checkpoint.close()
+            # Once for the whole run, including the coins saved before an interruption
+            with Benchmark("Rollup Update"):
+                self.db_manager.rollups.update(rollup_ranges.ranges)
+
+    async def _get_hist_market_data_async(self, coin_ids, days, insert_only, checkpoint, rollup_ranges):
+        async def on_result(coin_id, res):
+            # Saving runs in a worker thread so the other downloads keep going
+            saved_count, error_count = await asyncio.to_thread(
+                self.save_historical_datapoints, coin_id, res, insert_only=insert_only, rollup_ranges=rollup_ranges
+            )
+            if error_count:
+                # Left pending so a resumed run fetches it again
+                logging.warning(f"Backfill of {coin_id} had {error_count} errors, not marking it completed")
+                return
+            checkpoint.mark_completed(coin_id, days=days, saved=saved_count)
 
-            if self.global_query_count >= self.MIN_COUNT_TO_SLEEP:
-                logging.info("Sleeping before next data fetch...")
-                self.global_query_count = 0
-                time.sleep(self.SLEEP_TIMER)
+        async with self.api_client() as client:
+            await client.get_hist_market_data(coin_ids, days, on_result=on_result)
+            self.global_query_count += client.query_count
 
-            if res is not None:
-                self.hist_market_data[coin_id] = res
+    def backfill_gaps(self, gaps, rollup_ranges=None):
+        """
+        Fetch and save the missing days of many coins concurrently
 
-                self.save_historical_datapoints(coin_id, res) 
-                i += 1
+        Args:
+            gaps (dict): coin_id -> number of days to fetch
+            rollup_ranges (RollupRanges): collects the written ranges for the caller's rollup refresh
 
-                if i % 100 == 0:
-                    self._save_checkpoint(i)
+        Returns:
+            int: number of points saved
+        """
+        if not gaps:
+            return 0
+        logging.info(f"Backfilling gaps of {len(gaps)} coins")
+        print(f"Backfilling gaps of {len(gaps)} coins")
+        return asyncio.run(self._backfill_gaps_async(gaps, rollup_ranges))
+
+    async def _backfill_gaps_async(self, gaps, rollup_ranges=None):
+        saved_total = 0
+
+        async with self.api_client() as client:
+            async def backfill(coin_id, days):
+                hist_data = await client.get_historical_daily_coin_data(coin_id, days)
+                if not hist_data:
+                    return 0
+                saved_count, _ = await asyncio.to_thread(
+                    self.save_historical_datapoints, coin_id, hist_data, rollup_ranges=rollup_ranges
+                )
+                return saved_count
 
-    def _save_checkpoint(self, i):
-        """Save current progress to file"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        fname = f'./data/crypto_market_data_for_{i}_coins_{timestamp}.pkl'
-        with open(fname, 'wb') as f:
-            pickle.dump(self.hist_market_data, f)
+            tasks = [asyncio.ensure_future(backfill(coin_id, days)) for coin_id, days in gaps.items()]
+            try:
+                for i, finished in enumerate(asyncio.as_completed(tasks), start=1):
+                    saved_total += await finished
+                    if i % 100 == 0:
+                        logging.info(f"Backfilled {i}/{len(gaps)} coins")
+            finally:
+                for task in tasks:
+                    task.cancel()
+            self.global_query_count += client.query_count
+
+        return saved_total
 
     @staticmethod
     def allsundays(year):
@@ -1317,6 +1742,9 @@ class CryptoDataCollector:
 
     def save_market_data(self):
         """Save final market data"""
+        if not self.hist_market_data:
+            logging.info(f"No in-memory market data to save, backfill progress is in {self.CHECKPOINT_FILE}")
+            return
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         fname = f'crypto_market_data_{timestamp}.pkl'
         with open(fname, 'wb') as f:
@@ -1455,15 +1883,15 @@ class CryptoDataPipeline:
             logging.error(f"Error in initial load: {str(e)}")
             raise
 
-    def update_performance_metrics(self):
-        """Update performance metrics for all cryptocurrencies"""
+    def update_performance_metrics(self, incremental=False):
+        """Update performance metrics for all cryptocurrencies (or only the ones with new data if incremental)"""
         try:
             logging.info("Starting performance metrics update")
             
             # self.db_manager.calculate_performance_metrics()
             # logging.info("Completed performance metrics update")
 
-            results = self.db_manager.calculate_timeseries_metrics_benchmarked()
+            results = self.db_manager.calculate_timeseries_metrics_benchmarked(incremental=incremental)
             logging.info(f"Completed performance metrics update.")
             print(f"Completed performance metrics update.")
 
@@ -1474,69 +1902,43 @@ class CryptoDataPipeline:
             raise
         
     def daily_update(self):
-        """Daily update job with per-coin backfill functionality"""
+        """
+        Daily update job with per-coin backfill functionality
+
+        Last update timestamps of all coins are read at once, the gaps are backfilled
+        concurrently and today's stats are written with bulk writes.
+        """
         try:
             logging.info(f"Starting daily update at {datetime.now()}")
             self.collector.get_market_data()
+            market_data = [coin_data for coin_data in self.collector.todays_market_data if coin_data.get("id")]
             
-            for i, coin_data in enumerate(self.collector.todays_market_data):
+            now = datetime.now()
+            last_updates = self.db_manager.get_last_updates()
+            gaps = {}
+            for coin_data in market_data:
                 coin_id = coin_data["id"]
-                
-                # Find last update for this specific coin
-                last_update = self.db_manager.db.historical_data.find_one(
-                    {"coin_id": coin_id},
-                    sort=[("timestamp", -1)]
-                )
-                
-                last_date = last_update["timestamp"] if last_update else datetime.now() - timedelta(days=365)
-                days_to_fetch = (datetime.now() - last_date).days
-                
-                logging.info(f"Processing {i+1}.{coin_id}: Last update {last_date}, need to fetch {days_to_fetch} days")
-                print(f"Processing {i+1}.{coin_id}: Last update {last_date}, need to fetch {days_to_fetch} days")
-                
-                # Fetch missing historical data if needed
+                last_date = last_updates.get(coin_id) or now - timedelta(days=365)
+                days_to_fetch = (now - last_date).days
                 if days_to_fetch > 1:
-                    hist_data = self.collector.get_historical_daily_coin_data(
-                        i, coin_id, days_to_fetch
-                    )
-                    if hist_data:
-                        self.collector.save_historical_datapoints(coin_id, hist_data)
-                
-                # Update today's stats
-                current_stats = {
-                    'price': coin_data['current_price'],
-                    'volume': coin_data['total_volume'],
-                    'market_cap': coin_data['market_cap']
-                }
-                
-                # Update historical_data
-                today_midnight = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-                self.db_manager.db.historical_data.update_one(
-                    {
-                        "coin_id": coin_id,
-                        "timestamp": today_midnight
-                    },
-                    {
-                        "$set": {
-                            "stats": current_stats,
-                            "updated_at": datetime.now()
-                        }
-                    },
-                    upsert=True
-                )
-                
-                # Update coins collection
-                self.db_manager.db.coins.update_one(
-                    {"coin_id": coin_id},
-                    {
-                        "$set": {
-                            "stats": current_stats,
-                            "updated_at": datetime.now()
-                        }
-                    }
-                )
-                
-                time.sleep(self.collector.SLEEP_TIMER / 1000)
+                    gaps[coin_id] = days_to_fetch
+            
+            logging.info(f"Processing {len(market_data)} coins, {len(gaps)} need a backfill")
+            print(f"Processing {len(market_data)} coins, {len(gaps)} need a backfill")
+            
+            # Fetch missing historical data
+            rollup_ranges = RollupRanges()
+            self.collector.backfill_gaps(gaps, rollup_ranges)
+            
+            # Update historical_data and latest_snapshot, then the coins collection
+            today_midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+            with Benchmark("Write today's stats"):
+                written = self.db_manager.write_market_page(today_midnight, market_data)
+                self.db_manager.update_coin_stats(market_data)
+                for coin_id in written:
+                    rollup_ranges.add(coin_id, [today_midnight])
+                # Backfilled gaps and today's points in one refresh
+                self.db_manager.rollups.update(rollup_ranges.ranges)
                 
             logging.info("Daily update completed successfully")
             print("Daily update completed successfully")
@@ -1664,9 +2066,9 @@ class CryptoDataPipeline:
             source_client.close()
             dest_client.close()
 
-def updateMetrics():
+def updateMetrics(incremental=False):
     pipeline = CryptoDataPipeline()
-    pipeline.update_performance_metrics()
+    pipeline.update_performance_metrics(incremental=incremental)
 
 def main():
     # Install APScheduler if not already installed
@@ -1716,6 +2118,58 @@ def dbmigrate():
         DEST_COLLECTION
     )
     
+def rebuildSnapshot():
+    db_manager = CryptoDataManager()
+    db_manager.rebuild_latest_snapshot()
+
+def syncPricePanel():
+    db_manager = CryptoDataManager()
+    db_manager.sync_price_panel()
+
+def refreshPriceCube():
+    db_manager = CryptoDataManager()
+    db_manager.refresh_price_cube()
+
+def rebuildRollups():
+    db_manager = CryptoDataManager()
+    db_manager.rebuild_rollups()
+
+def intradayPoll():
+    collector = CryptoDataCollector()
+    poller = collector.intraday_poller()
+    try:
+        asyncio.run(poller.run())
+    except (KeyboardInterrupt, SystemExit):
+        logging.info(f"Intraday poller stopped after {poller.cycles} cycles, {poller.points_written} points")
+
+def migrateLayout(layout):
+    db_manager = CryptoDataManager()
+    migrate_historical_layout(db_manager.db, layout)
+
+def benchmarkLayouts():
+    db_manager = CryptoDataManager()
+    results = benchmark_historical_layouts(db_manager.db)
+    for layout, measurements in results.items():
+        print(f"{layout}: " + ", ".join(f"{name}={value}" for name, value in measurements.items()))
+
+def benchmarkPerformanceMetrics(sample_size=50):
+    """Compare queries and time of the per-coin and the rank table performance metrics"""
+    # The listener has to be registered before the manager creates its client
+    counter = QueryCounter.install()
+    db_manager = CryptoDataManager()
+    coin_ids = [coin['coin_id'] for coin in db_manager.db.coins.find({}, {'coin_id': 1}).limit(sample_size)]
+
+    runs = {}
+    for name, calculate in [('per-coin', db_manager.calculate_performance_metrics_per_coin),
+                            ('rank-table', db_manager.calculate_performance_metrics)]:
+        with counter.measure() as counts, Benchmark(f"Performance metrics ({name})") as benchmark:
+            results = calculate(coin_ids, write=False)
+        runs[name] = results
+        print(f"{name}: {counts.total} queries for {len(coin_ids)} coins {dict(counts.by_command)}, "
+              f"{benchmark.duration:.2f}s")
+
+    print(f"Identical results: {runs['per-coin'] == runs['rank-table']}")
+
 def periodicUpdate():
     pipeline = CryptoDataPipeline()
     pipeline.update_performance_metrics()
@@ -1725,14 +2179,36 @@ if __name__ == "__main__":
     #
     parser = argparse.ArgumentParser(description='Crypto Data Pipeline Operations')
     parser.add_argument('--op', type=str, default='main',
-                      choices=['migrate', 'metric', 'periodic', 'all'],
-                      help='Operation to perform: main (daily update), migrate (database migration), or update (metrics update)')
+                      choices=['migrate', 'metric', 'metric-incremental', 'periodic', 'rebuild-snapshot', 'sync-panel', 'refresh-cube', 'rebuild-rollups', 'intraday', 'migrate-layout', 'benchmark-layout', 'benchmark-performance', 'all'],
+                      help='Operation to perform: main (daily update), migrate (database migration), metric (metrics update), metric-incremental (metrics update for coins with new data only), rebuild-snapshot (backfill latest_snapshot), sync-panel (update the columnar price panel), refresh-cube (update the memory-mapped price cube), rebuild-rollups (backfill the hourly/daily/weekly rollups), intraday (poll intraday market snapshots), migrate-layout (copy historical_data into --layout), benchmark-layout (compare historical layouts) or benchmark-performance (query counts of calculate_performance_metrics)')
+    parser.add_argument('--layout', type=str, default='timeseries', choices=[layout for layout in LAYOUTS if layout != 'documents'],
+                      help='Target historical layout for migrate-layout')
+    parser.add_argument('--sample-size', type=int, default=50,
+                      help='Number of coins for benchmark-performance')
     args = parser.parse_args()
     
     if args.op == 'migrate':
         dbmigrate()
     elif args.op == 'metric': # recalculate performance and other metrics
         updateMetrics()
+    elif args.op == 'metric-incremental': # recalculate metrics only for coins with new data
+        updateMetrics(incremental=True)
+    elif args.op == 'rebuild-snapshot': # backfill latest_snapshot from historical_data
+        rebuildSnapshot()
+    elif args.op == 'sync-panel': # mirror historical_data into the Parquet price panel
+        syncPricePanel()
+    elif args.op == 'refresh-cube': # append the newest days to the memory-mapped price cube
+        refreshPriceCube()
+    elif args.op == 'rebuild-rollups': # build the downsampled rollups from historical points
+        rebuildRollups()
+    elif args.op == 'intraday': # poll coins/markets pages for the short metric windows
+        intradayPoll()
+    elif args.op == 'migrate-layout': # copy historical_data into another storage layout
+        migrateLayout(args.layout)
+    elif args.op == 'benchmark-layout': # compare latency and disk footprint of the layouts
+        benchmarkLayouts()
+    elif args.op == 'benchmark-performance': # query counts of the per-coin vs rank table performance metrics
+        benchmarkPerformanceMetrics(args.sample_size)
     elif args.op == 'periodic': # get price periodically
         periodicUpdate()
     elif args.op == 'all': # get price periodically
@@ -0,0 +1,656 @@
+"""
+Storage layouts for historical price points.
+
+CryptoDataManager reads and writes historical points through a store so the
+physical layout can be chosen per deployment (config['mongodb']['historical_layout']):
+
+- 'documents': one document per (coin_id, timestamp) in historical_data (default)
+- 'timeseries': a MongoDB time-series collection with coin_id as metaField and
+  timestamp as timeField, which stores points column-compressed in internal
+  buckets. Needs MongoDB 7.0+ (deletes on the time field).
+- 'buckets': one document per coin and month in historical_buckets holding
+  parallel timestamps / price / market_cap / volume arrays, appended with $push
+
+Every store takes and returns points as {'coin_id', 'timestamp', 'stats', 'updated_at'}
+documents. migrate_historical_layout copies the document layout into another
+layout and benchmark_historical_layouts compares them.
+"""
+
+import logging
+import random
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from point_decoder import PointArrayBuilder, decode_points
+
+LAYOUTS = ('documents', 'timeseries', 'buckets')
+
+POINT_FIELDS = ('price', 'market_cap', 'volume')
+
+
+def _bulk_write(collection, operations, batch_size, label, weights=None):
+    """
+    Unordered bulk writes in batches, returning (saved_count, error_count)
+
+    Args:
+        weights (list): number of points each operation writes, 1 each by default
+    """
+    weights = weights or [1] * len(operations)
+    saved_count = 0
+    error_count = 0
+    for batch_num, start in enumerate(range(0, len(operations), batch_size), start=1):
+        batch = operations[start:start + batch_size]
+        batch_points = sum(weights[start:start + batch_size])
+        try:
+            result = collection.bulk_write(batch, ordered=False)
+            saved_count += batch_points
+            logging.info(f"{label} batch {batch_num}: {result.upserted_count + result.inserted_count} inserted, "
+                         f"{result.modified_count} modified")
+        except BulkWriteError as bwe:
+            failed = sum(weights[start + error['index']] for error in bwe.details.get('writeErrors', []))
+            saved_count += batch_points - failed
+            error_count += failed
+            logging.error(f"{label} batch {batch_num}: {failed} of {len(batch)} writes failed: "
+                          f"{bwe.details.get('writeErrors', [])[:1]}")
+    return saved_count, error_count
+
+
+def _expected_points(coin_ids, start, end=None):
+    """Capacity to preallocate for a range read: one point per coin and day"""
+    days = ((end or datetime.now()) - start).days + 1
+    return len(coin_ids) * max(days, 1)
+
+
+class DocumentHistoricalStore:
+    """One document per (coin_id, timestamp) in historical_data"""
+    layout = 'documents'
+    collection_name = 'historical_data'
+
+    def __init__(self, db):
+        self.db = db
+        self.collection = db[self.collection_name]
+
+    def ensure_indexes(self):
+        self.collection.create_index([("coin_id", 1), ("timestamp", 1)])
+        self.collection.create_index("updated_at")
+
+    def write_points(self, coin_id, points, insert_only=False, batch_size=1000):
+        """
+        Write points of a coin
+
+        Args:
+            points (dict): timestamp -> stats
+            insert_only (bool): leave already stored timestamps untouched
+
+        Returns:
+            tuple: (saved_count, error_count)
+        """
+        return self.write_many({coin_id: points}, insert_only, batch_size, label=coin_id)
+
+    def write_many(self, points_by_coin, insert_only=False, batch_size=1000, label=None):
+        """
+        Write points of many coins with shared bulk writes
+
+        Args:
+            points_by_coin (dict): coin_id -> {timestamp: stats}
+
+        Returns:
+            tuple: (saved_count, error_count)
+        """
+        now = datetime.now()
+        operations = []
+        for coin_id, points in points_by_coin.items():
+            for timestamp, stats in points.items():
+                doc = {
+                    "coin_id": coin_id,
+                    "timestamp": timestamp,
+                    "stats": stats,
+                    "updated_at": now
+                }
+                operations.append(
+                    UpdateOne(
+                        {"coin_id": coin_id, "timestamp": timestamp},
+                        {"$setOnInsert": doc} if insert_only else {"$set": doc},
+                        upsert=True
+                    )
+                )
+        return _bulk_write(self.collection, operations, batch_size, label or f"{len(points_by_coin)} coins")
+
+    def existing_timestamps(self, coin_id, start, end):
+        """Set of timestamps stored for a coin between start and end (inclusive)"""
+        cursor = self.collection.find(
+            {"coin_id": coin_id, "timestamp": {"$gte": start, "$lte": end}},
+            {"_id": 0, "timestamp": 1}
+        )
+        return {doc["timestamp"] for doc in cursor}
+
+    def latest_point(self, coin_id):
+        """Newest point of a coin, or None"""
+        return self.collection.find_one({"coin_id": coin_id}, sort=[("timestamp", -1)])
+
+    # Sort along the collection's index, grouping the documents of each coin
+    document_order = [('coin_id', 1), ('timestamp', 1)]
+
+    def point_query(self, coin_ids=None, start=None, end=None, fields=POINT_FIELDS):
+        """
+        find() arguments of a range read, for callers running the query on their own
+        client (e.g. Motor); expand each returned document with document_points()
+
+        Args:
+            coin_ids (list): coins to read, all coins when None
+            start, end (datetime): inclusive bounds on timestamp, open when None
+
+        Returns:
+            dict: {'filter': ..., 'projection': ...}
+        """
+        query = {}
+        if coin_ids is not None:
+            query['coin_id'] = {'$in': list(coin_ids)}
+        time_filter = {}
+        if start is not None:
+            time_filter['$gte'] = start
+        if end is not None:
+            time_filter['$lte'] = end
+        if time_filter:
+            query['timestamp'] = time_filter
+        projection = {'_id': 0, 'coin_id': 1, 'timestamp': 1}
+        projection.update({f'stats.{field}': 1 for field in fields})
+        return {'filter': query, 'projection': projection}
+
+    def document_points(self, doc, start=None, end=None, fields=POINT_FIELDS):
+        """Points held by one document of a point_query read; here the document is the point"""
+        yield doc
+
+    def find_points(self, coin_ids, start, end=None, fields=POINT_FIELDS):
+        """
+        Iterate the points of some coins from `start` (to `end`, inclusive)
+
+        Yields:
+            dict: {'coin_id', 'timestamp', 'stats': {field: value}}
+        """
+        return self.collection.find(**self.point_query(coin_ids, start, end, fields))
+
+    def find_points_in_ranges(self, ranges, fields=POINT_FIELDS):
+        """
+        Iterate the points of every coin within its own range, with one query
+
+        Args:
+            ranges (dict): coin_id -> (start, end), both inclusive
+
+        Yields:
+            dict: {'coin_id', 'timestamp', 'stats': {field: value}}
+        """
+        if not ranges:
+            return
+        queries = [self.point_query([coin_id], start, end, fields) for coin_id, (start, end) in ranges.items()]
+        cursor = self.collection.find({'$or': [query['filter'] for query in queries]}, queries[0]['projection'])
+        for doc in cursor:
+            start, end = ranges[doc['coin_id']]
+            yield from self.document_points(doc, start, end, fields)
+
+    def find_points_written_since(self, since=None, fields=POINT_FIELDS, batch_size=None):
+        """
+        Iterate the points written after `since` (every point when None)
+
+        The bucket layout returns rewritten buckets whole, so points they already
+        held are returned again.
+
+        Yields:
+            dict: {'coin_id', 'timestamp', 'stats': {field: value}}
+        """
+        query = self.point_query(fields=fields)
+        if since is not None:
+            query['filter']['updated_at'] = {'$gt': since}
+        cursor = self.collection.find(**query)
+        if batch_size:
+            cursor = cursor.batch_size(batch_size)
+        for doc in cursor:
+            yield from self.document_points(doc, fields=fields)
+
+    def coins_with_points_since(self, start):
+        """Ids of coins with points at or after `start`"""
+        return list(self.collection.distinct('coin_id', {'timestamp': {'$gte': start}}))
+
+    def find_point_arrays(self, coin_ids, start, end=None, fields=POINT_FIELDS):
+        """
+        Points of some coins from `start` (to `end`, inclusive) decoded straight into typed arrays
+
+        Returns:
+            PointArrays: see point_decoder.py
+        """
+        return decode_points(
+            self.collection,
+            self.point_query(coin_ids, start, end, fields=())['filter'],
+            coin_ids,
+            fields,
+            capacity=_expected_points(coin_ids, start, end)
+        )
+
+    def point_stages(self):
+        """Aggregation stages turning the collection into one {'coin_id', 'timestamp', 'stats', 'updated_at'} document per point"""
+        return []
+
+    def aggregate_points(self, pipeline, **kwargs):
+        """Run an aggregation pipeline written against point documents"""
+        return self.collection.aggregate(self.point_stages() + list(pipeline), **kwargs)
+
+    def latest_points(self):
+        """Newest point of every coin"""
+        return list(self.aggregate_points([
+            {'$sort': {'coin_id': 1, 'timestamp': -1}},
+            {'$group': {'_id': '$coin_id', 'timestamp': {'$first': '$timestamp'}, 'stats': {'$first': '$stats'}}},
+            {'$project': {'_id': 0, 'coin_id': '$_id', 'timestamp': 1, 'stats': 1}}
+        ], allowDiskUse=True))
+
+    def coins_written_since(self, since):
+        """Ids of coins with points written after `since`"""
+        return list(self.collection.distinct('coin_id', {'updated_at': {'$gt': since}}))
+
+    def earliest_point_written_since(self, since):
+        """Oldest timestamp among the points written after `since`, None when nothing was written"""
+        earliest = self.collection.find_one({'updated_at': {'$gt': since}}, {'timestamp': 1}, sort=[('timestamp', 1)])
+        return earliest.get('timestamp') if earliest else None
+
+    def latest_written_at(self):
+        """updated_at of the most recently written point"""
+        latest = self.collection.find_one({}, {'updated_at': 1}, sort=[('updated_at', -1)])
+        return latest.get('updated_at') if latest else None
+
+    def storage_stats(self):
+        """Document count and on-disk sizes in bytes"""
+        stats = self.db.command('collStats', self.collection_name)
+        return {
+            'count': stats.get('count', 0),
+            'storage_size': stats.get('storageSize', 0),
+            'index_size': stats.get('totalIndexSize', 0)
+        }
+
+
+class TimeSeriesHistoricalStore(DocumentHistoricalStore):
+    """MongoDB time-series collection with coin_id as metaField and timestamp as timeField"""
+    layout = 'timeseries'
+    collection_name = 'historical_data_ts'
+    GRANULARITY = 'hours'
+
+    def ensure_indexes(self):
+        if self.collection_name not in self.db.list_collection_names():
+            self.db.create_collection(
+                self.collection_name,
+                timeseries={
+                    'timeField': 'timestamp',
+                    'metaField': 'coin_id',
+                    'granularity': self.GRANULARITY
+                }
+            )
+            logging.info(f"Created time-series collection {self.collection_name}")
+        self.collection.create_index([("coin_id", 1), ("timestamp", 1)])
+        self.collection.create_index("updated_at")
+
+    def write_many(self, points_by_coin, insert_only=False, batch_size=1000, label=None):
+        """
+        Write points of many coins
+
+        Time-series collections have no upserts: points that already exist are
+        skipped (insert_only) or deleted and inserted again.
+        """
+        points_by_coin = {coin_id: points for coin_id, points in points_by_coin.items() if points}
+        if not points_by_coin:
+            return 0, 0
+
+        timestamps = [timestamp for points in points_by_coin.values() for timestamp in points]
+        existing = {
+            (doc['coin_id'], doc['timestamp'])
+            for doc in self.collection.find(
+                {
+                    'coin_id': {'$in': list(points_by_coin)},
+                    'timestamp': {'$gte': min(timestamps), '$lte': max(timestamps)}
+                },
+                {'_id': 0, 'coin_id': 1, 'timestamp': 1}
+            )
+        }
+
+        replaced = {}
+        for coin_id, points in list(points_by_coin.items()):
+            stored = [ts for ts in points if (coin_id, ts) in existing]
+            if insert_only:
+                points_by_coin[coin_id] = {ts: stats for ts, stats in points.items() if (coin_id, ts) not in existing}
+            elif stored:
+                replaced[coin_id] = stored
+        if replaced:
+            self.collection.delete_many({'$or': [
+                {'coin_id': coin_id, 'timestamp': {'$in': stored}} for coin_id, stored in replaced.items()
+            ]})
+
+        now = datetime.now()
+        operations = [
+            InsertOne({
+                "coin_id": coin_id,
+                "timestamp": timestamp,
+                "stats": stats,
+                "updated_at": now
+            })
+            for coin_id, points in points_by_coin.items()
+            for timestamp, stats in points.items()
+        ]
+        return _bulk_write(self.collection, operations, batch_size, label or f"{len(points_by_coin)} coins")
+
+    def storage_stats(self):
+        stats = self.db.command('collStats', self.collection_name)
+        timeseries = stats.get('timeseries', {})
+        return {
+            # Points live in internal bucket documents; count the points themselves
+            'count': self.collection.estimated_document_count(),
+            'buckets': timeseries.get('bucketCount'),
+            'storage_size': stats.get('storageSize', 0),
+            'index_size': stats.get('totalIndexSize', 0)
+        }
+
+
+class BucketHistoricalStore(DocumentHistoricalStore):
+    """
+    One document per coin and calendar month with parallel point arrays
+
+        {coin_id, bucket_start, timestamps: [...], price: [...], market_cap: [...],
+         volume: [...], count, min_ts, max_ts, updated_at}
+
+    New points are appended with $push and points already in a bucket are updated in
+    place by array position, so a one-year read of a coin fetches 12 documents.
+    Arrays are kept in arrival order; readers must not assume they are sorted.
+    """
+    layout = 'buckets'
+    collection_name = 'historical_buckets'
+
+    @staticmethod
+    def bucket_start(timestamp):
+        return datetime(timestamp.year, timestamp.month, 1)
+
+    def ensure_indexes(self):
+        self.collection.create_index([("coin_id", 1), ("bucket_start", 1)], unique=True)
+        self.collection.create_index([("coin_id", 1), ("max_ts", -1)])
+        self.collection.create_index("updated_at")
+
+    def write_many(self, points_by_coin, insert_only=False, batch_size=1000, label=None):
+        by_bucket = {}
+        for coin_id, points in points_by_coin.items():
+            for timestamp, stats in points.items():
+                by_bucket.setdefault((coin_id, self.bucket_start(timestamp)), {})[timestamp] = stats
+        if not by_bucket:
+            return 0, 0
+
+        stored = {
+            (doc['coin_id'], doc['bucket_start']): doc.get('timestamps', [])
+            for doc in self.collection.find(
+                {
+                    'coin_id': {'$in': list({coin_id for coin_id, _ in by_bucket})},
+                    'bucket_start': {'$in': list({start for _, start in by_bucket})}
+                },
+                {'_id': 0, 'coin_id': 1, 'bucket_start': 1, 'timestamps': 1}
+            )
+        }
+
+        now = datetime.now()
+        operations = []
+        weights = []
+        for (coin_id, bucket_start), bucket_points in sorted(by_bucket.items()):
+            bucket_filter = {'coin_id': coin_id, 'bucket_start': bucket_start}
+            positions = {timestamp: i for i, timestamp in enumerate(stored.get((coin_id, bucket_start), []))}
+
+            # Points already in the bucket are overwritten at their array position
+            existing = [timestamp for timestamp in bucket_points if timestamp in positions]
+            if existing and not insert_only:
+                updates = {'updated_at': now}
+                for timestamp in existing:
+                    for field in POINT_FIELDS:
+                        updates[f'{field}.{positions[timestamp]}'] = bucket_points[timestamp].get(field)
+                operations.append(UpdateOne(bucket_filter, {'$set': updates}))
+                weights.append(len(existing))
+
+            # New points are appended; a separate update because $push on an array
+            # conflicts with $set on its elements
+            new = sorted(timestamp for timestamp in bucket_points if timestamp not in positions)
+            if new:
+                operations.append(UpdateOne(
+                    bucket_filter,
+                    {
+                        '$push': {
+                            'timestamps': {'$each': new},
+                            **{field: {'$each': [bucket_points[timestamp].get(field) for timestamp in new]}
+                               for field in POINT_FIELDS}
+                        },
+                        '$inc': {'count': len(new)},
+                        '$min': {'min_ts': new[0]},
+                        '$max': {'max_ts': new[-1]},
+                        '$set': {'updated_at': now}
+                    },
+                    upsert=True
+                ))
+                weights.append(len(new))
+
+        return _bulk_write(self.collection, operations, batch_size, label or f"{len(points_by_coin)} coins", weights)
+
+    document_order = [('coin_id', 1), ('bucket_start', 1)]
+
+    def point_query(self, coin_ids=None, start=None, end=None, fields=POINT_FIELDS):
+        """find() arguments selecting the buckets that overlap the range; points come out of a bucket unsorted"""
+        query = {}
+        if coin_ids is not None:
+            query['coin_id'] = {'$in': list(coin_ids)}
+        if start is not None:
+            query['max_ts'] = {'$gte': start}
+        if end is not None:
+            query['min_ts'] = {'$lte': end}
+        projection = {'_id': 0, 'coin_id': 1, 'timestamps': 1}
+        projection.update({field: 1 for field in fields})
+        return {'filter': query, 'projection': projection}
+
+    def document_points(self, doc, start=None, end=None, fields=POINT_FIELDS):
+        for i, timestamp in enumerate(doc.get('timestamps', [])):
+            if (start is None or timestamp >= start) and (end is None or timestamp <= end):
+                yield {
+                    'coin_id': doc['coin_id'],
+                    'timestamp': timestamp,
+                    'stats': {field: doc[field][i] for field in fields}
+                }
+
+    def _iter_bucket_points(self, cursor, start=None, end=None, fields=POINT_FIELDS):
+        for doc in cursor:
+            yield from self.document_points(doc, start, end, fields)
+
+    def existing_timestamps(self, coin_id, start, end):
+        cursor = self.collection.find(
+            {'coin_id': coin_id, 'max_ts': {'$gte': start}, 'min_ts': {'$lte': end}},
+            {'_id': 0, 'coin_id': 1, 'timestamps': 1}
+        )
+        return {point['timestamp'] for point in self._iter_bucket_points(cursor, start, end, fields=())}
+
+    def latest_point(self, coin_id):
+        bucket = self.collection.find_one({'coin_id': coin_id}, sort=[('max_ts', -1)])
+        if not bucket or not bucket.get('timestamps'):
+            return None
+        return self.latest_point_of(bucket)
+
+    def find_points(self, coin_ids, start, end=None, fields=POINT_FIELDS):
+        cursor = self.collection.find(**self.point_query(coin_ids, start, end, fields))
+        return self._iter_bucket_points(cursor, start, end, fields)
+
+    def coins_with_points_since(self, start):
+        return list(self.collection.distinct('coin_id', {'max_ts': {'$gte': start}}))
+
+    def earliest_point_written_since(self, since):
+        # A rewritten bucket is only known to hold the new points somewhere after its min_ts
+        earliest = self.collection.find_one({'updated_at': {'$gt': since}}, {'min_ts': 1}, sort=[('min_ts', 1)])
+        return earliest.get('min_ts') if earliest else None
+
+    def find_point_arrays(self, coin_ids, start, end=None, fields=POINT_FIELDS):
+        # Buckets already hold column arrays; each one is copied in as a block
+        builder = PointArrayBuilder(coin_ids, fields, capacity=_expected_points(coin_ids, start, end))
+        for doc in self.collection.find(**self.point_query(coin_ids, start, end, fields)):
+            timestamps = np.array(doc.get('timestamps', []), dtype='datetime64[ms]')
+            in_range = timestamps >= np.datetime64(start, 'ms')
+            if end is not None:
+                in_range &= timestamps <= np.datetime64(end, 'ms')
+            builder.extend(
+                doc['coin_id'],
+                timestamps[in_range].view(np.int64),
+                [np.array(doc[field], dtype=np.float64)[in_range] for field in fields]
+            )
+        return builder.finish()
+
+    def point_stages(self):
+        return [
+            {'$unwind': {'path': '$timestamps', 'includeArrayIndex': '_point'}},
+            {
+                '$project': {
+                    '_id': 0,
+                    'coin_id': 1,
+                    'timestamp': '$timestamps',
+                    'updated_at': 1,
+                    'stats': {field: {'$arrayElemAt': [f'${field}', '$_point']} for field in POINT_FIELDS}
+                }
+            }
+        ]
+
+    def latest_points(self):
+        cursor = self.collection.aggregate([
+            {'$sort': {'coin_id': 1, 'max_ts': -1}},
+            {'$group': {'_id': '$coin_id', 'bucket': {'$first': '$$ROOT'}}}
+        ], allowDiskUse=True)
+        return [self.latest_point_of(doc['bucket']) for doc in cursor]
+
+    @staticmethod
+    def latest_point_of(bucket):
+        """Newest point of a bucket document"""
+        i = max(range(len(bucket['timestamps'])), key=bucket['timestamps'].__getitem__)
+        return {
+            'coin_id': bucket['coin_id'],
+            'timestamp': bucket['timestamps'][i],
+            'stats': {field: bucket[field][i] for field in POINT_FIELDS}
+        }
+
+    def storage_stats(self):
+        stats = self.db.command('collStats', self.collection_name)
+        counted = list(self.collection.aggregate([{'$group': {'_id': None, 'count': {'$sum': '$count'}}}]))
+        return {
+            'count': counted[0]['count'] if counted else 0,
+            'buckets': stats.get('count', 0),
+            'storage_size': stats.get('storageSize', 0),
+            'index_size': stats.get('totalIndexSize', 0)
+        }
+
+
+STORES = {
+    'documents': DocumentHistoricalStore,
+    'timeseries': TimeSeriesHistoricalStore,
+    'buckets': BucketHistoricalStore
+}
+
+
+def get_historical_store(db, layout='documents'):
+    """Store for a layout name"""
+    if layout not in STORES:
+        raise ValueError(f"Unknown historical layout '{layout}', expected one of {tuple(STORES)}")
+    return STORES[layout](db)
+
+
+def migrate_historical_layout(db, layout, batch_size=10000):
+    """
+    Copy historical_data into another layout
+
+    Coins are copied one at a time, and only points newer than the newest point the
+    target already has for the coin, so an interrupted migration can be run again.
+
+    Returns:
+        int: number of points copied
+    """
+    source = DocumentHistoricalStore(db)
+    target = get_historical_store(db, layout)
+    if target.layout == source.layout:
+        raise ValueError("Target layout must differ from the documents layout")
+    target.ensure_indexes()
+
+    coin_ids = sorted(source.collection.distinct('coin_id'))
+    copied = 0
+    for i, coin_id in enumerate(coin_ids, start=1):
+        latest = target.latest_point(coin_id)
+        query = {'coin_id': coin_id}
+        if latest:
+            query['timestamp'] = {'$gt': latest['timestamp']}
+
+        cursor = source.collection.find(
+            query,
+            {'_id': 0, 'coin_id': 1, 'timestamp': 1, 'stats': 1, 'updated_at': 1}
+        ).sort('timestamp', 1)
+
+        points = {}
+        for doc in cursor:
+            points[doc['timestamp']] = doc.get('stats', {})
+            if len(points) >= batch_size:
+                copied += target.write_points(coin_id, points, insert_only=True, batch_size=batch_size)[0]
+                points = {}
+        if points:
+            copied += target.write_points(coin_id, points, insert_only=True, batch_size=batch_size)[0]
+
+        if i % 100 == 0:
+            logging.info(f"Migrated {i}/{len(coin_ids)} coins to {layout}, {copied} points copied")
+
+    logging.info(f"Migration to {layout} layout completed: {copied} points copied for {len(coin_ids)} coins")
+    return copied
+
+
+def _time_query(fn, repeat):
+    """Mean wall time of fn() in milliseconds"""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        durations.append((time.perf_counter() - start) * 1000)
+    return sum(durations) / len(durations)
+
+
+def benchmark_historical_layouts(db, layouts=LAYOUTS, sample_size=20, days=365, repeat=3):
+    """
+    Compare query latency and disk footprint of historical layouts
+
+    Measures, per layout:
+      - range_scan_ms: reading `days` of points for one coin (mean over a coin sample)
+      - range_scan_batch_ms: reading `days` of points for the whole sample at once
+      - latest_per_coin_ms: newest point of every coin
+      - storage / index sizes from collStats
+
+    Returns:
+        dict: layout -> measurements
+    """
+    coin_ids = DocumentHistoricalStore(db).collection.distinct('coin_id')
+    sample = random.sample(coin_ids, min(sample_size, len(coin_ids)))
+    start = datetime.now() - timedelta(days=days)
+
+    results = {}
+    for layout in layouts:
+        store = get_historical_store(db, layout)
+        if store.collection_name not in db.list_collection_names():
+            logging.warning(f"Skipping {layout} layout: {store.collection_name} does not exist, migrate first")
+            continue
+
+        def range_scan():
+            for coin_id in sample:
+                list(store.find_points([coin_id], start))
+
+        def range_scan_batch():
+            list(store.find_points(sample, start))
+
+        def latest_per_coin():
+            store.latest_points()
+
+        results[layout] = {
+            'range_scan_ms': _time_query(range_scan, repeat) / max(len(sample), 1),
+            'range_scan_batch_ms': _time_query(range_scan_batch, repeat),
+            'latest_per_coin_ms': _time_query(latest_per_coin, repeat),
+            **store.storage_stats()
+        }
+        logging.info(f"Benchmark {layout}: {results[layout]}")
+
+    return results
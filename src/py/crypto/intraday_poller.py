@@ -0,0 +1,145 @@
+"""
+Intraday market snapshots for the short metric windows (15min to 12h).
+
+daily_update writes one point per coin at midnight, which leaves the sub-day
+performance/rank windows without data. IntradayPoller pulls the top
+`coins/markets` pages every `interval_seconds` and appends one point per coin,
+stamped with the start of the poll interval so every coin of a cycle shares the
+same timestamp. Each page is written as it arrives with one bulk write to the
+historical store (plus one to latest_snapshot), and the rollups are refreshed
+once per cycle.
+
+API use is bounded by a daily call budget: the number of pages polled per cycle
+is capped so that pages * cycles_per_day stays within it, and a cycle is skipped
+when the calls made over the last 24 hours have used the budget up.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+# API calls the poller may use in any 24 hours unless configured otherwise
+DEFAULT_DAILY_CALL_BUDGET = 2000
+
+
+class IntradayPoller:
+    """
+    Poll coins/markets pages on a fixed interval and store them as intraday points
+
+    Args:
+        db_manager: CryptoDataManager the points are written through
+        client_factory: returns a new AsyncCoinGeckoClient (CryptoDataCollector.api_client)
+        interval_seconds: time between polls, and the spacing of the stored timestamps
+        pages: coins/markets pages wanted per cycle (ordered by market cap)
+        per_page: coins per page, 250 at most
+        daily_call_budget: API calls the poller may use in any 24 hours
+    """
+    MAX_PER_PAGE = 250
+
+    def __init__(self,
+                 db_manager,
+                 client_factory,
+                 interval_seconds=300,
+                 pages=4,
+                 per_page=250,
+                 daily_call_budget=DEFAULT_DAILY_CALL_BUDGET):
+        self.db_manager = db_manager
+        self.client_factory = client_factory
+        self.interval_seconds = interval_seconds
+        self.per_page = min(per_page, self.MAX_PER_PAGE)
+        self.daily_call_budget = daily_call_budget
+
+        cycles_per_day = max(1, 86400 // interval_seconds)
+        self.pages = min(pages, daily_call_budget // cycles_per_day)
+        if self.pages < pages:
+            logging.warning(f"Daily budget of {daily_call_budget} calls allows {self.pages} of {pages} pages "
+                            f"every {interval_seconds}s")
+        if self.pages < 1:
+            raise ValueError(f"Daily budget of {daily_call_budget} calls is too small to poll every {interval_seconds}s")
+
+        self._calls = deque()  # (monotonic time, calls) of recent cycles
+        self.cycles = 0
+        self.points_written = 0
+
+    def calls_in_last_day(self):
+        cutoff = time.monotonic() - 86400
+        while self._calls and self._calls[0][0] < cutoff:
+            self._calls.popleft()
+        return sum(calls for _, calls in self._calls)
+
+    def cycle_timestamp(self, now=None):
+        """Start of the poll interval containing `now`"""
+        now = now or datetime.now()
+        midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        elapsed = int((now - midnight).total_seconds())
+        return midnight + timedelta(seconds=elapsed - elapsed % self.interval_seconds)
+
+    async def poll_once(self):
+        """
+        Run one poll cycle
+
+        Returns:
+            int: number of points written (0 when the cycle was skipped)
+        """
+        if self.calls_in_last_day() + self.pages > self.daily_call_budget:
+            logging.warning(f"Intraday call budget of {self.daily_call_budget}/day used up, skipping cycle")
+            return 0
+
+        timestamp = self.cycle_timestamp()
+        written_coins = set()
+
+        async with self.client_factory() as client:
+            async def fetch(page_id):
+                return page_id, await client.get_market_data_page(page_id, self.per_page)
+
+            tasks = [asyncio.ensure_future(fetch(page_id)) for page_id in range(1, self.pages + 1)]
+            try:
+                # Pages are written as they arrive, one bulk write each
+                for finished in asyncio.as_completed(tasks):
+                    page_id, rows = await finished
+                    if not rows:
+                        logging.warning(f"Intraday page {page_id} returned no data")
+                        continue
+                    written = await asyncio.to_thread(self.db_manager.write_market_page, timestamp, rows)
+                    written_coins.update(written)
+            finally:
+                for task in tasks:
+                    task.cancel()
+            self._calls.append((time.monotonic(), client.query_count))
+
+        if written_coins:
+            await asyncio.to_thread(
+                self.db_manager.rollups.update,
+                {coin_id: (timestamp, timestamp) for coin_id in written_coins}
+            )
+
+        self.cycles += 1
+        self.points_written += len(written_coins)
+        logging.info(f"Intraday cycle {self.cycles} at {timestamp}: {len(written_coins)} points, "
+                     f"{self.calls_in_last_day()} calls in the last 24h")
+        print(f"Intraday cycle {self.cycles} at {timestamp}: {len(written_coins)} points")
+        return len(written_coins)
+
+    async def run(self, max_cycles=None):
+        """
+        Poll until stopped, aligned to interval boundaries
+
+        Args:
+            max_cycles: number of cycles to attempt, counting failed and skipped ones
+        """
+        logging.info(f"Starting intraday poller: {self.pages} pages x {self.per_page} coins "
+                     f"every {self.interval_seconds}s, budget {self.daily_call_budget} calls/day")
+        attempts = 0
+        while max_cycles is None or attempts < max_cycles:
+            attempts += 1
+            try:
+                await self.poll_once()
+            except Exception as e:
+                logging.error(f"Error in intraday cycle: {str(e)}")
+            if attempts == max_cycles:
+                break
+
+            next_cycle = self.cycle_timestamp() + timedelta(seconds=self.interval_seconds)
+            await asyncio.sleep(max(0.0, (next_cycle - datetime.now()).total_seconds()))
@@ -0,0 +1,380 @@
+"""
+Vectorized building blocks for CryptoDataManager.calculate_timeseries_metrics_benchmarked.
+
+A batch of historical_data rows is turned into dense (dates x coins) matrices
+once, and every rank / period change is computed with whole-array operations
+instead of per-date filtering and iterrows().
+"""
+
+import logging
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from time_index import TimeIndex
+
+# An observation may stand in for dates up to this many grid steps after it
+STALENESS_STEPS = 3
+
+
+def pivot_batch(df, coin_ids):
+    """
+    Pivot a batch of historical_data rows into dense (dates x coins) matrices
+
+    Args:
+        df (pd.DataFrame): rows with 'date', 'coin_id', 'price' and 'market_cap' columns,
+            plus 'timestamp' when several rows may fall on one date
+        coin_ids (list): coin ids of the batch, defines the column order
+
+    Returns:
+        tuple: (dates, prices, mcaps) where dates is a sorted datetime64 array and
+               prices/mcaps are float64 matrices of shape (len(dates), len(coin_ids))
+               with NaN where a coin has no data for a date
+    """
+    # Stores return points in storage order (bucket arrays keep arrival order), so put
+    # them in time order first: the latest point of a date must be the one that wins
+    if 'timestamp' in df.columns:
+        df = df.sort_values('timestamp', kind='stable')
+
+    dates, date_codes = np.unique(df['date'].values, return_inverse=True)
+    coin_codes = pd.Index(coin_ids).get_indexer(df['coin_id'].values)
+
+    # Rows for coins outside the batch are dropped
+    in_batch = coin_codes >= 0
+    date_codes = date_codes[in_batch]
+    coin_codes = coin_codes[in_batch]
+
+    shape = (len(dates), len(coin_ids))
+    prices = np.full(shape, np.nan)
+    mcaps = np.full(shape, np.nan)
+
+    # The latest row of a (date, coin) overwrites the earlier ones, like the old per-day loop
+    prices[date_codes, coin_codes] = pd.to_numeric(df['price'], errors='coerce').values[in_batch]
+    mcaps[date_codes, coin_codes] = pd.to_numeric(df['market_cap'], errors='coerce').values[in_batch]
+
+    return dates, prices, mcaps
+
+
+def universe_rank_table(caps_by_date):
+    """
+    Market caps of every coin on each grid date, sorted for rank lookups
+
+    Args:
+        caps_by_date (dict): datetime64 date -> ascending array of the non-missing
+            (forward-filled) market caps of the whole coin universe on that date
+
+    Returns:
+        tuple: (TimeIndex over the dates, market caps sorted ascending in every row with
+               NaN padding last, number of market caps per row)
+    """
+    dates = sorted(caps_by_date)
+    counts = np.array([len(caps_by_date[date]) for date in dates], dtype=np.int64)
+    sorted_caps = np.full((len(dates), int(counts.max()) if len(dates) else 0), np.nan)
+    for row, date in enumerate(dates):
+        sorted_caps[row, :counts[row]] = caps_by_date[date]
+    return TimeIndex(np.array(dates, dtype='datetime64[ns]'), assume_sorted=True), sorted_caps, counts
+
+
+def ranks_among(rank_table, dates, mcaps):
+    """
+    Rank of each market cap among the whole universe as of its date
+
+    1 + the number of larger market caps, like rank_at; NaN where the market cap is
+    missing or the table has no date at or before it.
+    """
+    time_index, sorted_caps, counts = rank_table
+    rows = np.atleast_1d(time_index.locate(dates, how='previous'))
+    ranks = np.full(len(mcaps), np.nan)
+    for i in np.flatnonzero((rows >= 0) & ~np.isnan(mcaps)):
+        row = rows[i]
+        ranks[i] = counts[row] - np.searchsorted(sorted_caps[row, :counts[row]], mcaps[i], side='right') + 1
+    return ranks
+
+
+def staleness_limit(dates):
+    """
+    Oldest an observation may be and still stand in for a later date of the grid:
+    STALENESS_STEPS typical grid steps (median spacing), None for fewer than 2 dates
+    """
+    if len(dates) < 2:
+        return None
+    return np.median(np.diff(dates)) * STALENESS_STEPS
+
+
+def forward_fill_rows(values):
+    """
+    Row of the last observation at or before every row, per column of a (dates x coins) matrix
+
+    Returns:
+        np.ndarray: int matrix of the same shape, -1 before a column's first observation
+    """
+    rows = np.arange(values.shape[0])[:, None]
+    return np.maximum.accumulate(np.where(np.isnan(values), -1, rows), axis=0)
+
+
+def take_rows(values, rows):
+    """values[rows[i, j], j] (or values[rows[j], j] for one row per column), NaN where rows is -1"""
+    cols = np.arange(values.shape[1])
+    taken = values[np.maximum(rows, 0), cols]
+    return np.where(rows >= 0, taken, np.nan)
+
+
+def forward_fill(values, dates, max_staleness=None):
+    """Forward-fill every column of a (dates x coins) matrix, leaving gaps longer than max_staleness NaN"""
+    filled_rows = forward_fill_rows(values)
+    if max_staleness is not None:
+        age = dates[:, None] - dates[np.maximum(filled_rows, 0)]
+        filled_rows = np.where(age <= max_staleness, filled_rows, -1)
+    return take_rows(values, filled_rows)
+
+
+def asof_rows(time_index, observed_rows, targets, max_staleness=None):
+    """
+    Row of every coin's last observation at or before its own target date
+
+    Args:
+        time_index (TimeIndex): index over the grid dates
+        observed_rows (np.ndarray): forward_fill_rows of the coins' observations
+        targets (np.ndarray): one datetime64 target per coin
+        max_staleness: largest allowed distance between a target and the observation
+
+    Returns:
+        np.ndarray: one row per coin, -1 where the coin has no usable observation
+    """
+    target_rows = np.atleast_1d(time_index.locate(targets, how='previous'))
+    rows = observed_rows[np.maximum(target_rows, 0), np.arange(observed_rows.shape[1])]
+    rows = np.where(target_rows >= 0, rows, -1)
+    if max_staleness is not None:
+        age = targets - time_index.timestamps[np.maximum(rows, 0)]
+        rows[age > max_staleness] = -1
+    return rows
+
+
+def period_changes(prices, latest_rows, base_rows, latest_ranks, base_ranks):
+    """
+    Compute price and rank changes between per-coin rows of the batch matrices
+
+    Args:
+        latest_rows (np.ndarray): row of each coin's latest observation
+        base_rows (np.ndarray): row of each coin's baseline observation, -1 where it has none
+        latest_ranks, base_ranks (np.ndarray): rank of each coin on those rows, NaN where unknown
+
+    Returns:
+        tuple: (price_change, rank_change, valid) arrays over the batch coins. price_change
+               is in percent, rank_change is 0 where either rank is missing, and valid marks
+               coins that have a usable price on both rows.
+    """
+    latest_prices = take_rows(prices, latest_rows)
+    base_prices = take_rows(prices, base_rows)
+
+    valid = (base_rows >= 0) & (base_rows < latest_rows) & ~np.isnan(latest_prices) & ~np.isnan(base_prices) & (base_prices != 0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        price_change = (latest_prices - base_prices) / base_prices * 100
+
+    rank_diff = latest_ranks - base_ranks
+    rank_change = np.where(np.isnan(rank_diff), 0, rank_diff).astype(np.int64)
+
+    return price_change, rank_change, valid
+
+
+def changed_fields(current_change, fields):
+    """
+    Keep only the 'stats.change.*' fields whose value differs from the coin's stored stats.change
+
+    Args:
+        current_change (dict): the coin's current stats.change sub-document
+        fields (dict): new values keyed by 'stats.change.<name>'
+    """
+    prefix = 'stats.change.'
+    return {
+        key: value for key, value in fields.items()
+        if not key.startswith(prefix) or current_change.get(key[len(prefix):]) != value
+    }
+
+
+def category_ranks_by_coin(global_market_caps, categories):
+    """
+    Rank coins inside every category in one grouped pass over the global market caps
+
+    Args:
+        global_market_caps (list): latest market cap per coin as [{'_id': coin_id, 'market_cap': value}]
+        categories (list): category documents with 'name' and 'coins' fields
+
+    Returns:
+        dict: coin_id -> {category_name: rank}
+    """
+    membership = pd.DataFrame(
+        [(category['name'], category['coins']) for category in categories],
+        columns=['category', 'coin_id']
+    ).explode('coin_id').dropna().drop_duplicates()
+    caps = pd.DataFrame(global_market_caps, columns=['_id', 'market_cap']).rename(columns={'_id': 'coin_id'})
+
+    ranked = membership.merge(caps, on='coin_id', how='inner')
+    ranked = ranked.sort_values('market_cap', ascending=False, kind='stable')
+    ranked['rank'] = ranked.groupby('category').cumcount() + 1
+
+    coin_ranks = {}
+    for coin_id, category, rank in zip(ranked['coin_id'], ranked['category'], ranked['rank']):
+        coin_ranks.setdefault(coin_id, {})[category] = int(rank)
+    return coin_ranks
+
+
+def market_cap_rank_table(points):
+    """
+    Market caps of every coin at each timestamp, sorted for rank lookups
+
+    Args:
+        points (iterable): {'timestamp', 'market_cap'} rows, one per (coin, timestamp)
+
+    Returns:
+        dict: timestamp -> ascending float64 array of the non-missing market caps
+    """
+    caps_by_timestamp = {}
+    for point in points:
+        market_cap = point.get('market_cap')
+        if isinstance(market_cap, (int, float)) and not np.isnan(market_cap):
+            caps_by_timestamp.setdefault(point['timestamp'], []).append(market_cap)
+    return {timestamp: np.sort(np.asarray(caps, dtype=np.float64)) for timestamp, caps in caps_by_timestamp.items()}
+
+
+def rank_at(rank_table, timestamp, market_cap):
+    """Rank of a market cap among all coins at `timestamp`: 1 + the number of larger market caps"""
+    caps = rank_table.get(timestamp)
+    if caps is None or not isinstance(market_cap, (int, float)) or np.isnan(market_cap):
+        return 1
+    return int(len(caps) - np.searchsorted(caps, market_cap, side='right')) + 1
+
+
+def source_frame(df, rollup_frames, source, lookback, now):
+    """
+    Rows of the grid of one data source
+
+    Args:
+        df (pd.DataFrame): raw points with a 'date' column (the day of each point)
+        rollup_frames (dict): resolution -> rollup DataFrame
+        source: None (daily grid over raw points), 'raw' or a rollup resolution
+        lookback (timedelta): longest window read from the source
+    """
+    if source is None:
+        return df
+    if source == 'raw':
+        # Only the span of the raw windows, so the grid stays small
+        return df[df['timestamp'] >= now - 2 * lookback].assign(date=lambda rows: rows['timestamp'])
+    return rollup_frames.get(source, [])
+
+
+# Rank tables of the current metrics run, installed in every compute worker by set_rank_tables
+_rank_tables = {}
+
+
+def set_rank_tables(rank_tables):
+    """Compute pool initializer: install the rank tables compute_batch_changes ranks against"""
+    global _rank_tables
+    _rank_tables = rank_tables
+
+
+def compute_batch_changes(coin_batch, data, time_periods, period_sources, now):
+    """
+    Performance and rank change fields of one coin batch
+
+    Pure computation on already fetched data, so it can run in a worker process.
+    Ranks are looked up in the universe rank tables installed by set_rank_tables, so
+    a coin gets the same rank whichever coins share its batch.
+
+    Args:
+        coin_batch (list): coin ids of the batch
+        data (tuple): (points, rollup_frames) - PointArrays of the raw points and
+            {resolution: rollup DataFrame} for the periods read from rollups
+        time_periods (dict): period name -> window
+        period_sources (dict): period name -> None (daily grid over raw points),
+            'raw' or a rollup resolution
+        now (datetime): start of the metrics run
+
+    Returns:
+        list: one {'stats.change.<field>': value} dict per coin of the batch
+    """
+    points, rollup_frames = data
+    if len(points) == 0 and not rollup_frames:
+        logging.warning(f"No data found for batch of {len(coin_batch)} coins starting at {coin_batch[0]}")
+        return [{} for _ in coin_batch]
+
+    # Data conversion
+    df = points.to_frame()
+    df['date'] = df['timestamp'].dt.normalize()
+
+    # Determine data frequency for today
+    today = now.date()
+    today_data = df[df['timestamp'].dt.date == today].sort_values(['coin_id', 'timestamp'])
+    # Spacing between consecutive points of the same coin (intraday polls)
+    today_gaps = today_data.groupby('coin_id', observed=True)['timestamp'].diff().dropna().dt.total_seconds() / 60
+    today_gaps = today_gaps[today_gaps > 0]
+    min_time_diff = min(today_gaps) if len(today_gaps) > 0 else 1440
+
+    # Filter valid time periods based on data frequency
+    valid_time_periods = {}
+    for period_name, delta in time_periods.items():
+        period_minutes = delta.total_seconds() / 60
+        if period_minutes >= min_time_diff or period_name in ['24h', '7d', 'weekly', 'monthly', 'ytd', 'yearly']:
+            valid_time_periods[period_name] = delta
+
+    # One (dates x coins) grid per data source
+    grids = {}
+    for source in {period_sources[name] for name in valid_time_periods}:
+        lookback = max(time_periods[name] for name in valid_time_periods if period_sources[name] == source)
+        frame = source_frame(df, rollup_frames, source, lookback, now)
+        if len(frame) == 0:
+            continue
+        dates, prices, mcaps = pivot_batch(frame, coin_batch)
+
+        # Every coin is aligned on its own observations: ranks compare market caps
+        # forward-filled across short gaps, and changes run from each coin's latest point
+        max_staleness = staleness_limit(dates)
+        observed_rows = forward_fill_rows(prices)
+        grids[source] = (
+            TimeIndex(dates, assume_sorted=True),
+            prices,
+            forward_fill(mcaps, dates, max_staleness),
+            observed_rows,
+            observed_rows[-1],
+            max_staleness
+        )
+
+    coin_updates = [{} for _ in coin_batch]
+    for period_name, time_delta in time_periods.items():
+        if period_name not in valid_time_periods:
+            # Set zero changes for invalid periods
+            for fields in coin_updates:
+                fields[f'stats.change.performance_{period_name}'] = 0.0
+                fields[f'stats.change.rank_{period_name}'] = 0
+            continue
+
+        source = period_sources[period_name]
+        if source not in grids:
+            continue
+        time_index, prices, mcaps, observed_rows, latest_rows, max_staleness = grids[source]
+        latest_dates = time_index.timestamps[np.maximum(latest_rows, 0)]
+
+        # Baseline of each coin: its last observation as of its own latest date minus the window
+        if period_name == 'ytd':
+            target_dates = np.full(len(latest_rows), np.datetime64(datetime(now.year, 1, 1), 'ns'))
+        elif source is None:
+            target_dates = latest_dates - np.timedelta64(time_delta.days, 'D')
+        else:
+            target_dates = latest_dates - np.timedelta64(int(time_delta.total_seconds()), 's')
+
+        base_rows = asof_rows(time_index, observed_rows, target_dates, max_staleness)
+        base_dates = time_index.timestamps[np.maximum(base_rows, 0)]
+        if source in _rank_tables:
+            latest_ranks = ranks_among(_rank_tables[source], latest_dates, take_rows(mcaps, latest_rows))
+            base_ranks = ranks_among(_rank_tables[source], base_dates, take_rows(mcaps, base_rows))
+        else:
+            latest_ranks = base_ranks = np.full(len(coin_batch), np.nan)
+        price_change, rank_change, valid = period_changes(prices, latest_rows, base_rows, latest_ranks, base_ranks)
+
+        for idx in np.flatnonzero(valid):
+            coin_updates[idx][f'stats.change.performance_{period_name}'] = round(float(price_change[idx]), 2)
+            coin_updates[idx][f'stats.change.rank_{period_name}'] = int(rank_change[idx])
+
+    return coin_updates
@@ -0,0 +1,187 @@
+"""
+Pipelined execution of the metrics engine's coin batches.
+
+Every batch goes through three stages:
+
+- fetch: MongoDB reads, on a thread pool sized to the connection pool
+- compute: the NumPy change calculation, on a process pool (one worker per core
+  minus the one driving I/O) so it is not held to a single core by the GIL
+- write: the bulk write of the results, on one thread
+
+Stages overlap across batches: batch N+1 is fetched while batch N computes and
+batch N-1 is written. At most max_in_flight batches are held at once, and
+results are reported in batch order however they complete.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Sequence
+
+from scan_executor import BACKENDS
+
+STAGES = ('fetch', 'compute', 'write')
+
+
+def _timed_call(func, *args):
+    """Run func(*args) and return (result, seconds); module level so process workers can run it"""
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+class _InlineExecutor:
+    """Executor interface running each call in the submitting thread"""
+
+    def submit(self, func, *args):
+        future = Future()
+        try:
+            future.set_result(func(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+
+class MetricsPipeline:
+    """
+    Run fetch -> compute -> write over a sequence of batches with the stages overlapping
+
+    Args:
+        fetch: fetch(batch) -> data, called on an I/O thread
+        compute: compute(batch, data) -> result; must be a picklable module-level
+            function (or functools.partial of one) for the process backend
+        write: write(batch, result) -> written, called on the writer thread
+        backend: where compute runs, 'inline', 'thread' or 'process'
+        compute_workers: compute pool size, cores - 1 by default
+        io_workers: fetch threads, bounded by max_pool_size
+        max_pool_size: MongoDB connections available to the fetch threads
+        initializer: called as initializer(*initargs) in every compute worker before
+            its first batch (once in this process for the inline and thread backends)
+    """
+
+    def __init__(self,
+                 fetch: Callable,
+                 compute: Callable,
+                 write: Callable,
+                 backend: str = 'process',
+                 compute_workers: Optional[int] = None,
+                 io_workers: Optional[int] = None,
+                 max_pool_size: int = 100,
+                 max_in_flight: Optional[int] = None,
+                 initializer: Optional[Callable] = None,
+                 initargs: tuple = ()):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown metrics backend '{backend}', expected one of {BACKENDS}")
+        self.fetch = fetch
+        self.compute = compute
+        self.write = write
+        self.backend = backend
+        self.compute_workers = compute_workers or max(1, (os.cpu_count() or 1) - 1)
+        # Leave half of the connections to the writer and everything else using the client
+        self.io_workers = io_workers or max(1, min(self.compute_workers, max_pool_size // 2))
+        self.max_in_flight = max_in_flight or self.compute_workers + self.io_workers + 1
+        self.initializer = initializer
+        self.initargs = initargs
+
+        self.timings = {stage: 0.0 for stage in STAGES}
+        self._lock = threading.Lock()
+
+    def _compute_executor(self):
+        if self.backend == 'process':
+            return ProcessPoolExecutor(max_workers=self.compute_workers,
+                                       initializer=self.initializer, initargs=self.initargs)
+        if self.initializer is not None:
+            self.initializer(*self.initargs)
+        if self.backend == 'inline':
+            return _InlineExecutor()
+        return ThreadPoolExecutor(max_workers=self.compute_workers)
+
+    def _record(self, stage, seconds):
+        with self._lock:
+            self.timings[stage] += seconds
+
+    def _submit(self, batch, io_pool, compute_pool, write_pool) -> Future:
+        """Chain the three stages of one batch; the returned future resolves to write's result"""
+        done = Future()
+
+        def fail(e):
+            if not done.done():
+                done.set_exception(e)
+
+        def after_write(future):
+            try:
+                written, seconds = future.result()
+                self._record('write', seconds)
+                done.set_result(written)
+            except Exception as e:
+                fail(e)
+
+        def after_compute(future):
+            try:
+                result, seconds = future.result()
+                self._record('compute', seconds)
+                write_pool.submit(_timed_call, self.write, batch, result).add_done_callback(after_write)
+            except Exception as e:
+                fail(e)
+
+        def after_fetch(future):
+            try:
+                data, seconds = future.result()
+                self._record('fetch', seconds)
+                compute_pool.submit(_timed_call, self.compute, batch, data).add_done_callback(after_compute)
+            except Exception as e:
+                fail(e)
+
+        io_pool.submit(_timed_call, self.fetch, batch).add_done_callback(after_fetch)
+        return done
+
+    def run(self, batches: Sequence, on_result: Optional[Callable] = None) -> Dict:
+        """
+        Process every batch
+
+        Args:
+            on_result: called as on_result(index, batch, written) in batch order
+
+        Returns:
+            dict: per-stage busy seconds ('fetch', 'compute', 'write') and 'wall' seconds
+        """
+        logging.info(f"Metrics pipeline: {len(batches)} batches, {self.io_workers} fetch threads, "
+                     f"{self.compute_workers} {self.backend} compute workers, {self.max_in_flight} batches in flight")
+        start = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=self.io_workers) as io_pool, \
+                self._compute_executor() as compute_pool, \
+                ThreadPoolExecutor(max_workers=1) as write_pool:
+            if self.backend == 'process':
+                # Start the workers from this thread before any I/O thread runs, so
+                # they are not forked while another thread holds a lock
+                compute_pool.submit(int).result()
+
+            in_flight = deque()
+            for index, batch in enumerate(batches):
+                in_flight.append((index, batch, self._submit(batch, io_pool, compute_pool, write_pool)))
+                if len(in_flight) >= self.max_in_flight:
+                    self._finish(in_flight.popleft(), on_result)
+            while in_flight:
+                self._finish(in_flight.popleft(), on_result)
+
+        timings = dict(self.timings, wall=time.perf_counter() - start)
+        logging.info("Metrics pipeline stage times: " +
+                     ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in timings.items()))
+        return timings
+
+    @staticmethod
+    def _finish(entry, on_result):
+        index, batch, future = entry
+        written = future.result()
+        if on_result is not None:
+            on_result(index, batch, written)
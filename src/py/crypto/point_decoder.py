@@ -0,0 +1,168 @@
+"""
+Streaming decoding of historical points into typed NumPy arrays.
+
+Reading points as Python dicts costs about a kilobyte per point once the nested
+stats dict and the DataFrame built from them are counted. The decoders here
+fill preallocated columns instead (coin index int32, epoch milliseconds int64
+and one float64 column per stats field, 28 bytes per point for price and
+market cap):
+
+- with PyMongoArrow installed, the server result is decoded to arrays in C
+- otherwise cursor batches are read as raw BSON and only the needed fields of
+  each document are decoded, one batch at a time
+"""
+
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Sequence
+
+import numpy as np
+import pandas as pd
+from bson import decode_all
+from bson.codec_options import CodecOptions, DatetimeConversion
+from bson.raw_bson import RawBSONDocument
+
+try:
+    from pymongoarrow.api import Schema, aggregate_numpy_all
+    HAS_PYMONGOARROW = True
+except ImportError:
+    HAS_PYMONGOARROW = False
+
+RAW_CODEC_OPTIONS = CodecOptions(document_class=RawBSONDocument, datetime_conversion=DatetimeConversion.DATETIME_MS)
+
+
+@dataclass
+class PointArrays:
+    """Columns of decoded points; coin holds positions into coin_ids"""
+    coin_ids: List[str]
+    coin: np.ndarray  # int32
+    timestamp: np.ndarray  # datetime64[ms]
+    values: Dict[str, np.ndarray]  # field -> float64, NaN where missing
+
+    def __len__(self):
+        return len(self.coin)
+
+    def to_frame(self) -> pd.DataFrame:
+        """Flat DataFrame with a categorical coin_id column, built from the arrays without copying rows"""
+        return pd.DataFrame({
+            'coin_id': pd.Categorical.from_codes(self.coin, categories=self.coin_ids),
+            'timestamp': self.timestamp.astype('datetime64[ns]'),
+            **self.values
+        })
+
+
+class PointArrayBuilder:
+    """Append-only typed columns, doubled in place when full"""
+
+    def __init__(self, coin_ids: Sequence[str], fields: Sequence[str], capacity: int = 1024):
+        self.coin_ids = list(coin_ids)
+        self.coin_index = {coin_id: i for i, coin_id in enumerate(self.coin_ids)}
+        self.fields = tuple(fields)
+        self.size = 0
+        self._allocate(max(capacity, 1))
+
+    def _allocate(self, capacity):
+        columns = {
+            'coin': np.empty(capacity, dtype=np.int32),
+            'timestamp': np.empty(capacity, dtype=np.int64),
+            **{field: np.empty(capacity, dtype=np.float64) for field in self.fields}
+        }
+        if self.size:
+            for name, column in columns.items():
+                column[:self.size] = self.columns[name][:self.size]
+        self.columns = columns
+        self.capacity = capacity
+
+    def append(self, coin_id, epoch_ms, values):
+        """Add one point; values are in `fields` order, None for missing"""
+        coin = self.coin_index.get(coin_id)
+        if coin is None:
+            return
+        if self.size == self.capacity:
+            self._allocate(self.capacity * 2)
+        i = self.size
+        self.columns['coin'][i] = coin
+        self.columns['timestamp'][i] = epoch_ms
+        for field, value in zip(self.fields, values):
+            self.columns[field][i] = np.nan if value is None else value
+        self.size += 1
+
+    def extend(self, coin_id, epoch_ms, values):
+        """Add a block of points of one coin: an epoch milliseconds array and one array per field"""
+        coin = self.coin_index.get(coin_id)
+        n = len(epoch_ms)
+        if coin is None or n == 0:
+            return
+        if self.size + n > self.capacity:
+            self._allocate(max(self.capacity * 2, self.size + n))
+        block = slice(self.size, self.size + n)
+        self.columns['coin'][block] = coin
+        self.columns['timestamp'][block] = epoch_ms
+        for field, field_values in zip(self.fields, values):
+            self.columns[field][block] = np.asarray(field_values, dtype=np.float64)
+        self.size += n
+
+    def finish(self) -> PointArrays:
+        n = self.size
+        return PointArrays(
+            coin_ids=self.coin_ids,
+            coin=self.columns['coin'][:n],
+            timestamp=self.columns['timestamp'][:n].view('datetime64[ms]'),
+            values={field: self.columns[field][:n] for field in self.fields}
+        )
+
+
+def _numeric(value):
+    return value if isinstance(value, (int, float)) else None
+
+
+def decode_raw_batches(collection, query, coin_ids, fields, capacity=1024) -> PointArrays:
+    """
+    Stream the points matching `query` from a point-per-document collection
+
+    Cursor batches arrive as raw BSON; each document is wrapped without being parsed
+    and only coin_id, timestamp and the wanted stats fields are decoded.
+    """
+    builder = PointArrayBuilder(coin_ids, fields, capacity)
+    projection = {'_id': 0, 'coin_id': 1, 'timestamp': 1, **{f'stats.{field}': 1 for field in fields}}
+
+    for raw_batch in collection.find_raw_batches(query, projection):
+        for doc in decode_all(raw_batch, RAW_CODEC_OPTIONS):
+            stats = doc.get('stats') or {}
+            builder.append(
+                doc['coin_id'],
+                int(doc['timestamp']),
+                [_numeric(stats.get(field)) for field in fields]
+            )
+
+    return builder.finish()
+
+
+def decode_with_arrow(collection, query, coin_ids, fields) -> PointArrays:
+    """Decode the points matching `query` with PyMongoArrow, flattening stats on the server"""
+    pipeline = [
+        {'$match': query},
+        {'$project': {'_id': 0, 'coin_id': 1, 'timestamp': 1, **{field: f'$stats.{field}' for field in fields}}}
+    ]
+    schema = Schema({'coin_id': str, 'timestamp': datetime, **{field: float for field in fields}})
+    columns = aggregate_numpy_all(collection, pipeline, schema=schema)
+
+    coin = pd.Index(list(coin_ids)).get_indexer(columns['coin_id'])
+    keep = coin >= 0
+    return PointArrays(
+        coin_ids=list(coin_ids),
+        coin=coin[keep].astype(np.int32),
+        timestamp=columns['timestamp'][keep].astype('datetime64[ms]'),
+        values={field: np.asarray(columns[field], dtype=np.float64)[keep] for field in fields}
+    )
+
+
+def decode_points(collection, query, coin_ids, fields, capacity=1024) -> PointArrays:
+    """Decode with PyMongoArrow when it is installed, raw BSON batches otherwise"""
+    if HAS_PYMONGOARROW:
+        try:
+            return decode_with_arrow(collection, query, coin_ids, fields)
+        except Exception as e:
+            logging.warning(f"PyMongoArrow decoding failed, falling back to raw BSON: {str(e)}")
+    return decode_raw_batches(collection, query, coin_ids, fields, capacity)
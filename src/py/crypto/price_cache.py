@@ -0,0 +1,174 @@
+"""
+Bounded in-memory cache of per-coin price series for TechnicalAnalyzer.
+
+One entry is kept per coin: the longest series fetched so far. Any shorter
+lookback is served by slicing it. Entries are evicted least recently used first
+once the cache exceeds its memory budget, and they expire as soon as newer
+data has been ingested than existed when they were fetched.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+import pandas as pd
+
+
+@dataclass
+class CacheEntry:
+    start: datetime  # Earliest timestamp the series was fetched from
+    data: pd.DataFrame  # Price data indexed by timestamp
+    nbytes: int
+    watermark: Optional[datetime]  # Latest ingested timestamp when the series was fetched
+
+
+class PriceCache:
+    """
+    Thread-safe LRU cache of price DataFrames keyed by coin_id
+
+    Args:
+        max_bytes: memory budget for all cached series
+        watermark_fn: returns the latest ingested timestamp; entries fetched before
+            it last advanced are expired. Without it the watermark can be pushed with
+            set_watermark, otherwise entries only leave by eviction.
+        watermark_refresh_seconds: how long a watermark reading is reused before
+            watermark_fn is called again
+    """
+
+    def __init__(self,
+                 max_bytes: int = 256 * 1024 * 1024,
+                 watermark_fn: Optional[Callable[[], Optional[datetime]]] = None,
+                 watermark_refresh_seconds: float = 60):
+        self.max_bytes = max_bytes
+        self.watermark_fn = watermark_fn
+        self.watermark_refresh_seconds = watermark_refresh_seconds
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._watermark = None
+        self._watermark_checked = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def current_watermark(self) -> Optional[datetime]:
+        """Latest ingested timestamp, re-read at most every watermark_refresh_seconds"""
+        if self.watermark_fn is None:
+            return self._watermark
+
+        with self._lock:
+            now = time.monotonic()
+            if self._watermark_checked is not None and now - self._watermark_checked < self.watermark_refresh_seconds:
+                return self._watermark
+            self._watermark_checked = now
+
+        try:
+            watermark = self.watermark_fn()
+        except Exception as e:
+            logging.error(f"Error reading price cache watermark: {str(e)}")
+            return self._watermark
+
+        with self._lock:
+            self._watermark = watermark
+        return watermark
+
+    def set_watermark(self, watermark: Optional[datetime]):
+        """Set the latest ingested timestamp for caches without a watermark_fn"""
+        with self._lock:
+            self._watermark = watermark
+
+    def get(self, coin_id: str, start: datetime) -> Optional[pd.DataFrame]:
+        """
+        Price data of a coin from `start` on, or None on a miss
+
+        A cached series that starts at or before `start` is sliced; a shorter or
+        expired one counts as a miss.
+        """
+        watermark = self.current_watermark()
+
+        with self._lock:
+            entry = self._entries.get(coin_id)
+            if entry is not None and self._is_expired(entry, watermark):
+                self._remove(coin_id)
+                self.expirations += 1
+                entry = None
+
+            if entry is None or entry.start > start:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(coin_id)
+            self.hits += 1
+            data = entry.data
+
+        return data[data.index >= start]
+
+    def put(self, coin_id: str, start: datetime, data: pd.DataFrame, watermark: Optional[datetime] = None):
+        """
+        Cache a coin's price data fetched from `start` on
+
+        Args:
+            watermark: current_watermark() read before the data was fetched, so
+                points ingested during the fetch expire the entry
+        """
+        nbytes = int(data.memory_usage(index=True, deep=True).sum())
+        if nbytes > self.max_bytes:
+            return
+
+        with self._lock:
+            existing = self._entries.get(coin_id)
+            # Keep a longer series that is at least as fresh
+            if existing is not None and existing.start < start and not self._is_expired(existing, watermark):
+                return
+
+            if existing is not None:
+                self._remove(coin_id)
+            self._entries[coin_id] = CacheEntry(start, data, nbytes, watermark)
+            self._bytes += nbytes
+
+            while self._bytes > self.max_bytes:
+                evicted_id, _ = next(iter(self._entries.items()))
+                self._remove(evicted_id)
+                self.evictions += 1
+
+    def invalidate(self, coin_id: Optional[str] = None):
+        """Drop one coin, or everything when coin_id is None"""
+        with self._lock:
+            if coin_id is None:
+                self._entries.clear()
+                self._bytes = 0
+            elif coin_id in self._entries:
+                self._remove(coin_id)
+
+    def stats(self) -> Dict:
+        """Counters and current size"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _is_expired(entry: CacheEntry, watermark: Optional[datetime]) -> bool:
+        if watermark is None:
+            return False
+        return entry.watermark is None or entry.watermark < watermark
+
+    def _remove(self, coin_id: str):
+        entry = self._entries.pop(coin_id)
+        self._bytes -= entry.nbytes
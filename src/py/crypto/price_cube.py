@@ -0,0 +1,254 @@
+"""
+Memory-mapped dense price / market cap / volume cube for whole-universe analytics.
+
+The cube is a float64 array laid out as [coin, day, field] in one raw file, with
+a JSON sidecar holding the coin_id index and the date axis. Writers refresh it by
+(re)filling the newest days; readers open it read-only and get NumPy views
+straight from the page cache, so any number of processes share one copy.
+"""
+
+import json
+import logging
+import os
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+FIELDS = ('price', 'market_cap', 'volume')
+
+
+class PriceCube:
+    DATA_FILE = 'cube.f64'
+    META_FILE = 'meta.json'
+    DAY_HEADROOM = 366
+    COIN_HEADROOM = 1024
+    QUERY_BATCH_SIZE = 500
+
+    def __init__(self, root='./data/price_cube', mode='r'):
+        """
+        Open an existing cube
+
+        Args:
+            root (str): directory holding the cube files
+            mode (str): 'r' for read-only shared access, 'r+' to refresh it in place
+        """
+        self.root = root
+        self.mode = mode
+        with open(os.path.join(root, self.META_FILE), 'r') as f:
+            meta = json.load(f)
+
+        self.start_date = date.fromisoformat(meta['start_date'])
+        self.n_days = meta['n_days']
+        self.coin_ids = meta['coin_ids']
+        self.coin_capacity = meta['coin_capacity']
+        self.day_capacity = meta['day_capacity']
+        self._coin_to_idx = {coin_id: idx for idx, coin_id in enumerate(self.coin_ids)}
+        self.data = np.memmap(
+            os.path.join(root, self.DATA_FILE),
+            dtype=np.float64,
+            mode=mode,
+            shape=(self.coin_capacity, self.day_capacity, len(FIELDS))
+        )
+
+    # ------------------------------------------------------------------
+    # Creation and refresh
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def _allocate(cls, root, start_date, coin_ids, n_days, coin_capacity, day_capacity):
+        os.makedirs(root, exist_ok=True)
+        data = np.memmap(
+            os.path.join(root, cls.DATA_FILE),
+            dtype=np.float64,
+            mode='w+',
+            shape=(coin_capacity, day_capacity, len(FIELDS))
+        )
+        data[:] = np.nan
+        data.flush()
+        del data
+        cls._write_meta(root, start_date, coin_ids, n_days, coin_capacity, day_capacity)
+
+    @classmethod
+    def _write_meta(cls, root, start_date, coin_ids, n_days, coin_capacity, day_capacity):
+        meta_path = os.path.join(root, cls.META_FILE)
+        tmp_path = meta_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'start_date': start_date.isoformat(),
+                'n_days': n_days,
+                'coin_ids': coin_ids,
+                'coin_capacity': coin_capacity,
+                'day_capacity': day_capacity,
+                'fields': list(FIELDS)
+            }, f)
+        os.replace(tmp_path, meta_path)
+
+    @classmethod
+    def build_from_mongo(cls, history, root='./data/price_cube', start_date=None):
+        """
+        Build a new cube from the historical points
+
+        Args:
+            history: historical store of the configured layout (see historical_store.py)
+            root (str): directory for the cube files (replaced if it exists)
+            start_date (date): first day of the cube, defaults to one year ago
+        """
+        start_date = start_date or (date.today() - timedelta(days=365))
+        coin_ids = sorted(history.coins_with_points_since(datetime.combine(start_date, datetime.min.time())))
+        n_days = (date.today() - start_date).days + 1
+
+        cls._allocate(
+            root, start_date, coin_ids, n_days,
+            coin_capacity=len(coin_ids) + cls.COIN_HEADROOM,
+            day_capacity=n_days + cls.DAY_HEADROOM
+        )
+        cube = cls(root, mode='r+')
+        cube._fill_from_mongo(history, start_date)
+        logging.info(f"Built price cube with {len(coin_ids)} coins x {n_days} days at {root}")
+        return cube
+
+    def refresh_from_mongo(self, history):
+        """
+        Bring the cube up to today
+
+        The last stored day is filled again (its point may have been updated since) and
+        every newer day is appended, adding coins and growing the file as needed.
+        """
+        if self.mode != 'r+':
+            raise ValueError("Price cube must be opened with mode='r+' to refresh it")
+
+        since = self.start_date + timedelta(days=max(self.n_days - 1, 0))
+        self._fill_from_mongo(history, since)
+        logging.info(f"Refreshed price cube from {since}, now {len(self.coin_ids)} coins x {self.n_days} days")
+
+    def _fill_from_mongo(self, history, since):
+        since_dt = datetime.combine(since, datetime.min.time())
+        coin_ids = sorted(history.coins_with_points_since(since_dt))
+        self._ensure_coins(coin_ids)
+        self._ensure_days((date.today() - self.start_date).days + 1)
+
+        for start in range(0, len(coin_ids), self.QUERY_BATCH_SIZE):
+            batch = coin_ids[start:start + self.QUERY_BATCH_SIZE]
+            # In time order so the last point of a day wins, whatever order the layout stores them in
+            points = sorted(history.find_points(batch, since_dt, fields=FIELDS), key=lambda point: point['timestamp'])
+
+            coin_idx, day_idx, values = [], [], []
+            for doc in points:
+                day = (doc['timestamp'].date() - self.start_date).days
+                if day >= self.n_days:
+                    continue
+                stats = doc.get('stats', {})
+                coin_idx.append(self._coin_to_idx[doc['coin_id']])
+                day_idx.append(day)
+                values.append([stats.get(field, np.nan) for field in FIELDS])
+
+            if coin_idx:
+                values = np.array(values, dtype=np.float64)
+                self.data[np.array(coin_idx), np.array(day_idx)] = values
+
+        self.data.flush()
+
+    def append_day(self, day, records):
+        """
+        Write one day of values
+
+        Args:
+            day (date): day to write; must not be before the cube's start date
+            records (dict): coin_id -> {'price': ..., 'market_cap': ..., 'volume': ...}
+        """
+        if self.mode != 'r+':
+            raise ValueError("Price cube must be opened with mode='r+' to append to it")
+
+        self._ensure_coins(sorted(records))
+        day_idx = (day - self.start_date).days
+        self._ensure_days(day_idx + 1)
+        for coin_id, stats in records.items():
+            self.data[self._coin_to_idx[coin_id], day_idx] = [stats.get(field, np.nan) for field in FIELDS]
+        self.data.flush()
+
+    def _ensure_coins(self, coin_ids):
+        new_coins = [coin_id for coin_id in coin_ids if coin_id not in self._coin_to_idx]
+        if not new_coins:
+            return
+        if len(self.coin_ids) + len(new_coins) > self.coin_capacity:
+            self._grow(coin_capacity=len(self.coin_ids) + len(new_coins) + self.COIN_HEADROOM)
+        for coin_id in new_coins:
+            self._coin_to_idx[coin_id] = len(self.coin_ids)
+            self.coin_ids.append(coin_id)
+        self._save_meta()
+
+    def _ensure_days(self, n_days):
+        if n_days <= self.n_days:
+            return
+        if n_days > self.day_capacity:
+            self._grow(day_capacity=max(n_days + self.DAY_HEADROOM, self.day_capacity * 2))
+        self.n_days = n_days
+        self._save_meta()
+
+    def _grow(self, coin_capacity=None, day_capacity=None):
+        """Copy the cube into a larger file; readers holding the old file keep a valid view"""
+        coin_capacity = coin_capacity or self.coin_capacity
+        day_capacity = day_capacity or self.day_capacity
+        logging.info(f"Growing price cube to {coin_capacity} coins x {day_capacity} days")
+
+        data_path = os.path.join(self.root, self.DATA_FILE)
+        tmp_path = data_path + '.tmp'
+        grown = np.memmap(tmp_path, dtype=np.float64, mode='w+', shape=(coin_capacity, day_capacity, len(FIELDS)))
+        grown[:] = np.nan
+        grown[:len(self.coin_ids), :self.n_days] = self.data[:len(self.coin_ids), :self.n_days]
+        grown.flush()
+        del grown
+        os.replace(tmp_path, data_path)
+
+        self.coin_capacity = coin_capacity
+        self.day_capacity = day_capacity
+        self.data = np.memmap(data_path, dtype=np.float64, mode='r+', shape=(coin_capacity, day_capacity, len(FIELDS)))
+        self._save_meta()
+
+    def _save_meta(self):
+        self._write_meta(self.root, self.start_date, self.coin_ids, self.n_days, self.coin_capacity, self.day_capacity)
+
+    # ------------------------------------------------------------------
+    # Readers
+    # ------------------------------------------------------------------
+
+    @property
+    def dates(self):
+        """Date axis as datetime64[D]"""
+        return np.datetime64(self.start_date, 'D') + np.arange(self.n_days)
+
+    def coin_index(self, coin_ids):
+        """Row index of every coin in `coin_ids`, -1 for coins not in the cube"""
+        return np.array([self._coin_to_idx.get(coin_id, -1) for coin_id in coin_ids], dtype=np.int64)
+
+    def day_index(self, day):
+        """Column index of a date (may be out of range)"""
+        return (day - self.start_date).days
+
+    def field(self, name):
+        """Zero-copy [coin, day] view of one field over every coin and stored day"""
+        return self.data[:len(self.coin_ids), :self.n_days, FIELDS.index(name)]
+
+    def matrix(self, name, coin_ids=None, start_date=None, end_date=None):
+        """
+        [coin, day] matrix of one field for a coin set and date range
+
+        Rows follow `coin_ids`; coins missing from the cube are all-NaN rows. Without
+        coin_ids the result is a zero-copy view over all coins.
+
+        Returns:
+            tuple: (matrix, dates)
+        """
+        first = 0 if start_date is None else max(self.day_index(start_date), 0)
+        last = self.n_days if end_date is None else min(self.day_index(end_date) + 1, self.n_days)
+        values = self.field(name)[:, first:last]
+        dates = self.dates[first:last]
+
+        if coin_ids is None:
+            return values, dates
+
+        idx = self.coin_index(coin_ids)
+        result = np.full((len(idx), values.shape[1]), np.nan)
+        found = idx >= 0
+        result[found] = values[idx[found]]
+        return result, dates
@@ -0,0 +1,222 @@
+"""
+Columnar on-disk mirror of the historical points.
+
+Points are stored as Parquet files partitioned by month (hive layout
+`month=YYYY-MM/part.parquet`), sorted by (coin_id, timestamp) inside each file so
+row-group statistics let readers skip coins they did not ask for. Readers get
+Arrow tables or NumPy arrays for a coin set and date range, reading only the
+requested columns and only the partitions / row groups that can match.
+"""
+
+import glob
+import json
+import logging
+import os
+from datetime import datetime
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+VALUE_COLUMNS = ['price', 'market_cap', 'volume']
+
+SCHEMA = pa.schema([
+    ('coin_id', pa.string()),
+    ('timestamp', pa.timestamp('ms')),
+    ('price', pa.float64()),
+    ('market_cap', pa.float64()),
+    ('volume', pa.float64())
+])
+
+
+class PricePanel:
+    ROW_GROUP_SIZE = 64 * 1024
+    SYNC_BATCH_SIZE = 100000
+
+    def __init__(self, root='./data/price_panel'):
+        self.root = root
+        self.meta_path = os.path.join(root, '_meta.json')
+        os.makedirs(root, exist_ok=True)
+
+    # ------------------------------------------------------------------
+    # Sync from MongoDB
+    # ------------------------------------------------------------------
+
+    def _load_meta(self):
+        if not os.path.exists(self.meta_path):
+            return {}
+        with open(self.meta_path, 'r') as f:
+            return json.load(f)
+
+    def _save_meta(self, meta):
+        tmp_path = self.meta_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def _partition_path(self, month):
+        return os.path.join(self.root, f'month={month}', 'part.parquet')
+
+    def _staged_paths(self, month='*'):
+        # Dot-prefixed so dataset readers never pick them up
+        return sorted(glob.glob(os.path.join(self.root, f'month={month}', '.staged-*.parquet')))
+
+    @staticmethod
+    def _docs_to_frame(docs):
+        """Flatten historical points into a frame matching SCHEMA"""
+        frame = pd.DataFrame({
+            'coin_id': [doc['coin_id'] for doc in docs],
+            'timestamp': [doc['timestamp'] for doc in docs],
+            **{
+                column: [doc.get('stats', {}).get(column) for doc in docs]
+                for column in VALUE_COLUMNS
+            }
+        })
+        for column in VALUE_COLUMNS:
+            frame[column] = pd.to_numeric(frame[column], errors='coerce').astype('float64')
+        frame['timestamp'] = pd.to_datetime(frame['timestamp']).astype('datetime64[ms]')
+        return frame
+
+    def _merge_partition(self, month):
+        """Merge the staged rows of a month into its partition, new values winning over stored ones"""
+        path = self._partition_path(month)
+        staged = self._staged_paths(month)
+        # Staged files are numbered in cursor order, so later rows come last
+        frames = [pq.read_table(staged_path).to_pandas() for staged_path in staged]
+        if os.path.exists(path):
+            frames.insert(0, pq.read_table(path).to_pandas())
+        frame = pd.concat(frames, ignore_index=True)
+
+        frame = (
+            frame.drop_duplicates(['coin_id', 'timestamp'], keep='last')
+                 .sort_values(['coin_id', 'timestamp'])
+        )
+        table = pa.Table.from_pandas(frame[SCHEMA.names], schema=SCHEMA, preserve_index=False)
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Dot-prefixed so a leftover temp file is never picked up by dataset readers
+        tmp_path = os.path.join(os.path.dirname(path), '.part.parquet.tmp')
+        pq.write_table(table, tmp_path, row_group_size=self.ROW_GROUP_SIZE)
+        os.replace(tmp_path, path)
+        for staged_path in staged:
+            os.remove(staged_path)
+
+    def _stage_docs(self, docs, batch_num, months):
+        """Append a cursor batch to the staging files of the months it touches, without reading any partition"""
+        frame = self._docs_to_frame(docs)
+        for month, month_frame in frame.groupby(frame['timestamp'].dt.strftime('%Y-%m')):
+            directory = os.path.dirname(self._partition_path(month))
+            os.makedirs(directory, exist_ok=True)
+            table = pa.Table.from_pandas(month_frame[SCHEMA.names], schema=SCHEMA, preserve_index=False)
+            pq.write_table(table, os.path.join(directory, f'.staged-{batch_num:06d}.parquet'))
+            months.add(month)
+        return len(frame)
+
+    def sync_from_mongo(self, history):
+        """
+        Bring the panel up to date with the historical points
+
+        Only points written since the previous sync (by updated_at) are read, so
+        regular syncs after an initial full load are cheap. Cursor batches are staged
+        per month and every touched partition is merged and rewritten once at the end,
+        so an initial load costs time linear in the history length.
+
+        Args:
+            history: historical store of the configured layout (see historical_store.py)
+
+        Returns:
+            int: number of points written
+        """
+        meta = self._load_meta()
+        sync_start = datetime.now()
+        since = datetime.fromisoformat(meta['synced_until']) if meta.get('synced_until') else None
+        cursor = history.find_points_written_since(since, fields=VALUE_COLUMNS, batch_size=self.SYNC_BATCH_SIZE)
+
+        # Left over by an interrupted sync; the watermark was not advanced, so its points are read again
+        for staged_path in self._staged_paths():
+            os.remove(staged_path)
+
+        written = 0
+        batch_num = 0
+        months = set()
+        docs = []
+        for doc in cursor:
+            docs.append(doc)
+            if len(docs) >= self.SYNC_BATCH_SIZE:
+                written += self._stage_docs(docs, batch_num, months)
+                batch_num += 1
+                docs = []
+                logging.info(f"Price panel sync: {written} points staged so far")
+        if docs:
+            written += self._stage_docs(docs, batch_num, months)
+
+        for month in sorted(months):
+            self._merge_partition(month)
+
+        # The start of this sync is the next watermark so concurrent writes are picked up again
+        meta['synced_until'] = sync_start.isoformat()
+        self._save_meta(meta)
+        logging.info(f"Price panel sync wrote {written} points")
+        return written
+
+    # ------------------------------------------------------------------
+    # Readers
+    # ------------------------------------------------------------------
+
+    def _dataset(self):
+        return ds.dataset(self.root, format='parquet', partitioning='hive', schema=SCHEMA.append(pa.field('month', pa.string())))
+
+    @staticmethod
+    def _filter(coin_ids=None, start=None, end=None):
+        expression = None
+
+        def combine(condition):
+            return condition if expression is None else expression & condition
+
+        if coin_ids is not None:
+            expression = combine(ds.field('coin_id').isin(list(coin_ids)))
+        if start is not None:
+            # Month partitions are pruned first, then row groups by timestamp statistics
+            expression = combine(ds.field('month') >= start.strftime('%Y-%m'))
+            expression = combine(ds.field('timestamp') >= pa.scalar(start, type=pa.timestamp('ms')))
+        if end is not None:
+            expression = combine(ds.field('month') <= end.strftime('%Y-%m'))
+            expression = combine(ds.field('timestamp') <= pa.scalar(end, type=pa.timestamp('ms')))
+        return expression
+
+    def read_table(self, coin_ids=None, start=None, end=None, columns=None):
+        """
+        Read points as an Arrow table
+
+        Args:
+            coin_ids (list): coins to read, all coins when None
+            start (datetime): inclusive lower bound on timestamp
+            end (datetime): inclusive upper bound on timestamp
+            columns (list): value columns to read, defaults to all of VALUE_COLUMNS.
+                coin_id and timestamp are always included.
+        """
+        columns = ['coin_id', 'timestamp'] + list(columns or VALUE_COLUMNS)
+        if not os.path.isdir(self.root) or not any(name.startswith('month=') for name in os.listdir(self.root)):
+            return SCHEMA.empty_table().select(columns)
+        return self._dataset().to_table(columns=columns, filter=self._filter(coin_ids, start, end))
+
+    def read_arrays(self, coin_ids=None, start=None, end=None, columns=None):
+        """
+        Read points as NumPy arrays
+
+        Returns:
+            dict: column name -> np.ndarray; 'coin_id' is an object array and
+                  'timestamp' is datetime64[ms]
+        """
+        table = self.read_table(coin_ids, start, end, columns)
+        return {
+            name: table.column(name).to_numpy(zero_copy_only=False)
+            for name in table.column_names
+        }
+
+    def get_historical_data(self, coin_id, start_date, end_date=None):
+        """Records for a single coin in the format TechnicalAnalyzer._get_price_data expects"""
+        table = self.read_table([coin_id], start_date, end_date, ['price', 'volume', 'market_cap'])
+        frame = table.to_pandas().sort_values('timestamp')
+        return frame.drop(columns=['coin_id']).to_dict('records')
@@ -0,0 +1,72 @@
+"""
+Count the MongoDB commands an operation sends, via a pymongo CommandListener.
+
+Listeners only see clients created after they are registered, so register the
+counter before creating the CryptoDataManager under test:
+
+    counter = QueryCounter.install()
+    db_manager = CryptoDataManager()
+    with counter.measure() as counts:
+        db_manager.calculate_performance_metrics(write=False)
+    print(counts.total, counts.by_command)
+"""
+
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+from pymongo import monitoring
+
+# Connection handshakes and session bookkeeping, not queries
+IGNORED_COMMANDS = {'hello', 'ismaster', 'isMaster', 'ping', 'endSessions', 'saslStart', 'saslContinue',
+                    'buildInfo', 'getLastError'}
+
+
+class QueryCounts:
+    """Commands seen during one measure() block"""
+
+    def __init__(self):
+        self.by_command = Counter()
+
+    @property
+    def total(self):
+        return sum(self.by_command.values())
+
+
+class QueryCounter(monitoring.CommandListener):
+    """CommandListener counting started commands by name"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active = []
+
+    @classmethod
+    def install(cls):
+        """Create a counter and register it for every client created from now on"""
+        counter = cls()
+        monitoring.register(counter)
+        return counter
+
+    @contextmanager
+    def measure(self):
+        counts = QueryCounts()
+        with self._lock:
+            self._active.append(counts)
+        try:
+            yield counts
+        finally:
+            with self._lock:
+                self._active.remove(counts)
+
+    def started(self, event):
+        if event.command_name in IGNORED_COMMANDS:
+            return
+        with self._lock:
+            for counts in self._active:
+                counts.by_command[event.command_name] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
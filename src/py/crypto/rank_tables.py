@@ -0,0 +1,184 @@
+"""
+Persisted universe rank tables for the metrics run.
+
+Rank changes compare a coin's market cap with the market caps of every coin on
+the same grid date (metrics_engine.ranks_among), whichever batch it is computed
+in. Building those tables from the full lookback of the whole universe on every
+run would undo incremental metric runs, so they are kept in metric_rank_tables,
+one document per data source and grid date:
+
+    {source, date, caps}
+
+where caps are the ascending, forward-filled market caps of every coin on that
+date. Each run only recomputes the dates from the oldest point (or rollup bucket)
+written since the previous build on, reading the coins in batches and merging
+them per date. The tables of a source are rebuilt from scratch when the coin
+universe changes or its window reaches further back than what is stored.
+"""
+
+import hashlib
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from metrics_engine import forward_fill, pivot_batch, staleness_limit, universe_rank_table
+from rollups import RESOLUTIONS, bucket_start
+
+
+def _grid_date(source, timestamp):
+    """Date of the source grid that `timestamp` falls on"""
+    if source is None:
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    if source == 'raw':
+        return timestamp
+    return bucket_start(timestamp, source)
+
+
+class RankTableStore:
+    COLLECTION = 'metric_rank_tables'
+    STATE_COLLECTION = 'rank_table_state'
+    WRITE_BATCH_SIZE = 1000
+
+    def __init__(self, db, history, rollups):
+        """
+        Args:
+            db: pymongo database
+            history: historical store the raw points are read from (historical_store.py)
+            rollups (RollupStore): rollups the coarser grids are read from
+        """
+        self.db = db
+        self.history = history
+        self.rollups = rollups
+
+    @property
+    def collection(self):
+        return self.db[self.COLLECTION]
+
+    def ensure_indexes(self):
+        self.collection.create_index([("source", 1), ("date", 1)], unique=True)
+        self.db[self.STATE_COLLECTION].create_index("source", unique=True)
+
+    def _read_frame(self, source, coin_ids, start):
+        """Rows of the source grid for some coins from `start` on, as pivot_batch takes them"""
+        if source in RESOLUTIONS:
+            return self.rollups.load_frame(source, coin_ids, start)
+        df = self.history.find_point_arrays(coin_ids, start, fields=('price', 'market_cap')).to_frame()
+        df['date'] = df['timestamp'].dt.normalize() if source is None else df['timestamp']
+        return df
+
+    def _written_since(self, source, since):
+        """First grid date that data written after `since` can change, None when nothing was written"""
+        if source in RESOLUTIONS:
+            return self.rollups.earliest_bucket_written_since(source, since)
+        earliest = self.history.earliest_point_written_since(since)
+        return _grid_date(source, earliest) if earliest is not None else None
+
+    def _load(self, source, first_date, end_date=None):
+        """Stored caps of the dates in [first_date, end_date)"""
+        date_filter = {'$gte': first_date}
+        if end_date is not None:
+            date_filter['$lt'] = end_date
+        return {
+            np.datetime64(doc['date'], 'ns'): np.asarray(doc['caps'], dtype=np.float64)
+            for doc in self.collection.find({'source': source, 'date': date_filter}, {'_id': 0, 'date': 1, 'caps': 1})
+        }
+
+    def _compute(self, source, coin_ids, read_start, first_date, earlier_dates, batch_size):
+        """
+        Sorted universe market caps on every grid date from `first_date` on
+
+        Coins are read `batch_size` at a time; each batch is forward-filled on the
+        union of the dates of all batches, so the result does not depend on how the
+        universe was split.
+
+        Args:
+            read_start (datetime): first point read, early enough to forward-fill first_date
+            earlier_dates (np.ndarray): stored grid dates before first_date, which the
+                staleness limit is measured over as well
+        """
+        batches = []
+        for i in range(0, len(coin_ids), batch_size):
+            batch = coin_ids[i:i + batch_size]
+            frame = self._read_frame(source, batch, read_start)
+            if len(frame) == 0:
+                continue
+            dates, _, mcaps = pivot_batch(frame, batch)
+            batches.append((dates, mcaps))
+        if not batches:
+            return {}
+
+        dates = np.unique(np.concatenate([batch_dates for batch_dates, _ in batches]))
+        max_staleness = staleness_limit(np.union1d(earlier_dates, dates))
+        refreshed = dates >= np.datetime64(first_date, 'ns')
+
+        caps = [[] for _ in range(np.count_nonzero(refreshed))]
+        for batch_dates, mcaps in batches:
+            expanded = np.full((len(dates), mcaps.shape[1]), np.nan)
+            expanded[np.searchsorted(dates, batch_dates)] = mcaps
+            for parts, row in zip(caps, forward_fill(expanded, dates, max_staleness)[refreshed]):
+                parts.append(row[~np.isnan(row)])
+        return {date: np.sort(np.concatenate(parts)) for date, parts in zip(dates[refreshed], caps)}
+
+    def _save(self, source, first_date, caps_by_date):
+        """Replace the stored caps of every date from `first_date` on"""
+        self.collection.delete_many({'source': source, 'date': {'$gte': first_date}})
+        docs = [
+            {'source': source, 'date': pd.Timestamp(date).to_pydatetime(), 'caps': caps.tolist()}
+            for date, caps in sorted(caps_by_date.items())
+        ]
+        for i in range(0, len(docs), self.WRITE_BATCH_SIZE):
+            self.collection.insert_many(docs[i:i + self.WRITE_BATCH_SIZE], ordered=False)
+
+    def refresh(self, coin_ids, windows, batch_size=1000):
+        """
+        Bring the rank table of every source up to date
+
+        Args:
+            coin_ids (list): the whole coin universe
+            windows (dict): source -> earliest timestamp its metric windows read
+            batch_size (int): coins read at a time
+
+        Returns:
+            dict: source -> universe_rank_table, for set_rank_tables
+        """
+        coins_hash = hashlib.sha1('\n'.join(sorted(coin_ids)).encode()).hexdigest()
+        state_collection = self.db[self.STATE_COLLECTION]
+
+        rank_tables = {}
+        for source, window_start in windows.items():
+            # Taken before anything is read, so points written meanwhile are picked up next time
+            built_at = datetime.now()
+            window_first_date = _grid_date(source, window_start)
+            state = state_collection.find_one({'source': source})
+
+            if state is None or state.get('coins_hash') != coins_hash or state['window_start'] > window_start:
+                caps_by_date = {}
+                first_date = window_first_date
+                read_start = window_start
+            else:
+                written = self._written_since(source, state['built_at'])
+                first_date = max(written, window_first_date) if written is not None else None
+                caps_by_date = self._load(source, window_first_date, first_date)
+                if first_date is not None:
+                    # Far enough back for the first refreshed dates to forward-fill from older points
+                    lookback = staleness_limit(np.array(sorted(caps_by_date), dtype='datetime64[ns]'))
+                    read_start = first_date - pd.Timedelta(lookback).to_pytimedelta() if lookback is not None else window_start
+
+            if first_date is not None:
+                refreshed = self._compute(
+                    source, coin_ids, read_start, first_date,
+                    np.array(sorted(caps_by_date), dtype='datetime64[ns]'), batch_size
+                )
+                self._save(source, first_date, refreshed)
+                caps_by_date.update(refreshed)
+
+            self.collection.delete_many({'source': source, 'date': {'$lt': window_first_date}})
+            state_collection.update_one(
+                {'source': source},
+                {'$set': {'built_at': built_at, 'window_start': window_start, 'coins_hash': coins_hash}},
+                upsert=True
+            )
+            if caps_by_date:
+                rank_tables[source] = universe_rank_table(caps_by_date)
+        return rank_tables
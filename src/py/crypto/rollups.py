@@ -0,0 +1,290 @@
+"""
+Downsampled rollups of historical points.
+
+Hourly, daily and weekly rollups live in historical_rollup_<resolution>
+collections, one document per coin and bucket:
+
+    {coin_id, bucket_start, open, high, low, close, market_cap, volume,
+     volume_sum, count, first_ts, last_ts, updated_at}
+
+close / market_cap / volume are the last values of the bucket and volume_sum
+adds up every point. Rollups are maintained incrementally: writers collect the
+range of points written per coin in a RollupRanges and, once per run, the buckets
+those ranges fall into are recomputed, hourly from raw points and every coarser
+resolution from the one below it.
+
+Metric windows read the coarsest resolution that still preserves their
+precision (see RollupStore.resolution_for_window), so long lookbacks no longer
+scan raw intraday points.
+"""
+
+import logging
+import threading
+from datetime import datetime, timedelta
+
+import pandas as pd
+from pymongo import UpdateOne
+
+# Finest to coarsest; each one is built from the one before it
+RESOLUTIONS = {
+    'hourly': timedelta(hours=1),
+    'daily': timedelta(days=1),
+    'weekly': timedelta(weeks=1)
+}
+
+# A window is read from a rollup only when it spans at least this many buckets
+MIN_BUCKETS_PER_WINDOW = 24
+
+
+def bucket_start(timestamp, resolution):
+    """Start of the bucket containing `timestamp` (weeks start on Monday)"""
+    if resolution == 'hourly':
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    day = timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    if resolution == 'daily':
+        return day
+    return day - timedelta(days=day.weekday())
+
+
+def _combine(rows):
+    """Merge time-ordered bucket rows (or single points as one-point buckets) into one bucket"""
+    highs = [row['high'] for row in rows if row['high'] is not None]
+    lows = [row['low'] for row in rows if row['low'] is not None]
+    return {
+        'open': rows[0]['open'],
+        'high': max(highs) if highs else None,
+        'low': min(lows) if lows else None,
+        'close': rows[-1]['close'],
+        'market_cap': rows[-1]['market_cap'],
+        'volume': rows[-1]['volume'],
+        'volume_sum': sum(row['volume_sum'] or 0 for row in rows),
+        'count': sum(row['count'] for row in rows),
+        'first_ts': rows[0]['first_ts'],
+        'last_ts': rows[-1]['last_ts']
+    }
+
+
+def _point_row(point):
+    """Raw point as a one-point bucket row"""
+    stats = point.get('stats', {})
+    price = stats.get('price')
+    return {
+        'coin_id': point['coin_id'],
+        'open': price,
+        'high': price,
+        'low': price,
+        'close': price,
+        'market_cap': stats.get('market_cap'),
+        'volume': stats.get('volume'),
+        'volume_sum': stats.get('volume'),
+        'count': 1,
+        'first_ts': point['timestamp'],
+        'last_ts': point['timestamp']
+    }
+
+
+class RollupRanges:
+    """(first, last) timestamps of the points written per coin during a run, for one RollupStore.update at its end"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.ranges = {}
+
+    def __len__(self):
+        return len(self.ranges)
+
+    def add(self, coin_id, timestamps):
+        """Widen the range of a coin to cover `timestamps`"""
+        if not timestamps:
+            return
+        first, last = min(timestamps), max(timestamps)
+        with self._lock:
+            if coin_id in self.ranges:
+                stored_first, stored_last = self.ranges[coin_id]
+                first, last = min(first, stored_first), max(last, stored_last)
+            self.ranges[coin_id] = (first, last)
+
+
+class RollupStore:
+    STATE_COLLECTION = 'rollup_state'
+    COIN_BATCH = 100  # Coins whose buckets are recomputed together
+    WRITE_BATCH_SIZE = 1000
+
+    def __init__(self, db, history):
+        """
+        Args:
+            db: pymongo database
+            history: historical store the raw points are read from (historical_store.py)
+        """
+        self.db = db
+        self.history = history
+
+    def collection(self, resolution):
+        return self.db[f'historical_rollup_{resolution}']
+
+    def ensure_indexes(self):
+        for resolution in RESOLUTIONS:
+            self.collection(resolution).create_index([("coin_id", 1), ("bucket_start", 1)], unique=True)
+            self.collection(resolution).create_index("updated_at")
+
+    # ------------------------------------------------------------------
+    # Maintenance
+    # ------------------------------------------------------------------
+
+    def _source_rows(self, resolution, bucket_ranges):
+        """
+        Rows that make up the buckets of `resolution` in each coin's own range, in time order per coin
+
+        Args:
+            bucket_ranges (dict): coin_id -> (first bucket start, end of the last bucket)
+        """
+        resolutions = list(RESOLUTIONS)
+        position = resolutions.index(resolution)
+        if position == 0:
+            points = self.history.find_points_in_ranges({
+                coin_id: (start, end - timedelta(microseconds=1))
+                for coin_id, (start, end) in bucket_ranges.items()
+            })
+            rows = [_point_row(point) for point in points]
+        else:
+            rows = list(self.collection(resolutions[position - 1]).find(
+                {'$or': [
+                    {'coin_id': coin_id, 'bucket_start': {'$gte': start, '$lt': end}}
+                    for coin_id, (start, end) in bucket_ranges.items()
+                ]},
+                {'_id': 0, 'bucket_start': 0, 'updated_at': 0}
+            ))
+        rows.sort(key=lambda row: (row['coin_id'], row['first_ts']))
+        return rows
+
+    def update(self, ranges):
+        """
+        Recompute every bucket touched by newly written points
+
+        Args:
+            ranges (dict): coin_id -> (first_timestamp, last_timestamp) of the written points
+
+        Returns:
+            int: number of buckets written
+        """
+        if len(ranges) > self.COIN_BATCH:
+            # A long backfill of every coin would otherwise read all of its points at once
+            coin_ids = list(ranges)
+            return sum(
+                self.update({coin_id: ranges[coin_id] for coin_id in coin_ids[i:i + self.COIN_BATCH]})
+                for i in range(0, len(coin_ids), self.COIN_BATCH)
+            )
+        if not ranges:
+            return 0
+
+        written = 0
+        for resolution, width in RESOLUTIONS.items():
+            bucket_ranges = {
+                coin_id: (bucket_start(first, resolution), bucket_start(last, resolution) + width)
+                for coin_id, (first, last) in ranges.items()
+            }
+            # Each coin reads and recomputes only its own range, so one long backfill
+            # does not make the other coins of the batch re-read the same span
+            buckets = {}
+            for row in self._source_rows(resolution, bucket_ranges):
+                first, last = bucket_ranges[row['coin_id']]
+                if first <= row['first_ts'] < last:
+                    key = (row['coin_id'], bucket_start(row['first_ts'], resolution))
+                    buckets.setdefault(key, []).append(row)
+
+            now = datetime.now()
+            operations = [
+                UpdateOne(
+                    {'coin_id': coin_id, 'bucket_start': start_of_bucket},
+                    {'$set': {**_combine(rows), 'updated_at': now}},
+                    upsert=True
+                )
+                for (coin_id, start_of_bucket), rows in buckets.items()
+            ]
+            for i in range(0, len(operations), self.WRITE_BATCH_SIZE):
+                self.collection(resolution).bulk_write(operations[i:i + self.WRITE_BATCH_SIZE], ordered=False)
+            written += len(operations)
+
+        return written
+
+    def update_coin(self, coin_id, timestamps):
+        """Recompute the buckets of one coin touched by points at `timestamps`"""
+        if timestamps:
+            self.update({coin_id: (min(timestamps), max(timestamps))})
+
+    def rebuild(self, coin_ids=None):
+        """Build every rollup from scratch (initial backfill) and mark them ready for metric reads"""
+        coin_ids = coin_ids or sorted(self.db.coins.distinct('coin_id'))
+        # Old enough to cover every stored point
+        full_range = (datetime(2009, 1, 1), datetime.now())
+
+        for i in range(0, len(coin_ids), self.COIN_BATCH):
+            batch = coin_ids[i:i + self.COIN_BATCH]
+            written = self.update({coin_id: full_range for coin_id in batch})
+            logging.info(f"Rebuilt rollups for {i + len(batch)}/{len(coin_ids)} coins ({written} buckets in this batch)")
+
+        now = datetime.now()
+        for resolution in RESOLUTIONS:
+            self.db[self.STATE_COLLECTION].update_one(
+                {'resolution': resolution},
+                {'$set': {'built_at': now}},
+                upsert=True
+            )
+
+    def earliest_bucket_written_since(self, resolution, since):
+        """Oldest bucket_start among the buckets of `resolution` written after `since`, None when none was"""
+        earliest = self.collection(resolution).find_one(
+            {'updated_at': {'$gt': since}}, {'bucket_start': 1}, sort=[('bucket_start', 1)]
+        )
+        return earliest.get('bucket_start') if earliest else None
+
+    def is_built(self):
+        """Whether every resolution has been fully built at least once"""
+        built = {doc['resolution'] for doc in self.db[self.STATE_COLLECTION].find({}, {'resolution': 1})}
+        return all(resolution in built for resolution in RESOLUTIONS)
+
+    # ------------------------------------------------------------------
+    # Metric reads
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def resolution_for_window(window):
+        """
+        Coarsest resolution that preserves the precision of a metric window
+
+        A rollup qualifies when the window spans at least MIN_BUCKETS_PER_WINDOW of its
+        buckets and is a whole number of them, so the window's start falls on a bucket
+        boundary relative to the latest bucket. Returns 'raw' when none qualifies.
+        """
+        for resolution, width in reversed(RESOLUTIONS.items()):
+            if window >= width * MIN_BUCKETS_PER_WINDOW and window % width == timedelta(0):
+                return resolution
+        return 'raw'
+
+    def plan_sources(self, time_periods, now):
+        """Map every metric period to 'raw' or the rollup resolution it is read from"""
+        sources = {}
+        for period_name, window in time_periods.items():
+            if period_name == 'ytd':
+                # Anchored on Jan 1 midnight rather than on the latest point, so its baseline
+                # must be the Jan 1 day itself: a weekly bucket would start on the Monday
+                # before it and close up to six days after it
+                sources[period_name] = 'daily' if now - datetime(now.year, 1, 1) >= RESOLUTIONS['daily'] else 'raw'
+                continue
+            sources[period_name] = self.resolution_for_window(window)
+        return sources
+
+    def load_frame(self, resolution, coin_ids, start):
+        """
+        Rollup buckets of some coins from `start` on
+
+        Returns:
+            pd.DataFrame: 'coin_id', 'date' (bucket start), 'price' (close) and 'market_cap'
+        """
+        cursor = self.collection(resolution).find(
+            {'coin_id': {'$in': list(coin_ids)}, 'bucket_start': {'$gte': bucket_start(start, resolution)}},
+            {'_id': 0, 'coin_id': 1, 'bucket_start': 1, 'close': 1, 'market_cap': 1}
+        ).sort([('coin_id', 1), ('bucket_start', 1)])
+
+        frame = pd.DataFrame(list(cursor), columns=['coin_id', 'bucket_start', 'close', 'market_cap'])
+        return frame.rename(columns={'bucket_start': 'date', 'close': 'price'})
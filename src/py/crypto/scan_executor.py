@@ -0,0 +1,202 @@
+"""
+Execution backends for TechnicalAnalyzer scans.
+
+Per-coin analysis is CPU bound (NumPy / pandas / talib), so a thread pool never
+gets past one core. ScanExecutor runs the same chunked work inline, on threads
+or on a process pool. Price series are packed once into a PriceSeriesBlock; the
+process backend copies the block into shared memory and every worker attaches
+to it when it starts, so only coin index ranges and results cross the process
+boundary instead of pickled DataFrames.
+"""
+
+import logging
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+BACKENDS = ('inline', 'thread', 'process')
+
+# Arrays of a PriceSeriesBlock, in the order they are laid out in shared memory
+BLOCK_FIELDS = (
+    ('offsets', np.int64),
+    ('timestamps', np.int64),  # datetime64[ns] as integers
+    ('prices', np.float64),
+    ('volumes', np.float64)
+)
+
+
+class PriceSeriesBlock:
+    """
+    Ragged price / volume series of many coins in flat arrays
+
+    The series of coin i is the slice offsets[i]:offsets[i + 1] of timestamps,
+    prices and volumes.
+    """
+
+    def __init__(self, coin_ids: List[str], offsets: np.ndarray, timestamps: np.ndarray,
+                 prices: np.ndarray, volumes: np.ndarray, shm: Optional[shared_memory.SharedMemory] = None):
+        self.coin_ids = coin_ids
+        self.offsets = offsets
+        self.timestamps = timestamps
+        self.prices = prices
+        self.volumes = volumes
+        self._shm = shm
+
+    @classmethod
+    def from_frames(cls, frames: Dict[str, 'pd.DataFrame']) -> 'PriceSeriesBlock':
+        """Pack per-coin DataFrames indexed by timestamp with 'price' and 'volume' columns"""
+        coin_ids = [coin_id for coin_id, frame in frames.items() if frame is not None and len(frame) > 0]
+        sizes = [len(frames[coin_id]) for coin_id in coin_ids]
+        offsets = np.concatenate([[0], np.cumsum(sizes, dtype=np.int64)]).astype(np.int64)
+
+        def column(getter, dtype):
+            if not coin_ids:
+                return np.empty(0, dtype=dtype)
+            return np.concatenate([np.asarray(getter(frames[coin_id]), dtype=dtype) for coin_id in coin_ids])
+
+        return cls(
+            coin_ids,
+            offsets,
+            column(lambda frame: frame.index.values.astype('datetime64[ns]').view(np.int64), np.int64),
+            column(lambda frame: frame['price'].values, np.float64),
+            column(lambda frame: frame['volume'].values, np.float64)
+        )
+
+    def __len__(self):
+        return len(self.coin_ids)
+
+    def series(self, idx: int):
+        """(prices, volumes, timestamps) of one coin; timestamps are datetime64[ns]"""
+        start, end = self.offsets[idx], self.offsets[idx + 1]
+        return (
+            self.prices[start:end],
+            self.volumes[start:end],
+            self.timestamps[start:end].view('datetime64[ns]')
+        )
+
+    # ------------------------------------------------------------------
+    # Shared memory
+    # ------------------------------------------------------------------
+
+    def to_shared_memory(self) -> 'PriceSeriesBlock':
+        """Copy the arrays into one shared memory segment; call release() when done"""
+        arrays = [getattr(self, name).astype(dtype, copy=False) for name, dtype in BLOCK_FIELDS]
+        shm = shared_memory.SharedMemory(create=True, size=max(sum(a.nbytes for a in arrays), 1))
+
+        shared = {}
+        position = 0
+        for (name, dtype), array in zip(BLOCK_FIELDS, arrays):
+            view = np.ndarray(array.shape, dtype=dtype, buffer=shm.buf, offset=position)
+            view[:] = array
+            shared[name] = view
+            position += array.nbytes
+
+        return PriceSeriesBlock(self.coin_ids, shm=shm, **shared)
+
+    def spec(self) -> Dict:
+        """Small picklable description workers use to attach to the shared segment"""
+        if self._shm is None:
+            raise ValueError("Block is not in shared memory")
+        return {
+            'name': self._shm.name,
+            'coin_ids': self.coin_ids,
+            'n_offsets': len(self.offsets),
+            'n_points': len(self.prices)
+        }
+
+    @classmethod
+    def attach(cls, spec: Dict) -> 'PriceSeriesBlock':
+        """Open a block created by to_shared_memory in another process"""
+        # Pool workers share the creating process's resource tracker, so attaching
+        # does not hand ownership of the segment to the worker
+        shm = shared_memory.SharedMemory(name=spec['name'])
+
+        shared = {}
+        position = 0
+        for name, dtype in BLOCK_FIELDS:
+            length = spec['n_offsets'] if name == 'offsets' else spec['n_points']
+            shared[name] = np.ndarray((length,), dtype=dtype, buffer=shm.buf, offset=position)
+            position += length * np.dtype(dtype).itemsize
+
+        return cls(spec['coin_ids'], shm=shm, **shared)
+
+    def release(self, unlink: bool = True):
+        """Drop the shared memory segment (unlink only from the creating process)"""
+        if self._shm is None:
+            return
+        self.offsets = self.timestamps = self.prices = self.volumes = None
+        self._shm.close()
+        if unlink:
+            self._shm.unlink()
+        self._shm = None
+
+
+# Block attached by each process pool worker at start-up
+_worker_block = None
+
+
+def _attach_worker_block(spec: Dict):
+    global _worker_block
+    _worker_block = PriceSeriesBlock.attach(spec)
+
+
+def _run_worker_chunk(func: Callable, start: int, end: int, kwargs: Dict) -> List:
+    return func(_worker_block, start, end, **kwargs)
+
+
+class ScanExecutor:
+    """
+    Runs a chunk function over every coin of a PriceSeriesBlock
+
+    The chunk function must be a module-level function called as
+    func(block, start, end, **kwargs) and return a list of per-coin results for
+    coins start..end-1. Results are returned in coin order.
+    """
+
+    def __init__(self,
+                 backend: str = 'thread',
+                 max_workers: Optional[int] = None,
+                 chunk_size: Optional[int] = None,
+                 chunks_per_worker: int = 4):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown scan backend '{backend}', expected one of {BACKENDS}")
+        self.backend = backend
+        self.max_workers = max_workers or (10 if backend == 'thread' else os.cpu_count() or 1)
+        self.chunk_size = chunk_size
+        self.chunks_per_worker = chunks_per_worker
+
+    def _chunks(self, n_coins: int):
+        chunk_size = self.chunk_size or max(1, math.ceil(n_coins / (self.max_workers * self.chunks_per_worker)))
+        return [(start, min(start + chunk_size, n_coins)) for start in range(0, n_coins, chunk_size)]
+
+    def map(self, func: Callable, block: PriceSeriesBlock, **kwargs) -> List:
+        """Apply func to every coin of the block, returning the per-coin results in coin order"""
+        if len(block) == 0:
+            return []
+        chunks = self._chunks(len(block))
+
+        if self.backend == 'inline':
+            return [result for start, end in chunks for result in func(block, start, end, **kwargs)]
+
+        if self.backend == 'thread':
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = [executor.submit(func, block, start, end, **kwargs) for start, end in chunks]
+                return [result for future in futures for result in future.result()]
+
+        shared = block.to_shared_memory()
+        try:
+            workers = min(self.max_workers, len(chunks))
+            logging.info(f"Scanning {len(block)} coins in {len(chunks)} chunks on {workers} processes")
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_attach_worker_block,
+                initargs=(shared.spec(),)
+            ) as executor:
+                futures = [executor.submit(_run_worker_chunk, func, start, end, kwargs) for start, end in chunks]
+                return [result for future in futures for result in future.result()]
+        finally:
+            shared.release()
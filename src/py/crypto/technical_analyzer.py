@@ -1,3 +1,5 @@
+import asyncio
+import logging
 import numpy as np
 import pandas as pd
 from dataclasses import dataclass
@@ -6,6 +8,10 @@ from datetime import datetime, timedelta
 import talib
 from concurrent.futures import ThreadPoolExecutor
 from collections import defaultdict
+import warnings
+from price_cache import PriceCache
+from scan_executor import PriceSeriesBlock, ScanExecutor
+from time_index import TimeIndex
 
 @dataclass
 class PriceLevel:
@@ -24,41 +30,288 @@ class ATHBreakout:
     breakout_strength: float  # composite score
     previous_ath: float
 
+def wilder_rsi(prices: np.ndarray, period: int = 14) -> np.ndarray:
+    """
+    Latest RSI of every row of a (coins x days) price matrix
+
+    Uses Wilder smoothing like talib.RSI, vectorized across coins. Leading NaNs are
+    skipped per row and NaN gaps hold the running averages. Rows with fewer than
+    period + 1 prices get NaN.
+    """
+    n_coins, n_days = prices.shape
+    avg_gain = np.zeros(n_coins)
+    avg_loss = np.zeros(n_coins)
+    count = np.zeros(n_coins, dtype=np.int64)
+    last_price = np.full(n_coins, np.nan)
+
+    for day in range(n_days):
+        current = prices[:, day]
+        step = ~np.isnan(current) & ~np.isnan(last_price)
+        delta = np.where(step, current - last_price, 0.0)
+        gain = np.maximum(delta, 0.0)
+        loss = np.maximum(-delta, 0.0)
+
+        # First `period` moves are averaged, then Wilder smoothing takes over
+        seeding = step & (count < period)
+        avg_gain[seeding] += gain[seeding] / period
+        avg_loss[seeding] += loss[seeding] / period
+        smoothing = step & (count >= period)
+        avg_gain[smoothing] = (avg_gain[smoothing] * (period - 1) + gain[smoothing]) / period
+        avg_loss[smoothing] = (avg_loss[smoothing] * (period - 1) + loss[smoothing]) / period
+
+        count += step
+        last_price = np.where(np.isnan(current), last_price, current)
+
+    total = avg_gain + avg_loss
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsi = np.where(total > 0, 100 * avg_gain / total, 0.0)
+    rsi[count < period] = np.nan
+    return rsi
+
+
+def last_valid_index(values: np.ndarray) -> np.ndarray:
+    """Column index of the last non-NaN value of every row, -1 for all-NaN rows"""
+    valid = ~np.isnan(values)
+    last = values.shape[1] - 1 - np.argmax(valid[:, ::-1], axis=1)
+    return np.where(valid.any(axis=1), last, -1)
+
+
+def window_reduce(values: np.ndarray, end: np.ndarray, length: int, func) -> np.ndarray:
+    """
+    Apply a NaN-aware reduction over the `length` columns ending at `end` (inclusive) of every row
+    """
+    columns = np.arange(values.shape[1])
+    in_window = (columns[None, :] <= end[:, None]) & (columns[None, :] > end[:, None] - length)
+    with np.errstate(invalid='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        return func(np.where(in_window, values, np.nan), axis=1)
+
+
+def cluster_levels_1d(levels: np.ndarray,
+                      groups: np.ndarray,
+                      threshold: float = 0.02) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Cluster price levels within each group (e.g. one group per coin)
+
+    Levels are normalized by their group mean, sorted, and split wherever two
+    neighbours are more than `threshold` apart. Clusters of a single level are
+    dropped. This is what DBSCAN(eps=threshold, min_samples=2) yields on one
+    dimension, in O(n log n) for every group at once.
+
+    Returns:
+        tuple: (groups, centers) with one entry per cluster, ordered by group and,
+               within a group, by the first input position of the cluster's levels
+    """
+    levels = np.asarray(levels, dtype=np.float64)
+    groups = np.asarray(groups)
+    finite = np.isfinite(levels)
+    levels, groups = levels[finite], groups[finite]
+    positions = np.flatnonzero(finite)
+    if len(levels) == 0:
+        return groups[:0], levels[:0]
+    
+    group_codes, group_idx = np.unique(groups, return_inverse=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        group_mean = np.bincount(group_idx, weights=levels) / np.bincount(group_idx)
+        normalized = levels / group_mean[group_idx]
+    
+    order = np.lexsort((normalized, group_idx))
+    sorted_groups = group_idx[order]
+    sorted_normalized = normalized[order]
+    
+    splits = np.flatnonzero(
+        (np.diff(sorted_groups) != 0) | ~(np.diff(sorted_normalized) <= threshold)
+    ) + 1
+    starts = np.concatenate([[0], splits])
+    sizes = np.diff(np.concatenate([starts, [len(order)]]))
+    
+    keep = sizes >= 2
+    centers = (np.add.reduceat(levels[order], starts) / sizes)[keep]
+    cluster_groups = sorted_groups[starts][keep]
+    first_seen = np.minimum.reduceat(positions[order], starts)[keep]
+    
+    cluster_order = np.lexsort((first_seen, cluster_groups))
+    return group_codes[cluster_groups[cluster_order]], centers[cluster_order]
+
+
+class PriceLevelIndex:
+    """
+    Answers touch queries for many candidate levels of one price series
+
+    Prices are sorted once, so the touches of a level (prices within `tolerance` of it)
+    are a contiguous range of the sorted order found with two binary searches. Touch
+    volume and reactions come from cumulative sums over that order, and the last touch
+    from a sparse-table range maximum of the original indices. Building is O(n log n)
+    and each level is answered in O(log n).
+    """
+
+    def __init__(self, prices: np.ndarray, volumes: np.ndarray, tolerance: float):
+        self.tolerance = tolerance
+        self.order = np.argsort(prices, kind='stable')
+        self.sorted_prices = prices[self.order]
+        
+        self.volume_cumsum = np.concatenate([[0.0], np.cumsum(volumes[self.order])])
+        
+        # Reaction after each point: relative move to the next price (the last point has none)
+        n = len(prices)
+        reactions = np.zeros(n)
+        has_reaction = np.zeros(n, dtype=np.int64)
+        if n > 1:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                reactions[:-1] = np.abs(np.diff(prices)) / prices[:-1]
+            has_reaction[:-1] = 1
+        self.reaction_cumsum = np.concatenate([[0.0], np.cumsum(reactions[self.order])])
+        self.reaction_count_cumsum = np.concatenate([[0], np.cumsum(has_reaction[self.order])])
+        
+        # max_table[k][i] = max(order[i:i + 2**k])
+        self.max_table = [self.order]
+        width = 1
+        while width * 2 <= n:
+            previous = self.max_table[-1]
+            self.max_table.append(np.maximum(previous[:-width], previous[width:]))
+            width *= 2
+
+    def evaluate(self, levels: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Touch statistics for every level
+
+        Returns:
+            dict: 'touches', 'last_touch' (index into prices, -1 without touches),
+                  'volume' (total volume at touches) and 'reaction_mean' (mean relative
+                  move after a touch, NaN when there is none)
+        """
+        levels = np.asarray(levels, dtype=np.float64)
+        lo = np.searchsorted(self.sorted_prices, levels - self.tolerance * levels, side='left')
+        hi = np.searchsorted(self.sorted_prices, levels + self.tolerance * levels, side='right')
+        touches = hi - lo
+        
+        last_touch = np.full(len(levels), -1, dtype=np.int64)
+        touched = touches > 0
+        if touched.any():
+            t_lo, t_hi = lo[touched], hi[touched]
+            k = np.floor(np.log2(t_hi - t_lo)).astype(np.int64)
+            span = 1 << k
+            last_touch[touched] = [
+                max(self.max_table[level_k][start], self.max_table[level_k][end - width])
+                for level_k, start, end, width in zip(k, t_lo, t_hi, span)
+            ]
+        
+        reaction_count = self.reaction_count_cumsum[hi] - self.reaction_count_cumsum[lo]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            reaction_mean = (self.reaction_cumsum[hi] - self.reaction_cumsum[lo]) / reaction_count
+        
+        return {
+            'touches': touches,
+            'last_touch': last_touch,
+            'volume': self.volume_cumsum[hi] - self.volume_cumsum[lo],
+            'reaction_mean': reaction_mean
+        }
+
+
 class TechnicalAnalyzer:
-    def __init__(self, db_manager: 'CryptoDataManager'):
+    LEVEL_TOUCH_TOLERANCE = 0.01  # Relative distance at which a price counts as touching a level
+    
+    def __init__(self,
+                 db_manager: 'CryptoDataManager',
+                 price_cube: Optional['PriceCube'] = None,
+                 executor: Optional[ScanExecutor] = None,
+                 price_cache: Optional[PriceCache] = None):
         self.db = db_manager
-        self.price_cache = {}  # Cache for frequently accessed price data
+        self.price_cube = price_cube  # Optional memory-mapped cube for whole-universe scans
+        self.executor = executor or ScanExecutor('thread', max_workers=10)  # Runs the per-coin scans
+        # Cache for frequently accessed price data, expired when new data is ingested
+        if price_cache is None:
+            watermark_fn = getattr(db_manager, 'get_latest_ingested_timestamp', None)
+            # An async data source pushes its watermark at the start of every scan instead
+            if asyncio.iscoroutinefunction(watermark_fn):
+                watermark_fn = None
+            price_cache = PriceCache(watermark_fn=watermark_fn)
+        self.price_cache = price_cache
         
     async def analyze_ath_breakouts(self, 
                                   coin_ids: Optional[List[str]] = None,
                                   category: Optional[str] = None,
-                                  lookback_days: int = 365) -> List[ATHBreakout]:
-        """Detect ATH breakouts across multiple coins"""
+                                  lookback_days: int = 365,
+                                  batched: bool = False) -> List[ATHBreakout]:
+        """
+        Detect ATH breakouts across multiple coins
+
+        With batched=True every coin is scanned at once on a (coins x days) matrix,
+        see analyze_ath_breakouts_batched.
+        """
         
         # Get relevant coin IDs based on category or input list
         if category:
             coin_ids = await self.db.get_coins_by_category(category)
+        elif not coin_ids and batched and self.price_cube is not None:
+            coin_ids = list(self.price_cube.coin_ids)
         elif not coin_ids:
             coin_ids = await self.db.get_all_coin_ids()
         
-        breakouts = []
+        if batched:
+            frames = None if self.price_cube is not None else await self._load_frames(coin_ids, lookback_days)
+            return self.analyze_ath_breakouts_batched(coin_ids, lookback_days, frames)
         
-        # Process coins in parallel
-        with ThreadPoolExecutor(max_workers=10) as executor:
-            futures = []
-            for coin_id in coin_ids:
-                futures.append(
-                    executor.submit(
-                        self._analyze_single_coin_ath,
-                        coin_id,
-                        lookback_days
-                    )
-                )
-            
-            for future in futures:
-                result = future.result()
-                if result:
-                    breakouts.extend(result)
+        # Process coins in parallel on the configured backend
+        block = PriceSeriesBlock.from_frames(await self._load_frames(coin_ids, lookback_days))
+        results = self.executor.map(_ath_chunk, block, lookback_days=lookback_days)
+        breakouts = [result for result in results if result]
+        
+        return sorted(breakouts, key=lambda x: x.breakout_strength, reverse=True)
+    
+    def analyze_ath_breakouts_batched(self,
+                                      coin_ids: List[str],
+                                      lookback_days: int = 365,
+                                      frames: Optional[Dict[str, pd.DataFrame]] = None) -> List[ATHBreakout]:
+        """
+        Detect ATH breakouts for every coin at once
+
+        Loads one (coins x days) matrix and computes the rolling ATH, 30 day average
+        volume, breakout flags, RSI and breakout strength as whole-array operations.
+        Each coin is evaluated at its own latest price, like _analyze_single_coin_ath.
+        """
+        coin_ids, timestamps, prices, volumes = self._get_price_matrix(coin_ids, lookback_days, frames)
+        if len(coin_ids) == 0 or prices.shape[1] < 2:
+            return []
+        
+        last = last_valid_index(prices)
+        has_history = last >= 1
+        rows = np.arange(len(coin_ids))
+        safe_last = np.maximum(last, 0)
+        
+        current_price = prices[rows, safe_last]
+        current_volume = volumes[rows, safe_last]
+        
+        # Rolling ATH up to the previous day and average volume of the 29 days before today
+        previous_ath = window_reduce(prices, safe_last - 1, lookback_days, np.nanmax)
+        avg_volume = window_reduce(volumes, safe_last - 1, 29, np.nanmean)
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            volume_increase = (current_volume - avg_volume) / avg_volume * 100
+            is_breakout = has_history & (current_price > previous_ath)
+        
+        if not is_breakout.any():
+            return []
+        
+        rsi = wilder_rsi(prices[is_breakout])
+        strength = self._calculate_breakout_strength_batch(
+            price=current_price[is_breakout],
+            prev_ath=previous_ath[is_breakout],
+            volume_increase=volume_increase[is_breakout],
+            rsi=rsi
+        )
+        
+        breakouts = [
+            ATHBreakout(
+                coin_id=coin_ids[idx],
+                timestamp=timestamps[last[idx]],
+                price=current_price[idx],
+                volume_increase=volume_increase[idx],
+                breakout_strength=strength[i],
+                previous_ath=previous_ath[idx]
+            )
+            for i, idx in enumerate(np.flatnonzero(is_breakout))
+        ]
         
         return sorted(breakouts, key=lambda x: x.breakout_strength, reverse=True)
     
@@ -66,26 +319,41 @@ class TechnicalAnalyzer:
                                 coin_id: str,
                                 lookback_days: int) -> Optional[ATHBreakout]:
         """Analyze single coin for ATH breakout"""
+        price_data = self._get_price_data(coin_id, lookback_days)
+        if price_data is None:
+            return None
+        return self._analyze_ath_series(
+            coin_id,
+            price_data['price'].values,
+            price_data['volume'].values,
+            price_data.index,
+            lookback_days
+        )
+    
+    def _analyze_ath_series(self,
+                            coin_id: str,
+                            prices: np.ndarray,
+                            volumes: np.ndarray,
+                            timestamps: pd.DatetimeIndex,
+                            lookback_days: int) -> Optional[ATHBreakout]:
+        """Detect an ATH breakout on one coin's price series"""
         try:
-            # Get historical data
-            price_data = self._get_price_data(coin_id, lookback_days)
-            if price_data is None or len(price_data) < 2:
+            if len(prices) < 2:
                 return None
             
-            # Calculate ATH
-            prices = price_data['price'].values
-            volumes = price_data['volume'].values
-            timestamps = price_data.index
-            
             # Calculate rolling ATH
-            rolling_ath = pd.Series(prices).rolling(window=lookback_days, min_periods=1).max()
+            rolling_ath = pd.Series(prices).rolling(window=lookback_days, min_periods=1).max().values
             
             # Detect breakout
             is_breakout = (prices[-1] > rolling_ath[-2])  # Current price > previous ATH
             
             if is_breakout:
-                # Calculate volume increase
-                avg_volume = np.mean(volumes[-30:-1])  # Average volume last 30 days
+                # Calculate volume increase against the average volume of the 29 days before the
+                # latest point, located by time so gaps and intraday points don't shift the window
+                window_start = TimeIndex(timestamps, assume_sorted=True).locate(
+                    timestamps[-1] - pd.Timedelta(days=29), how='next'
+                )
+                avg_volume = np.mean(volumes[window_start:-1])
                 current_volume = volumes[-1]
                 volume_increase = ((current_volume - avg_volume) / avg_volume) * 100
                 
@@ -146,6 +414,34 @@ class TechnicalAnalyzer:
             weights['momentum'] * momentum_score
         )
 
+    def _calculate_breakout_strength_batch(self,
+                                           price: np.ndarray,
+                                           prev_ath: np.ndarray,
+                                           volume_increase: np.ndarray,
+                                           rsi: np.ndarray) -> np.ndarray:
+        """
+        Vectorized _calculate_breakout_strength over many coins
+
+        Coins without enough history for an RSI get no momentum score.
+        """
+        price_breakout_pct = ((price - prev_ath) / prev_ath) * 100
+        
+        volume_score = np.minimum(volume_increase / 200, 1.0)
+        price_score = np.minimum(price_breakout_pct / 20, 1.0)
+        momentum_score = np.minimum(np.nan_to_num(rsi) / 100, 1.0)
+        
+        weights = {
+            'volume': 0.4,
+            'price': 0.3,
+            'momentum': 0.3
+        }
+        
+        return (
+            weights['volume'] * volume_score +
+            weights['price'] * price_score +
+            weights['momentum'] * momentum_score
+        )
+
     async def find_support_resistance_levels(self,
                                           coin_ids: Optional[List[str]] = None,
                                           category: Optional[str] = None,
@@ -158,42 +454,42 @@ class TechnicalAnalyzer:
         elif not coin_ids:
             coin_ids = await self.db.get_all_coin_ids()
         
-        results = {}
-        
-        with ThreadPoolExecutor(max_workers=10) as executor:
-            futures = []
-            for coin_id in coin_ids:
-                futures.append(
-                    executor.submit(
-                        self._analyze_single_coin_levels,
-                        coin_id,
-                        lookback_days,
-                        min_touches
-                    )
-                )
-            
-            for future, coin_id in zip(futures, coin_ids):
-                result = future.result()
-                if result:
-                    results[coin_id] = result
+        block = PriceSeriesBlock.from_frames(await self._load_frames(coin_ids, lookback_days))
+        levels = self.executor.map(_levels_chunk, block, min_touches=min_touches)
         
-        return results
+        return {
+            coin_id: result
+            for coin_id, result in zip(block.coin_ids, levels)
+            if result
+        }
     
     def _analyze_single_coin_levels(self,
                                   coin_id: str,
                                   lookback_days: int,
                                   min_touches: int) -> Optional[Dict[str, List[PriceLevel]]]:
         """Analyze support and resistance levels for a single coin"""
+        price_data = self._get_price_data(coin_id, lookback_days)
+        if price_data is None:
+            return None
+        return self._analyze_level_series(
+            coin_id,
+            price_data['price'].values,
+            price_data['volume'].values,
+            price_data.index,
+            min_touches
+        )
+    
+    def _analyze_level_series(self,
+                              coin_id: str,
+                              prices: np.ndarray,
+                              volumes: np.ndarray,
+                              timestamps: pd.DatetimeIndex,
+                              min_touches: int) -> Optional[Dict[str, List[PriceLevel]]]:
+        """Find support and resistance levels on one coin's price series"""
         try:
-            # Get historical data
-            price_data = self._get_price_data(coin_id, lookback_days)
-            if price_data is None or len(price_data) < min_touches:
+            if len(prices) < min_touches:
                 return None
             
-            prices = price_data['price'].values
-            volumes = price_data['volume'].values
-            timestamps = price_data.index
-            
             # Find potential levels using peak detection
             support_levels = self._find_price_levels(
                 prices, volumes, timestamps, 
@@ -248,34 +544,59 @@ class TechnicalAnalyzer:
         
         # Cluster nearby levels
         clustered_levels = self._cluster_price_levels(all_levels)
+        if len(clustered_levels) == 0:
+            return levels
+        
+        # Evaluate every level against one sorted view of the prices
+        level_stats = PriceLevelIndex(prices, volumes, self.LEVEL_TOUCH_TOLERANCE).evaluate(clustered_levels)
+        strengths = self._score_levels(level_stats, len(prices), np.mean(volumes))
         
         # Validate each level
-        for level_price in clustered_levels:
-            touches = self._count_level_touches(prices, volumes, level_price)
-            if touches >= min_touches:
-                # Calculate level strength
-                strength = self._calculate_level_strength(
-                    level_price, prices, volumes, touches
-                )
-                
-                # Find last touch
-                last_touch = timestamps[self._find_last_touch(prices, level_price)]
-                
-                # Calculate total volume at touches
-                total_volume = self._calculate_level_volume(
-                    prices, volumes, level_price
-                )
-                
-                levels.append(PriceLevel(
-                    price=level_price,
-                    strength=strength,
-                    last_touch=last_touch,
-                    touches=touches,
-                    total_volume=total_volume
-                ))
+        for i in np.flatnonzero(level_stats['touches'] >= min_touches):
+            levels.append(PriceLevel(
+                price=clustered_levels[i],
+                strength=strengths[i],
+                last_touch=timestamps[level_stats['last_touch'][i]],
+                touches=int(level_stats['touches'][i]),
+                total_volume=level_stats['volume'][i]
+            ))
         
         return sorted(levels, key=lambda x: x.strength, reverse=True)
     
+    def _score_levels(self,
+                      level_stats: Dict[str, np.ndarray],
+                      n_prices: int,
+                      mean_volume: float) -> np.ndarray:
+        """Vectorized _calculate_level_strength for the output of PriceLevelIndex.evaluate"""
+        touches = level_stats['touches']
+        
+        touch_score = np.minimum(touches / 10, 1.0)
+        volume_score = np.minimum(level_stats['volume'] / mean_volume, 1.0)
+        recency_score = np.where(
+            touches > 0,
+            np.exp(-(n_prices - level_stats['last_touch']) / n_prices),
+            0.0
+        )
+        reaction_score = np.where(
+            touches >= 2,
+            np.minimum(np.nan_to_num(level_stats['reaction_mean']) * 100, 1.0),
+            0.0
+        )
+        
+        weights = {
+            'touches': 0.3,
+            'volume': 0.3,
+            'recency': 0.2,
+            'reaction': 0.2
+        }
+        
+        return (
+            weights['touches'] * touch_score +
+            weights['volume'] * volume_score +
+            weights['recency'] * recency_score +
+            weights['reaction'] * reaction_score
+        )
+    
     @staticmethod
     def _find_local_minima(prices: np.ndarray) -> np.ndarray:
         """Find local minima in price data"""
@@ -309,24 +630,53 @@ class TechnicalAnalyzer:
                             levels: np.ndarray,
                             threshold: float = 0.02) -> np.ndarray:
         """Cluster nearby price levels"""
-        from sklearn.cluster import DBSCAN
-        
-        # Normalize prices for clustering
-        normalized_levels = levels.reshape(-1, 1) / np.mean(levels)
-        
-        # Perform clustering
-        clustering = DBSCAN(eps=threshold, min_samples=2).fit(normalized_levels)
-        
-        # Get cluster centers
-        unique_labels = np.unique(clustering.labels_)
-        clustered_levels = []
-        
-        for label in unique_labels:
-            if label != -1:  # Ignore noise points
-                mask = clustering.labels_ == label
-                clustered_levels.append(np.mean(levels[mask]))
-                
-        return np.array(clustered_levels)
+        _, centers = cluster_levels_1d(levels, np.zeros(len(levels), dtype=np.int64), threshold)
+        return centers
+    
+    def _cluster_price_levels_batch(self,
+                                    levels_by_coin: Dict[str, np.ndarray],
+                                    threshold: float = 0.02) -> Dict[str, np.ndarray]:
+        """Cluster the candidate levels of many coins in one call"""
+        coin_ids = list(levels_by_coin)
+        if not coin_ids:
+            return {}
+        
+        sizes = [len(levels_by_coin[coin_id]) for coin_id in coin_ids]
+        levels = np.concatenate([np.asarray(levels_by_coin[coin_id], dtype=np.float64) for coin_id in coin_ids])
+        groups = np.repeat(np.arange(len(coin_ids)), sizes)
+        
+        center_groups, centers = cluster_levels_1d(levels, groups, threshold)
+        bounds = np.searchsorted(center_groups, np.arange(len(coin_ids) + 1))
+        return {
+            coin_id: centers[bounds[i]:bounds[i + 1]]
+            for i, coin_id in enumerate(coin_ids)
+        }
+    
+    def _find_level_touches(self,
+                            prices: np.ndarray,
+                            level: float) -> np.ndarray:
+        """Indices where the price is within LEVEL_TOUCH_TOLERANCE of the level"""
+        return np.flatnonzero(np.abs(prices - level) <= self.LEVEL_TOUCH_TOLERANCE * level)
+    
+    def _count_level_touches(self,
+                             prices: np.ndarray,
+                             volumes: np.ndarray,
+                             level: float) -> int:
+        """Number of times the price touched the level"""
+        return len(self._find_level_touches(prices, level))
+    
+    def _find_last_touch(self,
+                         prices: np.ndarray,
+                         level: float) -> int:
+        """Index of the most recent touch of the level"""
+        return self._find_level_touches(prices, level)[-1]
+    
+    def _calculate_level_volume(self,
+                                prices: np.ndarray,
+                                volumes: np.ndarray,
+                                level: float) -> float:
+        """Total volume traded at touches of the level"""
+        return float(np.sum(volumes[self._find_level_touches(prices, level)]))
     
     def _calculate_level_strength(self,
                                 level: float,
@@ -393,29 +743,158 @@ class TechnicalAnalyzer:
         
         return min(np.mean(reactions) * 100, 1.0)
 
+    def _get_price_matrix(self,
+                          coin_ids: List[str],
+                          lookback_days: int,
+                          frames: Optional[Dict[str, pd.DataFrame]] = None) -> Tuple[List[str], np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Get (coins x days) price and volume matrices for many coins
+
+        Reads the memory-mapped price cube when one is configured, otherwise stacks the
+        per-coin price data (prefetched `frames`, or fetched here) on a shared daily axis.
+
+        Returns:
+            tuple: (coin_ids, timestamps, prices, volumes)
+        """
+        start_date = datetime.now() - timedelta(days=lookback_days)
+        
+        if self.price_cube is not None:
+            prices, dates = self.price_cube.matrix('price', coin_ids, start_date=start_date.date())
+            volumes, _ = self.price_cube.matrix('volume', coin_ids, start_date=start_date.date())
+            return list(coin_ids), pd.to_datetime(dates), prices, volumes
+        
+        if frames is None:
+            frames = {coin_id: self._get_price_data(coin_id, lookback_days) for coin_id in coin_ids}
+        
+        stacked_frames = []
+        for coin_id in coin_ids:
+            price_data = frames.get(coin_id)
+            if price_data is not None and len(price_data) > 0:
+                frame = price_data[['price', 'volume']].copy()
+                frame['coin_id'] = coin_id
+                frame['date'] = pd.to_datetime(frame.index).normalize()
+                stacked_frames.append(frame)
+        
+        if not stacked_frames:
+            return [], pd.DatetimeIndex([]), np.empty((0, 0)), np.empty((0, 0))
+        
+        stacked = pd.concat(stacked_frames, ignore_index=True)
+        # Last point of each day wins, like a daily close
+        prices = stacked.pivot_table(index='coin_id', columns='date', values='price', aggfunc='last')
+        volumes = stacked.pivot_table(index='coin_id', columns='date', values='volume', aggfunc='last')
+        volumes = volumes.reindex(index=prices.index, columns=prices.columns)
+        
+        return (
+            list(prices.index),
+            prices.columns,
+            prices.to_numpy(dtype=np.float64),
+            volumes.to_numpy(dtype=np.float64)
+        )
+
+    async def _load_frames(self,
+                           coin_ids: List[str],
+                           lookback_days: int) -> Dict[str, Optional[pd.DataFrame]]:
+        """
+        Fetch every coin's price data through the cache
+
+        An async data source with get_historical_data_many reads all cache misses in a
+        few concurrent queries; a synchronous one is read on a thread pool.
+        """
+        get_many = getattr(self.db, 'get_historical_data_many', None)
+        if get_many is None:
+            return await asyncio.to_thread(self._load_frames_threaded, coin_ids, lookback_days)
+        
+        if asyncio.iscoroutinefunction(getattr(self.db, 'get_latest_ingested_timestamp', None)):
+            self.price_cache.set_watermark(await self.db.get_latest_ingested_timestamp())
+        
+        start_date = datetime.now() - timedelta(days=lookback_days)
+        watermark = self.price_cache.current_watermark()
+        
+        frames = {}
+        missing = []
+        for coin_id in coin_ids:
+            cached = self.price_cache.get(coin_id, start_date)
+            if cached is None:
+                missing.append(coin_id)
+            else:
+                frames[coin_id] = cached if len(cached) > 0 else None
+        
+        if missing:
+            history = await get_many(missing, start_date)
+            for coin_id in missing:
+                df = self._records_to_frame(history.get(coin_id))
+                if df is not None:
+                    self.price_cache.put(coin_id, start_date, df, watermark)
+                frames[coin_id] = df
+        
+        return {coin_id: frames.get(coin_id) for coin_id in coin_ids}
+
+    def _load_frames_threaded(self,
+                              coin_ids: List[str],
+                              lookback_days: int) -> Dict[str, Optional[pd.DataFrame]]:
+        """Fetch every coin's price data from a synchronous data source (I/O bound, so on threads)"""
+        with ThreadPoolExecutor(max_workers=10) as executor:
+            frames = executor.map(lambda coin_id: self._get_price_data(coin_id, lookback_days), coin_ids)
+            return dict(zip(coin_ids, frames))
+
+    @staticmethod
+    def _records_to_frame(data: Optional[List[Dict]]) -> Optional[pd.DataFrame]:
+        """Historical records -> DataFrame indexed by timestamp"""
+        if data is None or len(data) == 0:
+            return None
+        
+        df = pd.DataFrame(data)
+        df.set_index('timestamp', inplace=True)
+        return df
+
     def _get_price_data(self,
                        coin_id: str,
                        lookback_days: int) -> Optional[pd.DataFrame]:
         """Get price data with caching"""
-        cache_key = f"{coin_id}_{lookback_days}"
+        start_date = datetime.now() - timedelta(days=lookback_days)
         
-        if cache_key in self.price_cache:
-            return self.price_cache[cache_key]
+        # Served from any cached series of this coin that reaches back far enough
+        cached = self.price_cache.get(coin_id, start_date)
+        if cached is not None:
+            return cached if len(cached) > 0 else None
         
         # Fetch from database
+        watermark = self.price_cache.current_watermark()
         data = self.db.get_historical_data(
             coin_id=coin_id,
-            start_date=datetime.now() - timedelta(days=lookback_days)
+            start_date=start_date
         )
         
-        if data is None or len(data) == 0:
-            return None
-        
         # Convert to DataFrame
-        df = pd.DataFrame(data)
-        df.set_index('timestamp', inplace=True)
+        df = self._records_to_frame(data)
+        if df is None:
+            return None
         
         # Cache the result
-        self.price_cache[cache_key] = df
+        self.price_cache.put(coin_id, start_date, df, watermark)
         
-        return df
\ No newline at end of file
+        return df
+
+
+def _ath_chunk(block: PriceSeriesBlock, start: int, end: int, lookback_days: int) -> List[Optional[ATHBreakout]]:
+    """ScanExecutor chunk function for analyze_ath_breakouts"""
+    analyzer = TechnicalAnalyzer(db_manager=None)
+    results = []
+    for idx in range(start, end):
+        prices, volumes, timestamps = block.series(idx)
+        results.append(analyzer._analyze_ath_series(
+            block.coin_ids[idx], prices, volumes, pd.DatetimeIndex(timestamps), lookback_days
+        ))
+    return results
+
+
+def _levels_chunk(block: PriceSeriesBlock, start: int, end: int, min_touches: int) -> List[Optional[Dict[str, List[PriceLevel]]]]:
+    """ScanExecutor chunk function for find_support_resistance_levels"""
+    analyzer = TechnicalAnalyzer(db_manager=None)
+    results = []
+    for idx in range(start, end):
+        prices, volumes, timestamps = block.series(idx)
+        results.append(analyzer._analyze_level_series(
+            block.coin_ids[idx], prices, volumes, pd.DatetimeIndex(timestamps), min_touches
+        ))
+    return results
@@ -0,0 +1,120 @@
+"""
+As-of lookups on sorted timestamps.
+
+TimeIndex answers "which observation is the value as of T" with searchsorted
+instead of scanning every timestamp, for many targets at once:
+
+- 'previous': the last observation at or before T
+- 'next': the first observation at or after T
+- 'nearest': the closest observation on either side (the earlier one on ties)
+
+A max_staleness tolerance rejects matches further than that from T, so a coin
+that stopped trading months ago is not compared as if it were current. Build
+one index per coin with TimeIndex.from_observations to skip its missing values.
+"""
+
+from datetime import timedelta
+from typing import Optional, Union
+
+import numpy as np
+
+HOW = ('previous', 'nearest', 'next')
+
+Staleness = Optional[Union[timedelta, np.timedelta64]]
+
+
+def _to_datetime64(values) -> np.ndarray:
+    return np.asarray(values, dtype='datetime64[ns]')
+
+
+class TimeIndex:
+    """
+    Searchsorted index over one series' timestamps
+
+    Positions returned by locate() refer to the timestamps as passed in, so they can
+    index the matching value arrays directly even when the input was unsorted.
+    """
+
+    def __init__(self, timestamps, assume_sorted: bool = False):
+        timestamps = _to_datetime64(timestamps)
+        if assume_sorted:
+            self.order = None
+        else:
+            self.order = np.argsort(timestamps, kind='stable')
+            timestamps = timestamps[self.order]
+        self.timestamps = timestamps
+
+    @classmethod
+    def from_observations(cls, timestamps, values) -> 'TimeIndex':
+        """Index over the timestamps at which `values` is not NaN, e.g. one coin's column of a sparse matrix"""
+        positions = np.flatnonzero(~np.isnan(np.asarray(values, dtype=np.float64)))
+        index = cls(_to_datetime64(timestamps)[positions])
+        index.order = positions if index.order is None else positions[index.order]
+        return index
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def locate(self, targets, how: str = 'previous', max_staleness: Staleness = None):
+        """
+        Position of the observation as of each target
+
+        Args:
+            targets: one timestamp or an array of them
+            how: 'previous', 'nearest' or 'next'
+            max_staleness: largest allowed distance between a target and its match
+
+        Returns:
+            int or np.ndarray: positions into the original timestamps, -1 where no
+                observation qualifies
+        """
+        if how not in HOW:
+            raise ValueError(f"Unknown as-of lookup '{how}', expected one of {HOW}")
+
+        scalar = np.ndim(targets) == 0
+        targets = _to_datetime64(np.atleast_1d(targets))
+        n = len(self.timestamps)
+        if n == 0:
+            positions = np.full(len(targets), -1)
+            return int(positions[0]) if scalar else positions
+
+        previous = np.searchsorted(self.timestamps, targets, side='right') - 1
+        following = np.searchsorted(self.timestamps, targets, side='left')
+        has_previous = previous >= 0
+        has_next = following < n
+
+        if how == 'previous':
+            positions = np.where(has_previous, previous, -1)
+        elif how == 'next':
+            positions = np.where(has_next, following, -1)
+        else:
+            previous_gap = targets - self.timestamps[np.maximum(previous, 0)]
+            next_gap = self.timestamps[np.minimum(following, n - 1)] - targets
+            use_next = has_next & (~has_previous | (next_gap < previous_gap))
+            positions = np.where(use_next, following, np.where(has_previous, previous, -1))
+
+        found = positions >= 0
+        if max_staleness is not None:
+            gap = np.abs(targets - self.timestamps[np.maximum(positions, 0)])
+            found &= gap <= np.timedelta64(max_staleness)
+        positions = np.where(found, positions, -1)
+
+        if self.order is not None:
+            positions = np.where(found, self.order[np.maximum(positions, 0)], -1)
+        return int(positions[0]) if scalar else positions
+
+    def asof(self, values, targets, how: str = 'previous', max_staleness: Staleness = None):
+        """
+        Values as of each target
+
+        Args:
+            values: array aligned with the original timestamps along its first axis
+
+        Returns:
+            np.ndarray: values at the located positions, NaN where none qualifies
+        """
+        values = np.asarray(values, dtype=np.float64)
+        positions = np.atleast_1d(self.locate(targets, how, max_staleness))
+        result = values[np.maximum(positions, 0)]
+        result[positions < 0] = np.nan
+        return result[0] if np.ndim(targets) == 0 else result